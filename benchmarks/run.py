@@ -0,0 +1,283 @@
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import itertools
+import tempfile
+import multiprocessing
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from resumable import Resumable, __version__
+from resumable.util import monotonic
+from benchmarks.server import BenchmarkServer
+
+
+KiB = 1024
+MiB = 1024 * KiB
+UNITS = {'': 1, 'K': KiB, 'M': MiB, 'G': 1024 * MiB}
+
+DESCRIPTION = """
+Benchmark resumable.py uploads against a local multi-threaded receiver.
+
+Every combination of the swept options is uploaded, and a JSON record of its
+parameters and results is written per case: the upload throughput, requests
+per second, CPU time per chunk and peak resident set size of the client,
+and, in a separate run under tracemalloc (Python 3.4+), the peak memory
+allocated by Python.
+Each case runs in a new process, so that its resident set size is its own.
+"""
+
+
+def parse_size(text):
+    """Parse a size in bytes, with an optional K, M or G suffix."""
+    text = text.strip().upper().rstrip('B').rstrip('I')
+    unit = text[-1:] if text[-1:] in UNITS else ''
+    return int(float(text[:len(text) - len(unit)]) * UNITS[unit])
+
+
+def parse_list(parse):
+    def parse_items(text):
+        return [parse(item) for item in text.split(',') if item]
+    return parse_items
+
+
+def parse_bool(text):
+    if text.lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    if text.lower() in ('0', 'false', 'no', 'off'):
+        return False
+    raise argparse.ArgumentTypeError('not a boolean: {0}'.format(text))
+
+
+def make_files(directory, count, size):
+    """Write files of random content to upload."""
+    block = os.urandom(min(size, MiB) or 1)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, 'file-{0}'.format(index))
+        with open(path, 'wb') as stream:
+            remaining = size
+            while remaining > 0:
+                stream.write(block[:remaining])
+                remaining -= len(block)
+        paths.append(path)
+    return paths
+
+
+def _cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def _max_rss():
+    """The peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes, except on macOS
+    return max_rss if sys.platform == 'darwin' else max_rss * KiB
+
+
+def upload(endpoint, paths, **options):
+    """Upload files in a session, returning it with the time taken."""
+    start = monotonic()
+    with Resumable(endpoint, **options) as session:
+        for path in paths:
+            session.add_file(path)
+    return session, monotonic() - start
+
+
+def run_case(endpoint, paths, memory=True, **options):
+    """Benchmark the upload of some files with some session options.
+
+    Returns
+    -------
+    dict
+        The results of the case
+    """
+    cpu_start = _cpu_time()
+    session, elapsed = upload(endpoint, paths, **options)
+    cpu = _cpu_time() - cpu_start
+    # Before the tracemalloc run, whose bookkeeping takes memory of its own
+    max_rss = _max_rss()
+
+    stats = session.stats
+    chunks = stats.chunks_sent + stats.chunks_skipped
+    requests = sum(
+        target.sessions.stats()['requests'] for target in session.targets
+    )
+    total_bytes = sum(os.path.getsize(path) for path in paths)
+    result = {
+        'seconds': elapsed,
+        'bytes': total_bytes,
+        'chunks': chunks,
+        'requests': requests,
+        'retries': stats.retries,
+        'throughput': total_bytes / elapsed,
+        'requests_per_second': requests / elapsed,
+        'cpu_seconds': cpu,
+        'cpu_per_chunk': cpu / chunks if chunks else None,
+        'max_rss': max_rss,
+        'peak_traced_bytes': None
+    }
+
+    if memory and tracemalloc is not None:
+        tracemalloc.start()
+        try:
+            upload(endpoint, paths, **options)
+            result['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def run_isolated(endpoint, paths, memory=True, **options):
+    """Benchmark a case in a new process, as :func:`run_case`.
+
+    The peak resident set size of a process never falls, so measuring it for
+    a case needs a process that has run no other case.
+    """
+    if hasattr(multiprocessing, 'get_context'):
+        pool = multiprocessing.get_context('spawn').Pool(1)
+    else:  # Python 2, where a forked process has run no case either
+        pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(run_case, (endpoint, paths, memory), options)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def environment():
+    """Describe the environment the benchmarks ran in."""
+    return {
+        'resumable': __version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count() if hasattr(os, 'cpu_count') else None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
+
+
+def run(args, output):
+    """Run every case of the sweep, writing a JSON line per case."""
+    env = environment()
+    workdir = tempfile.mkdtemp(prefix='resumable-benchmark-')
+    assemble = os.path.join(workdir, 'received') if args.assemble else None
+    if assemble is not None:
+        os.mkdir(assemble)
+    try:
+        with BenchmarkServer(assemble) as server:
+            for count, size in itertools.product(args.files, args.file_sizes):
+                directory = os.path.join(workdir, '{0}x{1}'.format(
+                    count, size
+                ))
+                os.mkdir(directory)
+                paths = make_files(directory, count, size)
+                sweep = itertools.product(
+                    args.chunk_sizes, args.simultaneous_uploads,
+                    args.test_chunks, args.scheduling
+                )
+                for chunk_size, simultaneous, test_chunks, scheduling in sweep:
+                    parameters = {
+                        'files': count,
+                        'file_size': size,
+                        'chunk_size': chunk_size,
+                        'simultaneous_uploads': simultaneous,
+                        'test_chunks': test_chunks,
+                        'scheduling': scheduling,
+                        'assemble': args.assemble
+                    }
+                    for repeat in range(args.repeat):
+                        result = run_isolated(
+                            server.endpoint, paths,
+                            memory=args.memory and repeat == 0,
+                            chunk_size=chunk_size,
+                            simultaneous_uploads=simultaneous,
+                            test_chunks=test_chunks,
+                            scheduling=scheduling
+                        )
+                        record = dict(parameters, repeat=repeat,
+                                      results=result, environment=env)
+                        output.write(json.dumps(record, sort_keys=True))
+                        output.write('\n')
+                        output.flush()
+                        _report(parameters, result)
+                shutil.rmtree(directory)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _report(parameters, result):
+    print(
+        '{files} x {file_size} B, chunks {chunk_size} B, '
+        '{simultaneous_uploads} simultaneous, test {test_chunks}, '
+        '{scheduling}: '.format(
+            **parameters
+        ) + '{0:.1f} MiB/s, {1:.0f} req/s'.format(
+            result['throughput'] / MiB, result['requests_per_second']
+        ),
+        file=sys.stderr
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument('--chunk-sizes', type=parse_list(parse_size),
+                        default=[256 * KiB, MiB, 4 * MiB],
+                        help='chunk sizes to sweep, e.g. 256K,1M')
+    parser.add_argument('--simultaneous-uploads', type=parse_list(int),
+                        default=[1, 4, 16],
+                        help='numbers of simultaneous uploads to sweep')
+    parser.add_argument('--test-chunks', type=parse_list(parse_bool),
+                        default=[False, True],
+                        help='whether to test for chunks, e.g. false,true')
+    parser.add_argument('--scheduling', type=parse_list(str),
+                        default=['fifo'],
+                        help='scheduling policies to sweep, e.g. '
+                        'fifo,smallest_remaining')
+    parser.add_argument('--files', type=parse_list(int), default=[1, 100],
+                        help='numbers of files to sweep')
+    parser.add_argument('--file-sizes', type=parse_list(parse_size),
+                        default=[64 * KiB, 16 * MiB],
+                        help='file sizes to sweep, e.g. 64K,16M')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='the number of timed runs of each case')
+    parser.add_argument('--assemble', action='store_true',
+                        help='assemble uploaded files rather than discard '
+                        'chunk data on the receiver')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the tracemalloc run of each case')
+    parser.add_argument('--output', '-o',
+                        help='append JSON lines to this file rather than '
+                        'write them to standard output')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.output is None:
+        run(args, sys.stdout)
+    else:
+        with open(args.output, 'a') as output:
+            run(args, output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import os
+import re
+import multiprocessing
+from threading import Lock
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+
+BOUNDARY_PATTERN = re.compile(br'boundary=([^\s;]+)')
+NAME_PATTERN = re.compile(br'name="([^"]*)"')
+
+
+def parse_multipart(body, content_type):
+    """Parse a multipart/form-data body.
+
+    Returns
+    -------
+    fields : dict
+        The text fields of the form
+    data : bytes
+        The content of the ``file`` part, or None
+    """
+    match = BOUNDARY_PATTERN.search(content_type.encode('latin-1'))
+    if match is None:
+        raise ValueError('no boundary in content type')
+    delimiter = b'--' + match.group(1).strip(b'"')
+    fields = {}
+    data = None
+    for part in body.split(delimiter)[1:]:
+        if part.startswith(b'--'):
+            break
+        headers, _, content = part.partition(b'\r\n\r\n')
+        content = content[:-2] if content.endswith(b'\r\n') else content
+        name = NAME_PATTERN.search(headers)
+        if name is None:
+            continue
+        name = name.group(1).decode('utf-8')
+        if name == 'file':
+            data = content
+        else:
+            fields[name] = content.decode('utf-8')
+    return fields, data
+
+
+class Receiver(object):
+    """The state of a resumable.js compatible upload target.
+
+    Records the chunks received, so that tests for them succeed, and either
+    discards their data or assembles files from them.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The directory to assemble files in, named by their identifier. By
+        default chunk data is discarded
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._received = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def _key(fields):
+        return (
+            fields['resumableIdentifier'], int(fields['resumableChunkNumber'])
+        )
+
+    def test(self, fields):
+        """Check if a chunk has been received."""
+        with self._lock:
+            return self._key(fields) in self._received
+
+    def store(self, fields, data):
+        """Receive a chunk."""
+        if self.directory is not None:
+            self._write(fields, data)
+        with self._lock:
+            self._received.add(self._key(fields))
+
+    def _write(self, fields, data):
+        path = os.path.join(
+            self.directory,
+            re.sub(r'[^\w.-]', '_', fields['resumableIdentifier'])
+        )
+        offset = (int(fields['resumableChunkNumber']) - 1) * \
+            int(fields['resumableChunkSize'])
+        with self._lock:
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+        with open(path, 'r+b') as stream:
+            stream.seek(offset)
+            stream.write(data)
+
+
+def make_handler(receiver):
+    """Make a request handler class serving uploads to a receiver."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        protocol_version = 'HTTP/1.1'
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length)
+
+        def _respond(self, status):
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            # resumable.py sends the test parameters as a form body
+            body = self._body().decode('utf-8')
+            fields = dict(parse_qsl(urlsplit(self.path).query))
+            fields.update(parse_qsl(body))
+            self._respond(200 if receiver.test(fields) else 404)
+
+        def do_POST(self):
+            fields, data = parse_multipart(
+                self._body(), self.headers.get('Content-Type', '')
+            )
+            if data is None:
+                self._respond(400)
+                return
+            receiver.store(fields, data)
+            self._respond(200)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ReceiverServer(ThreadingMixIn, HTTPServer):
+    """A multi-threaded HTTP server receiving uploads."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, receiver):
+        HTTPServer.__init__(self, address, make_handler(receiver))
+
+
+def _serve(ports, directory):
+    server = ReceiverServer(('127.0.0.1', 0), Receiver(directory))
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class BenchmarkServer(object):
+    """Run a receiver in a separate process, so that it does not compete
+    with the client for the GIL.
+
+    Parameters
+    ----------
+    directory : str, optional
+        The directory to assemble uploaded files in. By default chunk data
+        is discarded
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.port = None
+        self._process = None
+
+    @property
+    def endpoint(self):
+        return 'http://127.0.0.1:{0}/upload'.format(self.port)
+
+    def start(self):
+        ports = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(ports, self.directory)
+        )
+        self._process.daemon = True
+        self._process.start()
+        self.port = ports.get(timeout=10)
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
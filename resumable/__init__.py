@@ -1,2 +1,8 @@
+import sys
+
 from resumable.version import __version__  # noqa: F401
 from resumable.core import Resumable  # noqa: F401
+from resumable.process import ProcessPoolResumable  # noqa: F401
+
+if sys.version_info >= (3, 6):
+    from resumable.aio import AsyncResumable  # noqa: F401
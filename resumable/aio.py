@@ -0,0 +1,372 @@
+import asyncio
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from resumable.version import user_agent
+from resumable.file import ResumableFile
+from resumable.journal import Journal
+from resumable.identifier import ContentHasher
+from resumable.chunk import (
+    DEFAULT_RETRY_POLICY, ResumableError, _should_test, _build_query,
+    _chunk_body, _send_succeeded
+)
+from resumable.util import CallbackDispatcher, Config
+
+
+MiB = 1024 * 1024
+
+# The parts of an aiohttp response that retry policies look at, named as on
+# requests.Response
+_Response = namedtuple('_Response', ['status_code', 'headers'])
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError('AsyncResumable requires aiohttp to be installed')
+    return aiohttp
+
+
+class AsyncResumable(object):
+    """A resumable.py upload client for asyncio applications.
+
+    The options, ``add_file()`` and callbacks are the same as for
+    :class:`resumable.Resumable`, but chunks are uploaded by tasks on the
+    running event loop with aiohttp, so that many chunks can be in flight at
+    once without a thread for each. Reads of file data are run in a thread
+    pool so that they do not block the event loop.
+
+    Files must be added from within the event loop, and the session joined
+    with ``await session.join()`` or by using it as an async context manager:
+
+    .. code-block:: python
+
+        async with AsyncResumable('https://example.com/upload') as session:
+            session.add_file('my_file.dat')
+
+    Parameters
+    ----------
+    target : str
+        The URL of the resumable upload target
+    chunk_size : int, optional
+        The size, in bytes, of file chunks to be uploaded
+    simultaneous_uploads : int, optional
+        The number of file chunk uploads to attempt at once
+    headers : dict, optional
+        A dictionary of additional HTTP headers to include in requests
+    test_chunks : bool
+        Flag indicating if the client should check with the server if a chunk
+        already exists with a GET request prior to attempting to upload the
+        chunk with a POST
+    max_chunk_retries : int, optional
+        The number of times to retry uploading a chunk
+    permanent_errors : collection of int, optional
+        HTTP status codes that indicate the upload of a chunk has failed and
+        should not be retried
+    max_test_misses : int, optional
+        See :class:`resumable.Resumable`
+    journal : str or resumable.journal.Journal, optional
+        See :class:`resumable.Resumable`
+    content_identifiers : bool, optional
+        See :class:`resumable.Resumable`
+    hash_workers : int, optional
+        See :class:`resumable.Resumable`
+    io_workers : int, optional
+        The number of threads to read file data with. Defaults to
+        ``simultaneous_uploads``, up to 32
+    retry_policy : object, optional
+        See :class:`resumable.Resumable`
+    retry_budget : resumable.retry.RetryBudget, optional
+        See :class:`resumable.Resumable`
+
+    Attributes
+    ----------
+    file_added : resumable.util.CallbackDispatcher
+        Triggered when a file has been added, passing the file object
+    file_completed : resumable.util.CallbackDispatcher
+        Triggered when a file upload has completed, passing the file object
+    chunk_completed : resumable.util.CallbackDispatcher
+        Triggered when a chunk upload has completed, passing the file and chunk
+        objects
+    """
+
+    def __init__(self, target, chunk_size=MiB, simultaneous_uploads=3,
+                 headers=None, test_chunks=True,
+                 max_chunk_retries=100,
+                 permanent_errors=(400, 404, 415, 500, 501),
+                 max_test_misses=None, journal=None,
+                 content_identifiers=False, hash_workers=None,
+                 io_workers=None, retry_policy=None, retry_budget=None):
+
+        self._aiohttp = _import_aiohttp()
+        # Failures to reach the server, after which chunks are retried
+        self._connection_errors = (
+            self._aiohttp.ClientConnectionError, asyncio.TimeoutError
+        )
+
+        self.config = Config(
+            target=target,
+            chunk_size=chunk_size,
+            simultaneous_uploads=simultaneous_uploads,
+            headers=headers,
+            test_chunks=test_chunks,
+            max_chunk_retries=max_chunk_retries,
+            permanent_errors=permanent_errors,
+            max_test_misses=max_test_misses,
+            content_identifiers=content_identifiers,
+            hash_workers=hash_workers,
+            retry_policy=retry_policy
+        )
+        self.retry_budget = retry_budget
+
+        if isinstance(journal, str):
+            journal = Journal(journal)
+        self.journal = journal
+
+        self.headers = {'User-Agent': user_agent()}
+        if headers:
+            self.headers.update(headers)
+        self.session = None
+
+        self.files = []
+
+        self.hasher = None
+        if content_identifiers:
+            self.hasher = ContentHasher(hash_workers)
+            self._identifier_executor = ThreadPoolExecutor(1)
+
+        if io_workers is None:
+            io_workers = min(32, simultaneous_uploads)
+        self._io_executor = ThreadPoolExecutor(io_workers)
+
+        self._queue = deque()
+        self._workers = set()
+        self._preparing = set()
+        self._error = None
+
+        self.file_added = CallbackDispatcher()
+        self.file_completed = CallbackDispatcher()
+        self.chunk_completed = CallbackDispatcher()
+
+    def add_file(self, path):
+        """Add a file to be uploaded.
+
+        Must be called from within the event loop.
+
+        Parameters
+        ----------
+        path : str
+            The file of the path to be uploaded
+
+        Returns
+        -------
+        resumable.file.ResumableFile
+        """
+
+        file = ResumableFile(path, self.config.chunk_size, self.journal)
+        self.files.append(file)
+
+        self.file_added.trigger(file)
+        file.completed.register(partial(self.file_completed.trigger, file))
+        file.chunk_completed.register(
+            partial(self.chunk_completed.trigger, file)
+        )
+
+        if file.chunks and file.is_completed:
+            # Already completed in an earlier session
+            file.completed.trigger()
+        elif self.hasher is not None and not file.resumed:
+            self._start_task(self._preparing, self._identify_file(file))
+        else:
+            self._enqueue(file)
+
+        return file
+
+    async def _identify_file(self, file):
+        loop = asyncio.get_event_loop()
+        identifier = await loop.run_in_executor(
+            self._identifier_executor, self.hasher.identify, file.path
+        )
+        file.set_identifier(identifier)
+        self._enqueue(file)
+
+    def _enqueue(self, file):
+        chunks = (
+            chunk for chunk in file.chunks
+            if not file.is_chunk_completed(chunk)
+        )
+        self._queue.append((file, chunks))
+        if self.session is None:
+            self.session = self._aiohttp.ClientSession(
+                connector=self._aiohttp.TCPConnector(
+                    limit=self.config.simultaneous_uploads
+                ),
+                headers=self.headers
+            )
+        while len(self._workers) < self.config.simultaneous_uploads:
+            self._start_task(self._workers, self._worker())
+
+    def _start_task(self, tasks, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        tasks.add(task)
+        task.add_done_callback(partial(self._task_done, tasks))
+
+    def _task_done(self, tasks, task):
+        tasks.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None and self._error is None:
+            self._error = task.exception()
+
+    def _next_chunk(self):
+        """Get the next chunk to be uploaded, or None if none remain."""
+        while self._queue:
+            file, chunks = self._queue[0]
+            for chunk in chunks:
+                return file, chunk
+            self._queue.popleft()
+        return None
+
+    async def _worker(self):
+        while True:
+            item = self._next_chunk()
+            if item is None:
+                return
+            await self._resolve_chunk(*item)
+
+    async def _resolve_chunk(self, file, chunk):
+        """Make sure a chunk is uploaded and mark it as completed.
+
+        This follows the same logic as :func:`resumable.chunk.resolve_chunk`.
+        """
+
+        exists_on_server = False
+        if _should_test(self.config, file):
+            try:
+                exists_on_server = await self._test_chunk(file, chunk)
+            except self._connection_errors:
+                # Find out on attempting the upload, which is retried
+                pass
+            else:
+                file.probe.record(exists_on_server)
+
+        if not exists_on_server:
+            retry_policy = self.config.retry_policy or DEFAULT_RETRY_POLICY
+            tries = 0
+            while True:
+                try:
+                    response = await self._send_chunk(file, chunk)
+                except self._connection_errors:
+                    response = None
+                if response is not None and \
+                        _send_succeeded(self.config, response.status_code):
+                    break
+                tries += 1
+                if tries >= self.config.max_chunk_retries:
+                    raise ResumableError('max retries exceeded')
+                if self.retry_budget is not None and \
+                        not self.retry_budget.withdraw():
+                    raise ResumableError('retry budget exhausted')
+                # A failed attempt may still have reached the server, so
+                # make sure following chunks of the file are tested for again
+                file.probe.reset()
+                delay = retry_policy.delay(tries, response)
+                file.record_retry(delay)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if self.retry_budget is not None:
+                self.retry_budget.deposit()
+
+        # Recording the chunk in a journal commits to disk, so keep it off
+        # the event loop, but trigger callbacks on the loop
+        loop = asyncio.get_event_loop()
+        completed = await loop.run_in_executor(
+            self._io_executor, file._record_chunk, chunk
+        )
+        if completed is not None:
+            file._chunk_recorded(chunk, completed)
+
+    async def _test_chunk(self, file, chunk):
+        """Check if the chunk exists on the server."""
+        query = _build_query(file, chunk)
+        async with self.session.get(
+            self.config.target,
+            data={key: str(value) for key, value in query.items()}
+        ) as response:
+            await response.read()
+            return response.status == 200
+
+    async def _send_chunk(self, file, chunk):
+        """Upload the chunk to the server, returning its response."""
+        body = _chunk_body(file, chunk)
+        async with self.session.post(
+            self.config.target,
+            data=self._stream(body),
+            headers={
+                'Content-Type': body.content_type,
+                'Content-Length': str(len(body))
+            }
+        ) as response:
+            await response.read()
+            return _Response(response.status, response.headers)
+
+    async def _stream(self, body):
+        """Stream a multipart body, reading file data in the thread pool."""
+        loop = asyncio.get_event_loop()
+        yield body.head
+        offset = 0
+        while offset < body.size:
+            data = await loop.run_in_executor(
+                self._io_executor, body.read_file, offset,
+                min(body.block_size, body.size - offset)
+            )
+            if not data:
+                raise IOError('file ended before its expected size')
+            yield data
+            offset += len(data)
+        yield body.tail
+
+    async def _wait(self):
+        """Wait until all current uploads are completed."""
+        while self._error is None and (self._workers or self._preparing):
+            await asyncio.wait(
+                self._workers | self._preparing,
+                return_when=asyncio.FIRST_EXCEPTION
+            )
+        if self._error is not None:
+            raise self._error
+
+    def _cancel_remaining_tasks(self):
+        self._queue.clear()
+        for task in list(self._workers | self._preparing):
+            task.cancel()
+
+    async def join(self):
+        """Wait until all uploads are complete, or an error occurs."""
+        try:
+            await self._wait()
+        except BaseException:
+            self._cancel_remaining_tasks()
+            raise
+        finally:
+            await self._close()
+
+    async def _close(self):
+        if self.session is not None:
+            await self.session.close()
+        self._io_executor.shutdown(wait=False)
+        if self.hasher is not None:
+            self._identifier_executor.shutdown(wait=False)
+            self.hasher.shutdown()
+        for file in self.files:
+            file.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args, **kwargs):
+        await self.join()
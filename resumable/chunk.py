@@ -1,12 +1,81 @@
 import os
+import time
 import mimetypes
+from threading import Lock
+
+import requests
+
+from resumable.multipart import MultipartEncoder
+from resumable.retry import ExponentialBackoff
+from resumable.ratelimit import make_throttle
+from resumable.stats import READ, TEST, SEND
+from resumable.transport import drain
+from resumable.util import monotonic
+
+
+DEFAULT_RETRY_POLICY = ExponentialBackoff()
+
+# Errors on which the upload of a chunk is retried, rather than failed
+CONNECTION_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout
+)
 
 
 class ResumableError(Exception):
     pass
 
 
-def resolve_chunk(session, config, file, chunk):
+class ChunkProbe(object):
+    """Track how a file's chunk tests with the server have turned out.
+
+    Used to stop testing for chunks of a file once a run of them has been
+    found missing on the server, as is the case for the remainder of a fresh
+    upload, saving a request per chunk.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.misses = 0
+        self._lock = Lock()
+
+    def record(self, exists):
+        """Record the result of testing for a chunk on the server.
+
+        Parameters
+        ----------
+        exists : bool
+            If the chunk was found on the server
+        """
+        with self._lock:
+            if exists:
+                self.misses = 0
+            else:
+                self.misses += 1
+
+    def disable(self):
+        """Stop testing for chunks, e.g. when known from elsewhere."""
+        self.enabled = False
+
+    def reset(self):
+        """Resume testing for chunks."""
+        with self._lock:
+            self.enabled = True
+            self.misses = 0
+
+
+def _should_test(config, file):
+    """Decide if a chunk should be tested for on the server first."""
+    if not config.test_chunks or not file.probe.enabled:
+        return False
+    if config.max_test_misses is None:
+        return True
+    return file.probe.misses < config.max_test_misses
+
+
+def resolve_chunk(session, config, file, chunk, concurrency=None,
+                  retry_budget=None, target=None, compressor=None,
+                  rate_limit=None, stats=None, data=None):
     """Make sure a chunk is uploaded to the server and mark it as completed.
 
     Parameters
@@ -19,23 +88,111 @@ def resolve_chunk(session, config, file, chunk):
         The parent file of the chunk to be resolved
     chunk : resumable.file.FileChunk
         The chunk to be resolved
+    concurrency : resumable.concurrency.FixedConcurrency, optional
+        A concurrency limit to record the latency and outcome of the upload in
+    retry_budget : resumable.retry.RetryBudget, optional
+        A session-wide budget to take any retries of the upload from
+    target : resumable.targets.Target, optional
+        The target to upload the chunk to, recording the outcome of each
+        request in it. Defaults to the target URL of the configuration
+    compressor : resumable.compression.ChunkCompressor, optional
+        Compresses the payload of the chunk, if worthwhile
+    rate_limit : resumable.ratelimit.TokenBucket, optional
+        A session-wide limit on the rate the upload is sent at, applied along
+        with the ``rate_limit`` of the file, if any
+    stats : resumable.stats.UploadStats, optional
+        Statistics to record the time spent in each phase of resolving the
+        chunk, and its outcome, in
+    data : bytes-like, optional
+        The content of the chunk, if already read, such as by a
+        :class:`resumable.prefetch.Prefetcher`. It is sent on every attempt,
+        rather than reading the chunk from the file again
+
+    Raises
+    ------
+    ResumableError
+        If the upload failed permanently, or could not be retried
     """
 
+    url = config.target if target is None else target.url
+
     exists_on_server = False
-    if config.test_chunks:
-        exists_on_server = _test_chunk(session, config, file, chunk)
+    if _should_test(config, file):
+        start = monotonic()
+        try:
+            exists_on_server = _test_chunk(session, url, file, chunk)
+        except CONNECTION_ERRORS:
+            # Find out on attempting the upload, which is retried
+            if target is not None:
+                target.record_failure()
+        else:
+            file.probe.record(exists_on_server)
+        if stats is not None:
+            stats.observe(TEST, monotonic() - start)
+            if exists_on_server:
+                stats.record_skipped(file, chunk.size)
 
     if not exists_on_server:
+        retry_policy = config.retry_policy or DEFAULT_RETRY_POLICY
+        throttle = make_throttle([rate_limit, file.rate_limit])
         tries = 0
-        while not _send_chunk(session, config, file, chunk):
+        start = monotonic()
+        throttled = 0.0
+        while True:
+            if file.future.done():
+                # Failed or cancelled, such as on closing the session, so
+                # not worth sending or retrying
+                return
+            if throttle is not None:
+                throttled = throttle.waited
+            try:
+                response = _send_chunk(
+                    session, url, file, chunk, compressor, throttle, stats,
+                    data
+                )
+            except CONNECTION_ERRORS:
+                response = None
+            finally:
+                if stats is not None:
+                    stats.observe(SEND, monotonic() - start)
+            if response is not None and \
+                    _send_succeeded(config, response.status_code):
+                break
+            if target is not None:
+                target.record_failure()
             tries += 1
             if tries >= config.max_chunk_retries:
                 raise ResumableError('max retries exceeded')
+            if retry_budget is not None and not retry_budget.withdraw():
+                raise ResumableError('retry budget exhausted')
+            # A failed attempt may still have reached the server, so make
+            # sure following chunks of the file are tested for again
+            file.probe.reset()
+            delay = retry_policy.delay(tries, response)
+            file.record_retry(delay)
+            if stats is not None:
+                stats.record_retry(delay)
+            if delay > 0:
+                time.sleep(delay)
+            start = monotonic()
+        if target is not None:
+            target.record_success()
+        if retry_budget is not None:
+            retry_budget.deposit()
+        if concurrency is not None:
+            # The latency of the last attempt, less any time spent waiting
+            # for the rate limit
+            latency = monotonic() - start
+            if throttle is not None:
+                latency -= throttle.waited - throttled
+            concurrency.record(latency, chunk.size, congested=tries > 0)
+        if stats is not None:
+            stats.record_sent(file, chunk.size)
 
     file.mark_chunk_completed(chunk)
 
 
-def _test_chunk(session, config, file, chunk):
+def _test_chunk(session, url, file, chunk):
     """Check if the chunk exists on the server.
 
     Returns
@@ -44,15 +201,35 @@ def _test_chunk(session, config, file, chunk):
         True if the chunk exists on the server
     """
     response = session.get(
-        config.target,
+        url,
         data=_build_query(file, chunk)
     )
+    drain(response)
     return response.status_code == 200
 
 
-def _send_chunk(session, config, file, chunk):
+def _send_chunk(session, url, file, chunk, compressor=None, throttle=None,
+                stats=None, data=None):
     """Upload the chunk to the server.
 
+    Returns
+    -------
+    requests.Response
+        The response of the server
+    """
+    body = _chunk_body(file, chunk, compressor, throttle, stats, data)
+    response = session.post(
+        url,
+        data=body,
+        headers={'Content-Type': body.content_type}
+    )
+    drain(response)
+    return response
+
+
+def _send_succeeded(config, status_code):
+    """Interpret the status code of a chunk upload response.
+
     Returns
     -------
     bool
@@ -61,17 +238,54 @@ def _send_chunk(session, config, file, chunk):
     Raises
     ------
     ResumableError
-        If the server responded with an error code indicating permanent failure
+        If the status code indicates permanent failure
     """
-    response = session.post(
-        config.target,
-        data=_build_query(file, chunk),
-        files={'file': chunk.read()}
-    )
-    if response.status_code in config.permanent_errors:
+    if status_code in config.permanent_errors:
         # TODO: better exception
         raise ResumableError('permanent error')
-    return response.status_code in [200, 201]
+    return status_code in [200, 201]
+
+
+def _chunk_body(file, chunk, compressor=None, throttle=None, stats=None,
+                data=None):
+    """Build a streamed multipart request body for uploading a chunk.
+
+    When the chunk is compressed, the compressed payload is held in memory
+    and its encoding sent in the ``resumableChunkEncoding`` field. If the
+    content of the chunk is given as ``data``, it is sent from there rather
+    than read from the file.
+    """
+
+    fields = _build_query(file, chunk)
+
+    def read_file(start, num_bytes):
+        if data is not None:
+            offset = start - chunk.start
+            return data[offset:offset + num_bytes]
+        if stats is None:
+            return file._read_bytes(start, num_bytes)
+        began = monotonic()
+        content = file._read_bytes(start, num_bytes)
+        stats.observe(READ, monotonic() - began)
+        return content
+
+    if compressor is not None and compressor.compressible(file):
+        payload = read_file(chunk.start, chunk.size)
+        compressed = compressor.compress(file, payload)
+        if compressed is not None:
+            fields['resumableChunkEncoding'] = compressor.encoding
+
+            def read_compressed(offset, num_bytes):
+                return compressed[offset:offset + num_bytes]
+
+            return MultipartEncoder(fields, 'file', read_compressed,
+                                    len(compressed), throttle=throttle)
+
+    def read(offset, num_bytes):
+        return read_file(chunk.start + offset, num_bytes)
+
+    return MultipartEncoder(fields, 'file', read, chunk.size,
+                            throttle=throttle)
 
 
 def _build_query(file, chunk):
@@ -82,7 +296,7 @@ def _build_query(file, chunk):
         'resumableType': _file_type(file.path),
         'resumableIdentifier': str(file.unique_identifier),
         'resumableFilename': os.path.basename(file.path),
-        'resumableRelativePath': file.path,
+        'resumableRelativePath': file.relative_path,
         'resumableTotalChunks': len(file.chunks),
         'resumableChunkNumber': chunk.index + 1,
         'resumableCurrentChunkSize': chunk.size
@@ -0,0 +1,79 @@
+from __future__ import division
+
+import math
+
+
+KiB = 1024
+MiB = 1024 * KiB
+
+
+class AdaptiveChunkSize(object):
+    """Choose the chunk size of each file from its size and the throughput.
+
+    The chunk size is chosen so that a file is uploaded in no more than about
+    ``target_chunks`` requests, and, once the session has measured its
+    throughput, so that each chunk takes at least about ``target_duration``
+    seconds to upload, amortising the overhead of each request. It is then
+    limited so that the chunks in flight fit within ``memory_limit``, and
+    kept within the bounds accepted by the server.
+
+    Use an instance as the ``chunk_size_policy`` of a
+    :class:`resumable.Resumable` session.
+
+    Parameters
+    ----------
+    min_chunk_size : int, optional
+        The smallest chunk size, in bytes, accepted by the server
+    max_chunk_size : int, optional
+        The largest chunk size, in bytes, accepted by the server
+    target_chunks : int, optional
+        The number of chunks to aim to split large files into
+    target_duration : float, optional
+        The time, in seconds, to aim for each chunk upload to take
+    memory_limit : int, optional
+        The maximum number of bytes of chunk data to have in flight at once
+    alignment : int, optional
+        Chunk sizes are rounded up to a multiple of this, in bytes
+    """
+
+    def __init__(self, min_chunk_size=256 * KiB, max_chunk_size=64 * MiB,
+                 target_chunks=1000, target_duration=2.0, memory_limit=None,
+                 alignment=64 * KiB):
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_chunks = target_chunks
+        self.target_duration = target_duration
+        self.memory_limit = memory_limit
+        self.alignment = alignment
+
+    def __call__(self, file_size, throughput=None, in_flight=1):
+        """Choose the chunk size for a file.
+
+        Parameters
+        ----------
+        file_size : int
+            The size of the file, in bytes
+        throughput : float, optional
+            The throughput measured so far in the session, in bytes per
+            second, or None if not yet known
+        in_flight : int, optional
+            The number of chunks that may be in flight at once
+
+        Returns
+        -------
+        int
+            The chunk size, in bytes
+        """
+        size = file_size / self.target_chunks
+        if throughput:
+            per_upload = throughput / max(in_flight, 1)
+            size = max(size, per_upload * self.target_duration)
+
+        size = int(math.ceil(size))
+        if self.alignment:
+            size = -(-size // self.alignment) * self.alignment
+
+        upper = self.max_chunk_size
+        if self.memory_limit is not None:
+            upper = min(upper, self.memory_limit // max(in_flight, 1))
+        return int(max(self.min_chunk_size, min(size, upper)))
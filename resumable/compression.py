@@ -0,0 +1,197 @@
+from __future__ import division
+
+import zlib
+import weakref
+from threading import Lock
+
+from resumable.chunk import _file_type
+from resumable.util import as_bytes, string_types
+
+
+KiB = 1024
+
+# Mime types of content that is already compressed
+INCOMPRESSIBLE_TYPE_PREFIXES = ('image/', 'video/', 'audio/')
+INCOMPRESSIBLE_TYPES = frozenset([
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/x-bzip2',
+    'application/x-xz',
+    'application/x-7z-compressed',
+    'application/x-rar-compressed',
+    'application/vnd.rar',
+    'application/zstd',
+    'application/pdf',
+    'application/java-archive',
+    'application/epub+zip'
+])
+# Compressible exceptions to the prefixes above
+COMPRESSIBLE_TYPES = frozenset([
+    'image/svg+xml', 'image/bmp', 'image/x-ms-bmp'
+])
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            'zstd compression requires zstandard to be installed'
+        )
+    return zstandard
+
+
+def zstd_available():
+    """Indicates if zstd compression can be used."""
+    try:
+        _import_zstandard()
+    except ImportError:
+        return False
+    return True
+
+
+class GzipCodec(object):
+    """Compress data in the gzip format."""
+
+    encoding = 'gzip'
+
+    def __init__(self, level=6):
+        self.level = level
+
+    def compress(self, data):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+
+class ZstdCodec(object):
+    """Compress data in the zstd format. Requires zstandard."""
+
+    encoding = 'zstd'
+
+    def __init__(self, level=3):
+        self.level = level
+        self._zstandard = _import_zstandard()
+
+    def compress(self, data):
+        # Compressor objects are not thread safe, so create one per call
+        return self._zstandard.ZstdCompressor(level=self.level).compress(data)
+
+
+def make_codec(name):
+    """Get a codec by name.
+
+    Parameters
+    ----------
+    name : str
+        ``'gzip'``, ``'zstd'``, or ``'auto'`` for zstd when available and
+        gzip otherwise
+
+    Returns
+    -------
+    GzipCodec or ZstdCodec
+    """
+    if name == 'auto':
+        name = 'zstd' if zstd_available() else 'gzip'
+    if name == 'gzip':
+        return GzipCodec()
+    elif name == 'zstd':
+        return ZstdCodec()
+    raise ValueError('unknown compression {0!r}'.format(name))
+
+
+class ChunkCompressor(object):
+    """Compress chunk payloads of files whose content is compressible.
+
+    Whether a file is compressible is decided once per file, on its first
+    chunk: files with the mime type of already compressed content, such as
+    images or archives, are skipped, and otherwise a sample from the start of
+    the file is compressed at a fast level to check that it shrinks enough.
+    Chunks that do not shrink are still sent uncompressed.
+
+    Compressed chunks are sent with a ``resumableChunkEncoding`` form field
+    naming the encoding, so that the server can decompress them before
+    reassembly. Compression runs on the upload threads; zlib and zstd release
+    the GIL while compressing, so chunks are compressed in parallel.
+
+    Parameters
+    ----------
+    codec : str or object, optional
+        The codec to compress with, by name as for :func:`make_codec`, or an
+        object with an ``encoding`` attribute and a ``compress(data)`` method
+    max_ratio : float, optional
+        The largest ratio of compressed to original size of the sample at
+        which a file is still compressed
+    sample_size : int, optional
+        The number of bytes at the start of a file to check the compression
+        ratio of
+    """
+
+    def __init__(self, codec='auto', max_ratio=0.9, sample_size=64 * KiB):
+        if isinstance(codec, string_types):
+            codec = make_codec(codec)
+        self.codec = codec
+        self.max_ratio = max_ratio
+        self.sample_size = sample_size
+        self._decisions = weakref.WeakKeyDictionary()
+        self._lock = Lock()
+
+    @property
+    def encoding(self):
+        """The name of the encoding of compressed chunks."""
+        return self.codec.encoding
+
+    def compressible(self, file):
+        """Decide if the chunks of a file should be compressed.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+
+        Returns
+        -------
+        bool
+        """
+        with self._lock:
+            decision = self._decisions.get(file)
+        if decision is None:
+            decision = self._probe(file)
+            with self._lock:
+                self._decisions[file] = decision
+        return decision
+
+    def _probe(self, file):
+        mime_type = _file_type(file.path)
+        if mime_type not in COMPRESSIBLE_TYPES and (
+                mime_type in INCOMPRESSIBLE_TYPES or
+                mime_type.startswith(INCOMPRESSIBLE_TYPE_PREFIXES)):
+            return False
+        sample = as_bytes(
+            file._read_bytes(0, min(file.size, self.sample_size))
+        )
+        if not sample:
+            return False
+        compressed = zlib.compress(sample, 1)
+        return len(compressed) / len(sample) <= self.max_ratio
+
+    def compress(self, file, data):
+        """Compress the payload of a chunk of a file, if worthwhile.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+            The file the chunk belongs to
+        data : bytes
+            The payload of the chunk
+
+        Returns
+        -------
+        bytes or None
+            The compressed payload, or None if it should be sent uncompressed
+        """
+        if not self.compressible(file):
+            return None
+        compressed = self.codec.compress(as_bytes(data))
+        if len(compressed) >= len(data):
+            return None
+        return compressed
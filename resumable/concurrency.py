@@ -0,0 +1,176 @@
+from __future__ import division
+
+from threading import Lock
+
+from resumable.util import monotonic
+
+
+class FixedConcurrency(object):
+    """A fixed limit on the number of chunk uploads in flight.
+
+    Also measures the throughput of uploads, as an exponentially weighted
+    moving average of the rate at which chunk data is uploaded.
+
+    Parameters
+    ----------
+    limit : int
+        The number of chunk uploads in flight
+    interval : float, optional
+        The period, in seconds, over which to sample the throughput
+    smoothing : float, optional
+        The weight given to each new throughput sample, between 0 and 1
+    """
+
+    def __init__(self, limit, interval=1.0, smoothing=0.3):
+        self._limit = limit
+        self.interval = interval
+        self.smoothing = smoothing
+        self.throughput = None
+        self._lock = Lock()
+        self._sample_start = monotonic()
+        self._sample_bytes = 0
+
+    @property
+    def limit(self):
+        """The current limit on the number of chunk uploads in flight."""
+        return self._limit
+
+    def record(self, latency, num_bytes, congested=False):
+        """Record the upload of a chunk.
+
+        Parameters
+        ----------
+        latency : float
+            The time taken, in seconds, for the successful upload request
+        num_bytes : int
+            The size of the uploaded chunk, in bytes
+        congested : bool, optional
+            If there was a sign of congestion while uploading the chunk, such
+            as a retry or a 429 or 503 response
+        """
+        with self._lock:
+            self._sample(num_bytes)
+
+    def _sample(self, num_bytes):
+        """Update the throughput estimate. Must be called with the lock."""
+        self._sample_bytes += num_bytes
+        now = monotonic()
+        elapsed = now - self._sample_start
+        if elapsed < self.interval:
+            return
+        rate = self._sample_bytes / elapsed
+        if self.throughput is None:
+            self.throughput = rate
+        else:
+            self.throughput += self.smoothing * (rate - self.throughput)
+        self._sample_start = now
+        self._sample_bytes = 0
+
+
+class AdaptiveConcurrency(FixedConcurrency):
+    """A limit on chunk uploads in flight that adapts to the conditions.
+
+    The limit is adjusted with additive increase, multiplicative decrease
+    (AIMD): after each round of uploads, one per unit of the limit, the limit
+    is raised by one if the throughput of the round kept up with the previous
+    round. On signs of congestion (a retried upload, which includes 429 and
+    503 responses) or a rise in latency beyond ``latency_tolerance`` times the
+    lowest seen, the limit is cut by the factor ``backoff``, at most once per
+    round.
+
+    Latency is only compared between chunks of the largest size seen, as the
+    latency of a chunk grows with its size, so that the short last chunks of
+    files and small files neither set the baseline nor count as congested.
+
+    Parameters
+    ----------
+    max_limit : int
+        The upper bound on the limit
+    min_limit : int, optional
+        The lower bound on the limit
+    initial_limit : int, optional
+        The limit to start with. Defaults to ``min_limit``
+    backoff : float, optional
+        The factor to multiply the limit by on congestion
+    latency_tolerance : float, optional
+        The ratio to the lowest latency seen above which a latency is taken as
+        a sign of congestion
+
+    Attributes
+    ----------
+    min_latency : float
+        The lowest latency seen for a chunk of ``baseline_bytes``, or None
+    baseline_bytes : int
+        The size of the chunks whose latency is compared, the largest seen
+    """
+
+    def __init__(self, max_limit, min_limit=1, initial_limit=None,
+                 backoff=0.5, latency_tolerance=2.0, **kwargs):
+        if initial_limit is None:
+            initial_limit = min_limit
+        super(AdaptiveConcurrency, self).__init__(initial_limit, **kwargs)
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_latency = None
+        self.baseline_bytes = 0
+        self._round_start = monotonic()
+        self._round_count = 0
+        self._round_bytes = 0
+        self._round_backed_off = False
+        self._last_round_throughput = None
+
+    @property
+    def limit(self):
+        """The current limit on the number of chunk uploads in flight."""
+        return int(self._limit)
+
+    def record(self, latency, num_bytes, congested=False):
+        """Record the upload of a chunk, adjusting the limit.
+
+        Parameters
+        ----------
+        latency : float
+            The time taken, in seconds, for the successful upload request
+        num_bytes : int
+            The size of the uploaded chunk, in bytes
+        congested : bool, optional
+            If there was a sign of congestion while uploading the chunk, such
+            as a retry or a 429 or 503 response
+        """
+        with self._lock:
+            self._sample(num_bytes)
+
+            if num_bytes > self.baseline_bytes:
+                # Larger chunks take longer, so start a new baseline
+                self.baseline_bytes = num_bytes
+                self.min_latency = None
+            if num_bytes == self.baseline_bytes:
+                if self.min_latency is None or latency < self.min_latency:
+                    self.min_latency = latency
+                if latency > self.min_latency * self.latency_tolerance:
+                    congested = True
+
+            if congested and not self._round_backed_off:
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._round_backed_off = True
+
+            self._round_count += 1
+            self._round_bytes += num_bytes
+            if self._round_count >= self.limit:
+                self._end_round()
+
+    def _end_round(self):
+        now = monotonic()
+        elapsed = max(now - self._round_start, 1e-9)
+        throughput = self._round_bytes / elapsed
+        previous = self._last_round_throughput
+        if not self._round_backed_off and (
+                previous is None or throughput >= previous):
+            self._limit = min(self.max_limit, self._limit + 1)
+        self._last_round_throughput = throughput
+        self._round_start = now
+        self._round_count = 0
+        self._round_bytes = 0
+        self._round_backed_off = False
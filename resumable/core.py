@@ -1,28 +1,50 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from functools import partial
 
-import requests
-
 from resumable.version import user_agent
 from resumable.file import ResumableFile
-from resumable.chunk import resolve_chunk
-from resumable.util import CallbackDispatcher, Config
+from resumable.reader import HandlePool
+from resumable.journal import Journal
+from resumable.identifier import ContentHasher
+from resumable.chunk import resolve_chunk, _should_test
+from resumable.scheduler import Scheduler
+from resumable.scheduling import make_policy
+from resumable.transport import SessionPool
+from resumable.targets import Target, TargetPool
+from resumable.compression import ChunkCompressor
+from resumable.ratelimit import TokenBucket
+from resumable.stats import UploadStats
+from resumable.events import EventDispatcher
+from resumable.prefetch import Prefetcher
+from resumable.concurrency import FixedConcurrency, AdaptiveConcurrency
+from resumable.walk import WalkedFile, walk_files
+from resumable.source import make_source
+from resumable.util import CallbackDispatcher, Config, string_types
 
 
 MiB = 1024 * 1024
 
+# The number of files queued ahead of the uploads when adding many files
+MAX_QUEUED_FILES = 256
+
 
 class Resumable(object):
     """A resumable.py upload client.
 
     Parameters
     ----------
-    target : str
-        The URL of the resumable upload target
+    target : str or list of str
+        The URL of the resumable upload target, or the URLs of several
+        targets to spread files across. Each file is assigned to a target by
+        consistent hashing of its identifier, and all its chunks are uploaded
+        to that target
     chunk_size : int, optional
-        The size, in bytes, of file chunks to be uploaded
+        The size, in bytes, of file chunks to be uploaded, unless chosen per
+        file by ``chunk_size_policy``
     simultaneous_uploads : int, optional
-        The number of file chunk uploads to attempt at once
+        The number of file chunk uploads to attempt at once to each target,
+        or the upper bound on it when ``adaptive_concurrency`` is set
     headers : dict, optional
         A dictionary of additional HTTP headers to include in requests
     test_chunks : bool
@@ -34,9 +56,161 @@ class Resumable(object):
     permanent_errors : collection of int, optional
         HTTP status codes that indicate the upload of a chunk has failed and
         should not be retried
+    max_queued_chunks : int, optional
+        The maximum number of chunks submitted for upload at once. Chunks of
+        queued files are only generated as this window allows, so memory use
+        depends on this rather than the total number of chunks queued.
+        Chunks are also held to the concurrency limit of each target, so that
+        no more than ``simultaneous_uploads`` chunks are submitted for each
+        target, whatever the window. Defaults to that many for each target
+    max_test_misses : int, optional
+        When testing chunks, stop testing the remaining chunks of a file once
+        this many consecutive chunks of it were found missing on the server,
+        as for a fresh upload. Testing resumes after a chunk upload is
+        retried. By default all chunks are tested
+    journal : str or resumable.journal.Journal, optional
+        A journal, or the path of a journal database, to record upload
+        progress in. Files recorded in the journal by an earlier session are
+        resumed with the same identifier, uploading only the chunks not
+        recorded as completed, without testing for them on the server
+    content_identifiers : bool, optional
+        Derive the unique identifiers of files from a hash of their content,
+        rather than generating random identifiers, so that the server can
+        recognise files uploaded before. Files are hashed one at a time, in
+        parallel with the upload of files already hashed
+    hash_workers : int, optional
+        The number of threads to hash file content with. Defaults to the
+        number of CPUs
+    adaptive_concurrency : bool, optional
+        Adjust the number of chunk uploads in flight to the measured latency
+        and throughput of uploads, up to ``simultaneous_uploads``. See
+        :class:`resumable.concurrency.AdaptiveConcurrency`
+    chunk_size_policy : callable, optional
+        Chooses the chunk size of each file as it is added. Called with the
+        size of the file, the session throughput measured so far in bytes per
+        second (or None) and the maximum number of chunks in flight, returning
+        the chunk size in bytes. With ``content_identifiers`` or a
+        ``journal``, under which an upload may be resumed by a later session
+        that must split the file the same way, the throughput is always
+        None, so that the chunk size only depends on the file size and the
+        configuration. See :class:`resumable.chunksize.AdaptiveChunkSize`
+    retry_policy : object, optional
+        The policy deciding how long to wait before retrying a failed chunk
+        upload, with a ``delay(attempt, response)`` method. Defaults to
+        :class:`resumable.retry.ExponentialBackoff`
+    retry_budget : resumable.retry.RetryBudget, optional
+        A limit on retries across the session relative to successful uploads,
+        beyond which failing uploads are not retried. By default retries are
+        only limited by ``max_chunk_retries``
+    connection_pooling : str, optional
+        ``'shared'`` to make requests from all upload threads over one pool
+        of ``simultaneous_uploads`` connections, or ``'per_thread'`` to give
+        each thread its own session and connection, for each target. See
+        :class:`resumable.transport.SessionPool`
+    max_target_failures : int, optional
+        With several targets, the number of consecutive failed requests after
+        which a target is ejected. Files not yet started on an ejected target
+        are reassigned to the remaining targets, while files already started
+        on it continue to be retried there
+    compression : str or resumable.compression.ChunkCompressor, optional
+        Compress chunk payloads of compressible files, with ``'gzip'``,
+        ``'zstd'`` (requires zstandard) or ``'auto'`` for zstd when available
+        and gzip otherwise. Compressed chunks are marked with a
+        ``resumableChunkEncoding`` form field, and the server must decompress
+        them. Files of already compressed types, or whose start does not
+        compress well, are sent uncompressed. By default nothing is compressed
+    max_open_files : int, optional
+        The maximum number of files kept open for reading at once. Files are
+        opened on their first read, and the least recently read are closed
+        to stay within the limit
+    scheduling : str or object, optional
+        The policy choosing which file to upload the next chunk of:
+        ``'fifo'`` to upload files in the order they were added,
+        ``'smallest_remaining'`` to upload the file with the fewest bytes
+        left first, so that small and nearly done files finish ahead of
+        large ones, ``'round_robin'`` to take a chunk from each file in turn,
+        or ``'priority'`` to upload files in order of their ``priority``, as
+        given to :meth:`add_file`. See :mod:`resumable.scheduling`
+    max_chunks_per_file : int, optional
+        The maximum number of chunks of any one file uploaded at once, so that
+        other files are uploaded alongside it. By default not limited
+    prioritize_first_and_last_chunk : bool, optional
+        Upload the first and last chunks of all files before their other
+        chunks, as resumable.js does with ``prioritizeFirstAndLastChunk``, so
+        that the server can inspect the headers and trailers of files early
+    max_rate : float, optional
+        The maximum rate, in bytes per second, at which chunks are sent by
+        the whole session. The rate is enforced as request bodies are
+        streamed, so that many uploads can be in flight to hide latency while
+        the total rate stays within the limit. May be changed later through
+        ``rate_limit``. By default not limited
+    max_file_rate : float, optional
+        The maximum rate, in bytes per second, at which the chunks of each
+        file are sent, unless given for the file to :meth:`add_file`. By
+        default not limited
+    threaded_callbacks : bool, optional
+        Run callbacks on a dedicated thread, so that slow callbacks do not
+        hold up the upload threads, rather than on the thread triggering
+        them. Callbacks run one at a time, in the order triggered, and a
+        file's ``completed`` callbacks after its last ``chunk_completed``
+        callbacks. All callbacks have run by the time :meth:`join` returns,
+        and it raises the first exception raised by one. See
+        :class:`resumable.events.EventDispatcher`
+    max_queued_callbacks : int, optional
+        With threaded callbacks, the number of triggered callbacks waiting to
+        run beyond which triggering more blocks
+    progress_rate : float, optional
+        With threaded callbacks, coalesce the ``chunk_completed`` callbacks of
+        each file to at most this many per second, passing the latest chunk
+        completed. Use the progress attributes of files, such as
+        ``fraction_completed``, rather than counting the callbacks
+    daemon : bool, optional
+        Run as a long-lived session, uploading batches of files as they are
+        added, until :meth:`close`. Files are released from ``files`` once
+        their ``future`` is done, so that memory does not grow with the
+        number of files uploaded, and an error uploading a file only fails
+        its ``future``, rather than the session. Wait for files with
+        :meth:`wait` or :meth:`as_completed`
+    prefetch_memory : int, optional
+        Read the next chunks to be uploaded from disk ahead of their upload,
+        beyond those being sent, into reusable buffers taking at most this
+        many bytes in total, so that reading the next chunks overlaps
+        sending the current ones.
+        Chunks read ahead are kept in memory until uploaded, so retries do
+        not read them again. Chunks tested for on the server are only read
+        ahead once the last chunk of their file tested was missing, as for a
+        fresh upload, so that chunks already uploaded are not read. Should
+        allow for a few chunks per upload thread. By default chunks are read
+        as they are sent. See :class:`resumable.prefetch.Prefetcher`
 
     Attributes
     ----------
+    targets : resumable.targets.TargetPool
+        The upload targets. Each has its ``sessions``, a
+        :class:`resumable.transport.SessionPool` whose ``stats()`` count the
+        connections opened and reused, and its ``concurrency``, the limit on
+        chunk uploads in flight to it, with its current ``limit`` and the
+        measured ``throughput`` in bytes per second
+    files : list of resumable.file.ResumableFile
+        The files added, or in ``daemon`` mode the files not yet done
+    handles : resumable.reader.HandlePool
+        The files open for reading, shared by all files of the session
+    rate_limit : resumable.ratelimit.TokenBucket
+        The limit on the rate the session sends chunks at, whose ``rate`` may
+        be changed at any time
+    events : resumable.events.EventDispatcher
+        The dispatcher running callbacks with ``threaded_callbacks``, or None
+    prefetcher : resumable.prefetch.Prefetcher
+        Reads chunks ahead of their upload with ``prefetch_memory``, with its
+        pool of ``buffers``, or None
+    stats : resumable.stats.UploadStats
+        Counters and per-phase timings of the chunk uploads, the measured
+        throughput and estimated time left of the session and of each file,
+        exportable with ``as_dict()`` or ``prometheus()``
+    session : requests.Session
+        The session requests to the first target are made with, or with
+        ``'per_thread'`` pooling the session whose headers and authentication
+        are copied to the session of each thread
     file_added : resumable.util.CallbackDispatcher
         Triggered when a file has been added, passing the file object
     file_completed : resumable.util.CallbackDispatcher
@@ -49,7 +223,24 @@ class Resumable(object):
     def __init__(self, target, chunk_size=MiB, simultaneous_uploads=3,
                  headers=None, test_chunks=True,
                  max_chunk_retries=100,
-                 permanent_errors=(400, 404, 415, 500, 501)):
+                 permanent_errors=(400, 404, 415, 500, 501),
+                 max_queued_chunks=None, max_test_misses=None,
+                 journal=None, content_identifiers=False, hash_workers=None,
+                 adaptive_concurrency=False, chunk_size_policy=None,
+                 retry_policy=None, retry_budget=None,
+                 connection_pooling='shared', max_target_failures=10,
+                 compression=None, max_open_files=256, scheduling='fifo',
+                 max_chunks_per_file=None,
+                 prioritize_first_and_last_chunk=False, max_rate=None,
+                 max_file_rate=None, threaded_callbacks=False,
+                 max_queued_callbacks=1024, progress_rate=None,
+                 daemon=False, prefetch_memory=None):
+
+        urls = [target] if isinstance(target, string_types) else list(target)
+        # The sum of the concurrency limits of the targets
+        upload_threads = simultaneous_uploads * len(urls)
+        if max_queued_chunks is None:
+            max_queued_chunks = upload_threads
 
         self.config = Config(
             target=target,
@@ -58,38 +249,241 @@ class Resumable(object):
             headers=headers,
             test_chunks=test_chunks,
             max_chunk_retries=max_chunk_retries,
-            permanent_errors=permanent_errors
+            permanent_errors=permanent_errors,
+            max_queued_chunks=max_queued_chunks,
+            max_test_misses=max_test_misses,
+            content_identifiers=content_identifiers,
+            hash_workers=hash_workers,
+            adaptive_concurrency=adaptive_concurrency,
+            chunk_size_policy=chunk_size_policy,
+            retry_policy=retry_policy,
+            connection_pooling=connection_pooling,
+            max_target_failures=max_target_failures,
+            compression=compression,
+            max_open_files=max_open_files,
+            scheduling=scheduling,
+            max_chunks_per_file=max_chunks_per_file,
+            prioritize_first_and_last_chunk=prioritize_first_and_last_chunk,
+            max_rate=max_rate,
+            max_file_rate=max_file_rate,
+            threaded_callbacks=threaded_callbacks,
+            max_queued_callbacks=max_queued_callbacks,
+            progress_rate=progress_rate,
+            daemon=daemon,
+            prefetch_memory=prefetch_memory
         )
+        self.retry_budget = retry_budget
+
+        if compression is None or isinstance(compression, ChunkCompressor):
+            self.compressor = compression
+        else:
+            self.compressor = ChunkCompressor(compression)
+
+        if isinstance(journal, string_types):
+            journal = Journal(journal)
+        self.journal = journal
 
-        self.session = requests.Session()
-        self.session.headers['User-Agent'] = user_agent()
-        if headers:
-            self.session.headers.update(headers)
+        targets = []
+        for url in urls:
+            sessions = SessionPool(simultaneous_uploads, connection_pooling)
+            sessions.session.headers['User-Agent'] = user_agent()
+            if headers:
+                sessions.session.headers.update(headers)
+            if adaptive_concurrency:
+                concurrency = AdaptiveConcurrency(simultaneous_uploads)
+            else:
+                concurrency = FixedConcurrency(simultaneous_uploads)
+            targets.append(
+                Target(url, sessions, concurrency, max_target_failures)
+            )
+        self.targets = TargetPool(targets)
+        self.session = self.targets[0].sessions.session
 
         self.files = []
+        self.handles = HandlePool(max_open_files)
+        self.rate_limit = TokenBucket(max_rate)
+        self.stats = UploadStats(self.files)
+
+        self.hasher = None
+        if content_identifiers:
+            self.hasher = ContentHasher(hash_workers)
+            # Hash one file at a time, using all hashing threads for it
+            self._identifier_executor = ThreadPoolExecutor(1)
+
+        self.prefetcher = None
+        if prefetch_memory:
+            self.prefetcher = Prefetcher(prefetch_memory, stats=self.stats)
+
+        self.executor = ThreadPoolExecutor(upload_threads)
+        if isinstance(scheduling, string_types):
+            scheduling = make_policy(scheduling)
+        self.scheduler = Scheduler(
+            self.executor, self._resolve_chunk, max_queued_chunks,
+            group=self.targets.target_for, groups=self.targets,
+            prefer=self.handles.is_open,
+            policy=scheduling, max_per_file=max_chunks_per_file,
+            first_and_last=prioritize_first_and_last_chunk, stats=self.stats,
+            fail_file=self._fail_file if daemon else None,
+            failed=self._fail_files,
+            prefetch=None if self.prefetcher is None else self._prefetch,
+            lookahead=0 if self.prefetcher is None
+            else max(prefetch_memory // chunk_size, max_queued_chunks)
+        )
 
-        self.executor = ThreadPoolExecutor(simultaneous_uploads)
-        self.futures = []
+        # Feeds files from add_files() and add_directory() to the scheduler
+        self._add_executor = None
 
-        self.file_added = CallbackDispatcher()
+        self.events = None
+        if threaded_callbacks:
+            self.events = EventDispatcher(max_queued_callbacks, progress_rate)
+
+        # File callbacks trigger those of the session, so only those of
+        # files and file_added are posted to the event dispatcher
+        self.file_added = CallbackDispatcher(self.events)
         self.file_completed = CallbackDispatcher()
         self.chunk_completed = CallbackDispatcher()
 
-    def add_file(self, path):
+    def add_file(self, path, priority=0, max_rate=None):
         """Add a file to be uploaded.
 
         Parameters
         ----------
         path : str
             The file of the path to be uploaded
+        priority : int, optional
+            The priority of the file with the ``'priority'`` scheduling
+            policy, under which files of higher priority are uploaded first
+        max_rate : float, optional
+            The maximum rate, in bytes per second, at which chunks of the file
+            are sent. Defaults to ``max_file_rate``. The limit is kept as the
+            file's ``rate_limit``, whose ``rate`` may be changed at any time
+
+        Returns
+        -------
+        resumable.file.ResumableFile
+            The added file, whose ``future`` is completed once it has been
+            uploaded
+        """
+        return self._add_file(path, priority=priority, max_rate=max_rate)
+
+    def add_source(self, data, filename, relative_path=None, size=None,
+                   priority=0, max_rate=None):
+        """Add data that is not a file on disk to be uploaded.
+
+        Chunks of bytes-like data, such as ``bytes``, ``memoryview`` or
+        numpy arrays, are read as memoryview slices, without copying the
+        data, which must not be modified until uploaded.
+
+        Parameters
+        ----------
+        data : object
+            A bytes-like object, a seekable binary file object, a callable
+            returning the data of a byte range given its offset and size, or
+            a source from :mod:`resumable.source`
+        filename : str
+            The name of the file sent to the server, from which its type is
+            also guessed
+        relative_path : str, optional
+            The path of the file sent to the server as
+            ``resumableRelativePath``. Defaults to ``filename``
+        size : int, optional
+            The number of bytes to upload from a file object or callable.
+            Required for a callable
+        priority : int, optional
+            As for :meth:`add_file`
+        max_rate : float, optional
+            As for :meth:`add_file`
 
         Returns
         -------
         resumable.file.ResumableFile
+            The added file, whose ``future`` is completed once it has been
+            uploaded
+        """
+        return self._add_file(
+            filename, relative_path, priority=priority, max_rate=max_rate,
+            source=make_source(data, size)
+        )
+
+    def add_files(self, paths):
+        """Add many files to be uploaded, as a stream.
+
+        The files are added in the background, only as fast as they are
+        uploaded, so that uploading starts straight away, however many paths
+        there are.
+
+        Parameters
+        ----------
+        paths : iterable of str
+            The paths of the files to be uploaded. May be a generator
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Completed with the list of added files once all are added
+        """
+        if self._add_executor is None:
+            self._add_executor = ThreadPoolExecutor(1)
+        future = self._add_executor.submit(self._add_all, paths)
+        self.scheduler.track(future)
+        return future
+
+    def add_directory(self, path, pattern=None, recursive=True):
+        """Add the files in a directory to be uploaded, as a stream.
+
+        The directory is walked in the background with ``os.scandir``,
+        reusing its stat results, and files are uploaded while the walk goes
+        on. Files are sent with their path relative to the parent of the
+        directory, including its name, as ``resumableRelativePath``.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the files to be uploaded
+        pattern : str, optional
+            A shell-style pattern, such as ``'*.csv'``, that the names of
+            files must match
+        recursive : bool, optional
+            If files in subdirectories are included
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Completed with the list of added files once all are added
         """
+        return self.add_files(walk_files(path, pattern, recursive))
+
+    def _add_all(self, paths):
+        files = []
+        for path in paths:
+            if not self.scheduler.wait_for_room(MAX_QUEUED_FILES):
+                break
+            if isinstance(path, WalkedFile):
+                files.append(
+                    self._add_file(path.path, path.relative_path, path.size)
+                )
+            else:
+                files.append(self._add_file(path))
+        return files
+
+    def _add_file(self, path, relative_path=None, size=None, priority=0,
+                  max_rate=None, source=None):
 
-        file = ResumableFile(path, self.config.chunk_size)
+        if source is not None:
+            size = source.size
+        file = ResumableFile(
+            path, self._chunk_size(path, size), self.journal,
+            relative_path=relative_path, size=size, handles=self.handles,
+            events=self.events, source=source
+        )
+        file.priority = priority
+        if max_rate is None:
+            max_rate = self.config.max_file_rate
+        if max_rate is not None:
+            file.rate_limit = TokenBucket(max_rate)
         self.files.append(file)
+        if self.config.daemon:
+            file.future.add_done_callback(partial(self._release, file))
 
         self.file_added.trigger(file)
         file.completed.register(partial(self.file_completed.trigger, file))
@@ -97,36 +491,198 @@ class Resumable(object):
             partial(self.chunk_completed.trigger, file)
         )
 
-        for chunk in file.chunks:
-            future = self.executor.submit(
-                resolve_chunk, self.session, self.config, file, chunk
+        if file.chunks and file.is_completed:
+            # Already completed in an earlier session
+            file.completed.trigger()
+        elif self.hasher is not None and not file.resumed:
+            future = self._identifier_executor.submit(
+                self._identify_file, file
             )
-            self.futures.append(future)
+            self.scheduler.add_when_ready(file, future)
+        else:
+            self.scheduler.add(file)
 
         return file
 
+    def _chunk_size(self, path, size=None):
+        """Choose the chunk size for a file."""
+        policy = self.config.chunk_size_policy
+        if policy is None:
+            return self.config.chunk_size
+        if size is None:
+            size = os.path.getsize(str(path))
+        throughput = self.targets.throughput
+        if self.hasher is not None or self.journal is not None:
+            # Resumed uploads must be split into the same chunks, whatever
+            # the throughput of the session resuming them
+            throughput = None
+        return policy(size, throughput, self.config.max_queued_chunks)
+
+    def _identify_file(self, file):
+        if file.source is not None:
+            identifier = self.hasher.identify_source(file.source)
+        else:
+            identifier = self.hasher.identify(file.path)
+        file.set_identifier(identifier)
+
+    def _prefetch(self, file, chunk):
+        """Read a chunk ahead, if it is likely to be sent."""
+        if _should_test(self.config, file) and not file.probe.misses:
+            return None
+        return self.prefetcher.schedule(file, chunk)
+
+    def _resolve_chunk(self, file, chunk):
+        target = self.targets.start(file)
+        if file.future.done():
+            # Failed or cancelled since the chunk was queued
+            self.targets.release(file)
+            if self.prefetcher is not None:
+                self.prefetcher.discard(file)
+            return
+        data = None
+        if self.prefetcher is not None:
+            data = self.prefetcher.take(file, chunk)
+        try:
+            resolve_chunk(
+                target.sessions.get(), self.config, file, chunk,
+                concurrency=target.concurrency,
+                retry_budget=self.retry_budget, target=target,
+                compressor=self.compressor, rate_limit=self.rate_limit,
+                stats=self.stats, data=data
+            )
+        finally:
+            if data is not None:
+                self.prefetcher.release(file, chunk)
+
+    def _release(self, file, future):
+        """Forget a file that is done, in daemon mode."""
+        try:
+            self.files.remove(file)
+        except ValueError:
+            pass
+        self.scheduler.discard(file)
+        if self.prefetcher is not None:
+            self.prefetcher.discard(file)
+        if self.events is not None:
+            self.events.forget(file)
+        self.targets.release(file)
+
+    def _fail_file(self, file, error):
+        file.fail(error)
+
+    def _fail_files(self, error):
+        """Fail the files not yet done, once the session has failed."""
+        for file in list(self.files):
+            file.fail(error)
+
+    def wait(self, files=None, timeout=None):
+        """Wait for files to be uploaded, without closing the session.
+
+        Parameters
+        ----------
+        files : iterable of resumable.file.ResumableFile, optional
+            The files to wait for. Defaults to all files in ``files``
+        timeout : float, optional
+            The maximum time to wait, in seconds. By default waits until all
+            the files are done
+
+        Returns
+        -------
+        done : set of resumable.file.ResumableFile
+            The files uploaded, or whose upload failed or was cancelled
+        not_done : set of resumable.file.ResumableFile
+            The files still being uploaded
+        """
+        by_future = self._futures(files)
+        done, not_done = wait(by_future, timeout)
+        return (
+            set(by_future[future] for future in done),
+            set(by_future[future] for future in not_done)
+        )
+
+    def as_completed(self, files=None, timeout=None):
+        """Iterate over files as they are uploaded.
+
+        Parameters
+        ----------
+        files : iterable of resumable.file.ResumableFile, optional
+            The files to wait for. Defaults to all files in ``files``
+        timeout : float, optional
+            The maximum time, in seconds, to wait for all the files. If
+            exceeded, ``concurrent.futures.TimeoutError`` is raised
+
+        Yields
+        ------
+        resumable.file.ResumableFile
+            Each file once uploaded, or once its upload failed or was
+            cancelled, as its ``future`` tells
+        """
+        by_future = self._futures(files)
+        for future in as_completed(by_future, timeout):
+            yield by_future[future]
+
+    def _futures(self, files):
+        if files is None:
+            files = list(self.files)
+        return dict((file.future, file) for file in files)
+
     def _wait(self):
         """Wait until all current uploads are completed."""
-        for future in as_completed(self.futures):
-            if future.exception():
-                raise future.exception()
+        self.scheduler.wait()
+
+    def _close_events(self):
+        """Wait for triggered callbacks to run, raising any error."""
+        if self.events is None:
+            return
+        self.events.close()
+        if self.events.error is not None:
+            raise self.events.error
 
     def _cancel_remaining_futures(self):
-        for future in self.futures:
-            if not future.done():
-                future.cancel()
+        self.scheduler.cancel()
+        for file in list(self.files):
+            file.cancel()
 
     def join(self):
         """Block until all uploads are complete, or an error occurs."""
         try:
             self._wait()
+            self._close_events()
         except:  # noqa: E722
             self._cancel_remaining_futures()
             raise
         finally:
-            self.executor.shutdown()
-            for file in self.files:
-                file.close()
+            self._shutdown()
+
+    def close(self):
+        """Cancel any uploads in progress and close the session.
+
+        The ``future`` of each file not yet uploaded is cancelled. Use
+        :meth:`join` instead to wait for the uploads to complete first.
+        """
+        try:
+            self._cancel_remaining_futures()
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        """Release the threads, connections and files of the session."""
+        if self.events is not None:
+            self.events.close()
+        if self._add_executor is not None:
+            self._add_executor.shutdown()
+        self.executor.shutdown()
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        self.targets.close()
+        if self.hasher is not None:
+            self._identifier_executor.shutdown()
+            self.hasher.shutdown()
+        for file in self.files:
+            file.close()
+        self.handles.close()
+        if self.journal is not None:
+            self.journal.close()
 
     def __enter__(self):
         return self
@@ -0,0 +1,192 @@
+from __future__ import division
+
+import threading
+from collections import deque, OrderedDict
+
+from resumable.util import monotonic
+
+
+class EventDispatcher(object):
+    """Run callbacks on a dedicated thread, so that they do not hold up the
+    upload threads triggering them.
+
+    Callbacks are run one at a time, in the order they were triggered. When
+    ``max_queued`` callbacks are waiting to run, triggering another blocks
+    until there is room, so that slow callbacks hold up the uploads rather
+    than using unbounded memory.
+
+    With a ``progress_rate``, progress events, such as completed chunks, are
+    coalesced: at most ``progress_rate`` of them per second are run for each
+    file, with the latest state, the ones in between being dropped. Any
+    progress event still waiting is run before the next other event of the
+    same file, so that a file's ``completed`` callback always runs after its
+    last progress event.
+
+    Parameters
+    ----------
+    max_queued : int, optional
+        The maximum number of callbacks waiting to run
+    progress_rate : float, optional
+        The maximum number of progress events per second for each file. By
+        default progress events are not coalesced
+
+    Attributes
+    ----------
+    error : Exception
+        The first exception raised by a callback, or None
+    """
+
+    def __init__(self, max_queued=1024, progress_rate=None):
+        self.max_queued = max_queued
+        self.progress_rate = progress_rate
+        self.error = None
+        self._queue = deque()
+        # Coalesced progress events by key, with the time they are due
+        self._pending = {}
+        # The time progress events of each key last ran, oldest first, kept
+        # only while they hold back the next one
+        self._last_progress = OrderedDict()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def post(self, callback, args=(), kwargs=None, key=None, progress=False):
+        """Queue a callback to be run on the dispatcher thread.
+
+        Parameters
+        ----------
+        callback : callable
+            The callback to run
+        args : tuple, optional
+            The positional arguments to run it with
+        kwargs : dict, optional
+            The keyword arguments to run it with
+        key : object, optional
+            The object, such as a file, the event relates to, for coalescing
+            its progress events
+        progress : bool, optional
+            If the event reports progress, and may be coalesced
+        """
+        event = (callback, args, kwargs or {})
+        with self._condition:
+            closed = self._closed
+            if not closed:
+                if self._thread is None:
+                    self._start()
+                if progress and self.progress_rate and key is not None:
+                    self._coalesce(key, event)
+                else:
+                    if key is not None:
+                        self._flush(key)
+                    self._wait_for_room()
+                    self._queue.append(event)
+                self._condition.notify_all()
+        if closed:
+            # Too late to queue, so run it here instead
+            self._run(event)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._dispatch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _coalesce(self, key, event):
+        """Replace any waiting progress event of a key with a new one."""
+        pending = self._pending.get(key)
+        if pending is not None:
+            self._pending[key] = (pending[0], event)
+            return
+        due = monotonic()
+        self._expire(due)
+        last = self._last_progress.get(key)
+        if last is not None:
+            due = max(due, last + 1 / self.progress_rate)
+        self._pending[key] = (due, event)
+
+    def _expire(self, now):
+        """Forget the last progress times too old to delay any event."""
+        interval = 1 / self.progress_rate
+        while self._last_progress:
+            key, last = next(iter(self._last_progress.items()))
+            if last + interval > now:
+                break
+            del self._last_progress[key]
+
+    def forget(self, key):
+        """Drop the state kept for the progress events of a key, such as a
+        file no longer uploaded, queueing any waiting event straight away.
+
+        Parameters
+        ----------
+        key : object
+            The object the events relate to
+        """
+        with self._condition:
+            self._flush(key)
+            self._condition.notify_all()
+
+    def _flush(self, key):
+        """Queue any waiting progress event of a key straight away."""
+        pending = self._pending.pop(key, None)
+        self._last_progress.pop(key, None)
+        if pending is not None:
+            self._queue.append(pending[1])
+
+    def _wait_for_room(self):
+        # A callback triggering another must not wait for itself
+        if threading.current_thread() is self._thread:
+            return
+        while len(self._queue) >= self.max_queued:
+            self._condition.wait()
+
+    def _next_event(self):
+        """Wait for the next event to run, or None once closed."""
+        with self._condition:
+            while True:
+                if self._queue:
+                    self._condition.notify_all()
+                    return self._queue.popleft()
+                if self._pending:
+                    now = monotonic()
+                    key, (due, event) = min(
+                        self._pending.items(), key=lambda item: item[1][0]
+                    )
+                    if due <= now or self._closed:
+                        del self._pending[key]
+                        self._expire(now)
+                        self._last_progress.pop(key, None)
+                        self._last_progress[key] = now
+                        return event
+                    self._condition.wait(due - now)
+                elif self._closed:
+                    return None
+                else:
+                    self._condition.wait()
+
+    def _dispatch(self):
+        while True:
+            event = self._next_event()
+            if event is None:
+                return
+            self._run(event)
+
+    def _run(self, event):
+        callback, args, kwargs = event
+        try:
+            callback(*args, **kwargs)
+        except Exception as error:
+            if self.error is None:
+                self.error = error
+
+    def close(self):
+        """Run all waiting callbacks, then stop the dispatcher thread.
+
+        Callbacks triggered after closing are run straight away, on the
+        thread triggering them.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
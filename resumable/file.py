@@ -4,16 +4,56 @@ import os
 import uuid
 from threading import Lock
 from collections import namedtuple
-from functools import partial
+from concurrent.futures import Future
+try:
+    from collections.abc import Sequence
+except ImportError:  # Python 2
+    from collections import Sequence
 
 from resumable.util import CallbackDispatcher
+from resumable.chunk import ChunkProbe
+from resumable.reader import HandlePool
 
 
-FileChunk = namedtuple('FileChunk', ['index', 'size', 'read'])
+FileChunk = namedtuple('FileChunk', ['index', 'start', 'size', 'read'])
 
 
-def build_chunks(read_bytes, file_size, chunk_size):
-    """Build a sequence of chunks from a file.
+class _RangeReader(object):
+    """Read a fixed byte range of a file.
+
+    Equivalent to ``functools.partial(read_bytes, start, size)``, but compares
+    equal for equal ranges, so that chunks built on separate accesses to a
+    ChunkTable also compare equal.
+    """
+
+    __slots__ = ('read_bytes', 'start', 'size')
+
+    def __init__(self, read_bytes, start, size):
+        self.read_bytes = read_bytes
+        self.start = start
+        self.size = size
+
+    def __call__(self):
+        return self.read_bytes(self.start, self.size)
+
+    def _key(self):
+        return (self.read_bytes, self.start, self.size)
+
+    def __eq__(self, other):
+        return isinstance(other, _RangeReader) and self._key() == other._key()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+class ChunkTable(Sequence):
+    """The chunks of a file, computed on demand.
+
+    Only the file and chunk sizes are stored, and each chunk is built when it
+    is accessed, so the memory used does not depend on the number of chunks.
 
     Parameters
     ----------
@@ -22,29 +62,56 @@ def build_chunks(read_bytes, file_size, chunk_size):
     file_size : int
         The total size of the file, in bytes
     chunk_size : int
-        The size of the generated chunks, in bytes
-
-    Returns
-    -------
-    list of resumable.file.FileChunk
+        The size of the chunks, in bytes
     """
 
-    chunks = []
+    def __init__(self, read_bytes, file_size, chunk_size):
+        self.read_bytes = read_bytes
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self._length = (file_size + chunk_size - 1) // chunk_size
+
+    def __len__(self):
+        return self._length
+
+    def _chunk(self, index):
+        start = index * self.chunk_size
+        size = min(self.chunk_size, self.file_size - start)
+        return FileChunk(
+            index, start, size, _RangeReader(self.read_bytes, start, size)
+        )
 
-    index = 0
-    start = 0
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._chunk(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('chunk index out of range')
+        return self._chunk(index)
 
-    while start < file_size:
-        end = min(start + chunk_size, file_size)
-        size = end - start
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self._chunk(index)
 
-        chunk = FileChunk(index, size, partial(read_bytes, start, size))
-        chunks.append(chunk)
 
-        index += 1
-        start += chunk_size
+def build_chunks(read_bytes, file_size, chunk_size):
+    """Build a sequence of chunks from a file.
 
-    return chunks
+    Parameters
+    ----------
+    read_bytes : callable
+        A callable returning the data for a byte range of a file
+    file_size : int
+        The total size of the file, in bytes
+    chunk_size : int
+        The size of the generated chunks, in bytes
+
+    Returns
+    -------
+    resumable.file.ChunkTable
+    """
+    return ChunkTable(read_bytes, file_size, chunk_size)
 
 
 class ResumableFile(object):
@@ -53,12 +120,50 @@ class ResumableFile(object):
     Parameters
     ----------
     path : str or pathlib.Path
-        The path of the file
+        The path of the file, or with a ``source`` the name to upload it as
     chunk_size : int
         The size, in bytes, of chunks uploaded in a single request
+    journal : resumable.journal.Journal, optional
+        A journal to record completed chunks in. If the journal already has a
+        record of the file, its identifier and completed chunks are restored
+    relative_path : str, optional
+        The path of the file sent to the server as ``resumableRelativePath``.
+        Defaults to ``path``
+    size : int, optional
+        The size of the file in bytes, if already known from a stat of it
+    handles : resumable.reader.HandlePool, optional
+        A pool of open files shared with other files, to read the file
+        through. The file is only opened on its first read, and is closed
+        once completed or when evicted from the pool, and reopened as needed
+    events : resumable.events.EventDispatcher, optional
+        Runs the callbacks of the file on its own thread, coalescing
+        ``chunk_completed`` events if it has a ``progress_rate``
+    source : object, optional
+        Where to read the content of the file from, rather than from
+        ``path``, such as a :class:`resumable.source.BufferSource` of data in
+        memory. Sources have a ``size`` and a ``read(start, num_bytes)``
+        method. The progress of files read from a source is not recorded in
+        the journal, as their content can not be checked to be the same
 
     Attributes
     ----------
+    resumed : bool
+        If the progress of the file was restored from a journal
+    priority : int
+        The priority of the file, used by the ``'priority'`` scheduling
+        policy, which uploads files of higher priority first
+    rate_limit : resumable.ratelimit.TokenBucket
+        A limit on the rate chunks of this file are sent at, in addition to
+        any limit of the session, or None
+    retries : int
+        The number of times uploads of chunks of this file were retried
+    backoff_time : float
+        The total time, in seconds, spent waiting to retry chunk uploads
+    probe : resumable.chunk.ChunkProbe
+        The results of testing for chunks of this file on the server
+    future : concurrent.futures.Future
+        Completed with the file once all its chunks have been uploaded, or
+        with the exception failing its upload
     completed : resumable.util.CallbackDispatcher
         Triggered when all chunks of the file have been uploaded
     chunk_completed : resumable.util.CallbackDispatcher
@@ -66,55 +171,198 @@ class ResumableFile(object):
         chunk
     """
 
-    def __init__(self, path, chunk_size):
+    def __init__(self, path, chunk_size, journal=None, relative_path=None,
+                 size=None, handles=None, events=None, source=None):
 
         self.path = str(path)
+        self.relative_path = self.path if relative_path is None \
+            else relative_path
         self.unique_identifier = uuid.uuid4()
         self.chunk_size = int(chunk_size)
-        self.size = os.path.getsize(self.path)
+        self.source = source
+        if source is not None:
+            size = source.size
+            journal = None
+        self.size = os.path.getsize(self.path) if size is None else size
 
-        self._fp = open(self.path, 'rb')
-        self._fp_lock = Lock()
+        self._handles = HandlePool() if handles is None else handles
 
         self.chunks = build_chunks(self._read_bytes, self.size, chunk_size)
-        self._chunk_done = {chunk: False for chunk in self.chunks}
+        self._chunk_done = bytearray(len(self.chunks))
+        self._chunks_completed = 0
+        self._chunk_done_lock = Lock()
+        self.probe = ChunkProbe()
+        self.priority = 0
+        self.rate_limit = None
+        self.retries = 0
+        self.backoff_time = 0.0
 
-        self.completed = CallbackDispatcher()
-        self.chunk_completed = CallbackDispatcher()
+        self.resumed = False
+        self._journal_entry = None
+        if journal is not None:
+            self._restore(journal)
+
+        self.completed = CallbackDispatcher(events, key=self)
+        self.chunk_completed = CallbackDispatcher(
+            events, key=self, progress=True
+        )
+
+        self.future = Future()
+        self._resolved = False
+        if self.is_completed:
+            self._resolve(result=self)
+
+    def _restore(self, journal):
+        """Restore the progress of a previous upload from a journal."""
+        entry = journal.entry(
+            self.path, self.chunk_size, str(self.unique_identifier)
+        )
+        if entry.resumed:
+            self.resumed = True
+            self.unique_identifier = entry.identifier
+            for index in entry.completed_indices():
+                if index < len(self._chunk_done):
+                    self._chunk_done[index] = 1
+                    self._chunks_completed += 1
+            # The journal tells us what is on the server already
+            self.probe.disable()
+        self._journal_entry = entry
+
+    def set_identifier(self, identifier):
+        """Change the unique identifier of the file before uploading it.
+
+        Parameters
+        ----------
+        identifier : str
+            The new unique identifier
+        """
+        self.unique_identifier = identifier
+        if self._journal_entry is not None:
+            self._journal_entry.set_identifier(identifier)
+
+    @property
+    def is_open(self):
+        """Indicates if the file is currently open for reading."""
+        return self._handles.is_open(self)
 
     def close(self):
         """Close the file."""
-        self._fp.close()
+        self._handles.discard(self)
 
     def _read_bytes(self, start, num_bytes):
-        """Read a byte range from the file."""
-        with self._fp_lock:
-            self._fp.seek(start)
-            return self._fp.read(num_bytes)
+        """Read a byte range from the file, opening it if needed."""
+        if self.source is not None:
+            return self.source.read(start, num_bytes)
+        return self._handles.read(self, self.path, self.size, start, num_bytes)
+
+    def _read_into(self, start, buffer):
+        """Read a byte range from the file into a buffer, opening it if
+        needed, returning the number of bytes read."""
+        if self.source is not None:
+            data = self.source.read(start, len(buffer))
+            memoryview(buffer)[:len(data)] = data
+            return len(data)
+        return self._handles.read_into(self, self.path, self.size, start,
+                                       buffer)
 
     @property
     def is_completed(self):
         """Indicates if all chunks of this file have been uploaded."""
-        return all(self._chunk_done.values())
+        return self._chunks_completed == len(self.chunks)
+
+    @property
+    def chunks_completed(self):
+        """The number of chunks of this file that have been uploaded."""
+        return self._chunks_completed
 
     @property
     def fraction_completed(self):
         """The fraction of the file that has been completed."""
-        return sum(self._chunk_done.values()) / len(self.chunks)
+        return self._chunks_completed / len(self.chunks)
+
+    def record_retry(self, delay):
+        """Record a retry of the upload of a chunk of this file.
+
+        Parameters
+        ----------
+        delay : float
+            The time, in seconds, waited before retrying
+        """
+        with self._chunk_done_lock:
+            self.retries += 1
+            self.backoff_time += delay
+
+    def is_chunk_completed(self, chunk):
+        """Indicates if a chunk of this file has been uploaded."""
+        return bool(self._chunk_done[chunk.index])
 
     def mark_chunk_completed(self, chunk):
         """Mark a chunk of this file as having been successfully uploaded.
 
         If all chunks have been completed, this will trigger the `completed`
-        callback of this file.
+        callback of this file. Chunks already marked as completed are ignored.
 
         Parameters
         ----------
         chunk : resumable.chunk.FileChunk
             The chunk to mark as completed
         """
-        self._chunk_done[chunk] = True
-        if self.is_completed:
+        completed = self._record_chunk(chunk)
+        if completed is not None:
+            self._chunk_recorded(chunk, completed)
+
+    def _record_chunk(self, chunk):
+        """Record a chunk as completed, including in the journal.
+
+        Returns None if the chunk was already completed, otherwise if all
+        chunks of the file now are.
+        """
+        with self._chunk_done_lock:
+            if self._chunk_done[chunk.index]:
+                return None
+            self._chunk_done[chunk.index] = 1
+            self._chunks_completed += 1
+            completed = self._chunks_completed == len(self.chunks)
+        if self._journal_entry is not None:
+            self._journal_entry.record(chunk.index)
+        return completed
+
+    def _chunk_recorded(self, chunk, completed):
+        """Trigger the callbacks of a chunk newly recorded as completed."""
+        self.chunk_completed.trigger(chunk)
+        if completed:
             self.completed.trigger()
             self.close()
-        self.chunk_completed.trigger(chunk)
+            self._resolve(result=self)
+
+    def fail(self, error):
+        """Fail the upload of this file, unless it has completed already.
+
+        Parameters
+        ----------
+        error : Exception
+            The exception the future of the file is completed with
+        """
+        self._resolve(error=error)
+        self.close()
+
+    def cancel(self):
+        """Cancel the upload of this file, unless already completed."""
+        self._resolve(cancel=True)
+        self.close()
+
+    def _resolve(self, result=None, error=None, cancel=False):
+        """Complete the future of the file once, running its callbacks
+        outside the lock."""
+        with self._chunk_done_lock:
+            if self._resolved:
+                return
+            self._resolved = True
+        if cancel:
+            # Never set running, so waiters are only woken by this
+            self.future.cancel()
+            self.future.set_running_or_notify_cancel()
+        elif error is None:
+            self.future.set_result(result)
+        else:
+            self.future.set_exception(error)
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from resumable.reader import open_reader
+
+
+MiB = 1024 * 1024
+
+# The size of the ranges of a file hashed independently. This is fixed rather
+# than following the chunk size, so that identifiers do not depend on it.
+LEAF_SIZE = 4 * MiB
+
+# The size of the blocks read from a file while hashing
+BLOCK_SIZE = MiB
+
+CACHE_SIZE = 10000
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+def _cache_key(stat):
+    mtime = getattr(stat, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(stat.st_mtime * 1e9)
+    return (stat.st_dev, stat.st_ino, stat.st_size, mtime)
+
+
+def _cache_get(key):
+    with _cache_lock:
+        identifier = _cache.pop(key, None)
+        if identifier is not None:
+            _cache[key] = identifier
+        return identifier
+
+
+def _cache_put(key, identifier):
+    with _cache_lock:
+        _cache[key] = identifier
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _hash_range(reader, start, size):
+    """Hash a byte range of a file."""
+    digest = hashlib.sha256()
+    end = start + size
+    while start < end:
+        data = reader.read(start, min(BLOCK_SIZE, end - start))
+        if not data:
+            raise IOError('file ended before its expected size')
+        digest.update(data)
+        start += len(data)
+    return digest.digest()
+
+
+class ContentHasher(object):
+    """Compute unique identifiers for files from their content.
+
+    The identifier is derived from a tree hash: ranges of the file are hashed
+    independently on a thread pool, with hashlib releasing the GIL so that
+    multiple cores are used, and the identifier is a hash of the digests of
+    the ranges. Identifiers are cached by device, inode, size and
+    modification time, so unchanged files are not hashed again.
+
+    Parameters
+    ----------
+    workers : int, optional
+        The number of threads to hash with. Defaults to the number of CPUs
+    leaf_size : int, optional
+        The size, in bytes, of the ranges of a file hashed independently
+    """
+
+    def __init__(self, workers=None, leaf_size=LEAF_SIZE):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.leaf_size = leaf_size
+        self.executor = ThreadPoolExecutor(workers)
+
+    def identify(self, path):
+        """Compute the unique identifier of a file.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file
+
+        Returns
+        -------
+        str
+        """
+        stat = os.stat(path)
+        key = _cache_key(stat) + (self.leaf_size,)
+        identifier = _cache_get(key)
+        if identifier is None:
+            identifier = self._hash_file(path, stat.st_size)
+            _cache_put(key, identifier)
+        return identifier
+
+    def identify_source(self, source):
+        """Compute the unique identifier of data read from a source.
+
+        Identifiers of sources are not cached, as their content can not be
+        checked to be unchanged.
+
+        Parameters
+        ----------
+        source : object
+            A source of the data, with a ``size`` and a
+            ``read(start, num_bytes)`` method, such as a
+            :class:`resumable.source.BufferSource`
+
+        Returns
+        -------
+        str
+        """
+        return self._hash_reader(source, source.size)
+
+    def _hash_file(self, path, size):
+        reader = open_reader(path, size)
+        try:
+            return self._hash_reader(reader, size)
+        finally:
+            reader.close()
+
+    def _hash_reader(self, reader, size):
+        digests = []
+        # Keep a bounded window of leaves in progress
+        pending = deque()
+        for start in range(0, size, self.leaf_size):
+            length = min(self.leaf_size, size - start)
+            pending.append(
+                self.executor.submit(_hash_range, reader, start, length)
+            )
+            if len(pending) >= 2 * self.workers:
+                digests.append(pending.popleft().result())
+        while pending:
+            digests.append(pending.popleft().result())
+
+        tree = hashlib.sha256(b''.join(digests)).hexdigest()
+        return '{0}-{1}'.format(size, tree)
+
+    def shutdown(self):
+        """Stop the hashing threads."""
+        self.executor.shutdown()
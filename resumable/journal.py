@@ -0,0 +1,206 @@
+import os
+import sqlite3
+from threading import Lock
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    identifier TEXT NOT NULL,
+    completed BLOB NOT NULL,
+    PRIMARY KEY (path, size, mtime, inode, chunk_size)
+)
+"""
+
+
+def _file_key(path, chunk_size):
+    """Identify a version of a file, as split into chunks of a given size."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    mtime = getattr(stat, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = int(stat.st_mtime * 1e9)
+    return (path, stat.st_size, mtime, stat.st_ino, chunk_size)
+
+
+class JournalEntry(object):
+    """The journal record of a single file.
+
+    Parameters
+    ----------
+    journal : resumable.journal.Journal
+        The journal the entry belongs to
+    key : tuple
+        The key of the file in the journal
+    identifier : str
+        The unique identifier the file is uploaded with
+    completed : bytearray
+        A bitmap of the chunks of the file that have been completed
+    resumed : bool
+        If the entry was recorded by a previous session
+    """
+
+    def __init__(self, journal, key, identifier, completed, resumed):
+        self.journal = journal
+        self.key = key
+        self.identifier = identifier
+        self.completed = completed
+        self.resumed = resumed
+
+    def is_chunk_completed(self, index):
+        """Indicates if a chunk was recorded as completed."""
+        byte = index // 8
+        if byte >= len(self.completed):
+            return False
+        return bool(self.completed[byte] & (1 << (index % 8)))
+
+    def completed_indices(self):
+        """Generate the indices of chunks recorded as completed."""
+        for byte, value in enumerate(self.completed):
+            if value:
+                for bit in range(8):
+                    if value & (1 << bit):
+                        yield byte * 8 + bit
+
+    def set_identifier(self, identifier):
+        """Change the identifier recorded for the file.
+
+        Parameters
+        ----------
+        identifier : str
+            The unique identifier the file is uploaded with
+        """
+        self.journal._set_identifier(self, identifier)
+
+    def record(self, index):
+        """Record a chunk of the file as completed.
+
+        Parameters
+        ----------
+        index : int
+            The index of the chunk
+        """
+        self.journal._record(self, index)
+
+
+class Journal(object):
+    """A local record of upload progress, persisted in a SQLite database.
+
+    The journal stores the identifier files are uploaded with and a bitmap of
+    their completed chunks, keyed by the path, size, modification time and
+    inode of the file, so that an upload restarted after a crash can reuse the
+    identifier and go straight to the missing chunks. Changes are committed to
+    disk in batches.
+
+    Parameters
+    ----------
+    path : str
+        The path of the database file
+    sync_every : int, optional
+        The number of completed chunks to record between commits to disk
+    """
+
+    def __init__(self, path, sync_every=64):
+        self.path = path
+        self.sync_every = sync_every
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA synchronous = FULL')
+        self._connection.execute(SCHEMA)
+        self._connection.commit()
+        self._lock = Lock()
+        self._dirty = set()
+        self._pending = 0
+
+    def entry(self, path, chunk_size, identifier):
+        """Get the entry for a file, creating one if not already recorded.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file
+        chunk_size : int
+            The size, in bytes, of the chunks the file is uploaded in
+        identifier : str
+            The identifier to record for the file if not already recorded
+
+        Returns
+        -------
+        resumable.journal.JournalEntry
+        """
+        key = _file_key(path, chunk_size)
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT identifier, completed FROM files WHERE path = ? AND '
+                'size = ? AND mtime = ? AND inode = ? AND chunk_size = ?',
+                key
+            ).fetchone()
+            if row is not None:
+                identifier, completed = row
+                return JournalEntry(
+                    self, key, identifier, bytearray(completed), True
+                )
+
+            # Entries for other versions of the file can not be resumed
+            self._connection.execute(
+                'DELETE FROM files WHERE path = ?', (key[0],)
+            )
+            self._connection.execute(
+                'INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                key + (identifier, sqlite3.Binary(b''))
+            )
+            self._pending += 1
+            entry = JournalEntry(self, key, identifier, bytearray(), False)
+            self._sync_if_due()
+            return entry
+
+    def _set_identifier(self, entry, identifier):
+        with self._lock:
+            entry.identifier = identifier
+            self._connection.execute(
+                'UPDATE files SET identifier = ? WHERE path = ? AND size = ? '
+                'AND mtime = ? AND inode = ? AND chunk_size = ?',
+                (identifier,) + entry.key
+            )
+            self._pending += 1
+            self._sync_if_due()
+
+    def _record(self, entry, index):
+        with self._lock:
+            byte = index // 8
+            missing = byte + 1 - len(entry.completed)
+            if missing > 0:
+                entry.completed.extend(bytearray(missing))
+            entry.completed[byte] |= 1 << (index % 8)
+            self._dirty.add(entry)
+            self._pending += 1
+            self._sync_if_due()
+
+    def _sync_if_due(self):
+        if self._pending >= self.sync_every:
+            self._sync()
+
+    def _sync(self):
+        for entry in self._dirty:
+            self._connection.execute(
+                'UPDATE files SET completed = ? WHERE path = ? AND size = ? '
+                'AND mtime = ? AND inode = ? AND chunk_size = ?',
+                (sqlite3.Binary(bytes(entry.completed)),) + entry.key
+            )
+        self._connection.commit()
+        self._dirty.clear()
+        self._pending = 0
+
+    def sync(self):
+        """Commit all recorded changes to disk."""
+        with self._lock:
+            self._sync()
+
+    def close(self):
+        """Commit all recorded changes and close the journal."""
+        with self._lock:
+            self._sync()
+            self._connection.close()
@@ -0,0 +1,149 @@
+import os
+import binascii
+
+from resumable.util import as_bytes
+
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _to_bytes(value):
+    """Encode a form value as UTF-8 bytes."""
+    if isinstance(value, bytes):
+        return value
+    if not isinstance(value, type(u'')):
+        value = str(value)
+    return value.encode('utf-8')
+
+
+class MultipartEncoder(object):
+    """A streamed multipart/form-data request body.
+
+    The form fields are encoded up front, but the file data is only read as
+    the body is consumed, a block at a time, so that the memory used is
+    bounded by the block size rather than the size of the file part. The
+    total length is known in advance, so the request can be sent with a
+    Content-Length rather than a chunked transfer encoding.
+
+    Parameters
+    ----------
+    fields : dict
+        The form fields to send before the file part
+    name : str
+        The name of the form field for the file part
+    read : callable
+        Called with an offset into the file part and a number of bytes,
+        returning the data for that range
+    size : int
+        The size, in bytes, of the file part
+    filename : str, optional
+        The filename sent with the file part
+    block_size : int, optional
+        The maximum number of bytes of the file part read at once
+    throttle : callable, optional
+        Called with the number of bytes of the body about to be read, waiting
+        until they may be sent, to limit the rate the body is sent at
+
+    Attributes
+    ----------
+    head : bytes
+        The encoded body up to the start of the file data
+    tail : bytes
+        The encoded body following the file data
+    read_file : callable
+        The callable reading ranges of the file part
+    """
+
+    def __init__(self, fields, name, read, size, filename=None,
+                 block_size=BLOCK_SIZE, throttle=None):
+
+        self.fields = fields
+        self.size = size
+        self.block_size = block_size
+        self.throttle = throttle
+        self.boundary = binascii.hexlify(os.urandom(16)).decode('ascii')
+
+        self.read_file = read
+        self._position = 0
+        self._block = b''
+        self._block_start = 0
+
+        head = []
+        for key, value in fields.items():
+            head.append(self._part_header(key))
+            head.append(_to_bytes(value))
+            head.append(b'\r\n')
+        head.append(self._part_header(
+            name, filename or name, 'application/octet-stream'
+        ))
+        self.head = b''.join(head)
+        self.tail = b'\r\n--' + _to_bytes(self.boundary) + b'--\r\n'
+
+    @property
+    def content_type(self):
+        """The Content-Type header value for the body."""
+        return 'multipart/form-data; boundary={0}'.format(self.boundary)
+
+    def _part_header(self, name, filename=None, content_type=None):
+        header = [
+            b'--', _to_bytes(self.boundary), b'\r\n',
+            b'Content-Disposition: form-data; name="', _to_bytes(name), b'"'
+        ]
+        if filename is not None:
+            header += [b'; filename="', _to_bytes(filename), b'"']
+        if content_type is not None:
+            header += [b'\r\nContent-Type: ', _to_bytes(content_type)]
+        header.append(b'\r\n\r\n')
+        return b''.join(header)
+
+    def __len__(self):
+        return len(self.head) + self.size + len(self.tail)
+
+    def _read_buffered(self, offset, num_bytes):
+        """Read from the file part, through a single block buffer."""
+        block_end = self._block_start + len(self._block)
+        if not self._block_start <= offset < block_end:
+            length = min(self.block_size, self.size - offset)
+            self._block = self.read_file(offset, length)
+            self._block_start = offset
+            if not self._block:
+                raise IOError('file part ended before its declared size')
+        start = offset - self._block_start
+        return self._block[start:start + num_bytes]
+
+    def _read_part(self, num_bytes):
+        """Read from the part of the body at the current position."""
+        position = self._position
+        if position < len(self.head):
+            return self.head[position:position + num_bytes]
+        position -= len(self.head)
+        if position < self.size:
+            return self._read_buffered(position, num_bytes)
+        position -= self.size
+        return self.tail[position:position + num_bytes]
+
+    def read(self, size=-1):
+        """Read the next bytes of the body.
+
+        Parameters
+        ----------
+        size : int, optional
+            The maximum number of bytes to read, or the remainder of the body
+            if negative
+
+        Returns
+        -------
+        bytes
+        """
+        remaining = len(self) - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if self.throttle is not None and size > 0:
+            self.throttle(size)
+        parts = []
+        while size > 0:
+            data = as_bytes(self._read_part(size))
+            parts.append(data)
+            size -= len(data)
+            self._position += len(data)
+        return b''.join(parts)
@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+
+from resumable.stats import READ
+from resumable.util import monotonic
+
+
+class BufferPool(object):
+    """A pool of reusable buffers, with a cap on the memory they use.
+
+    Buffers are allocated on first use and kept for reuse once released, so
+    that reading chunks does not allocate after the pool has warmed up.
+    Free buffers too small for a request are dropped to make room for larger
+    ones, so the total allocated never exceeds ``max_bytes``.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum total size, in bytes, of the buffers of the pool
+
+    Attributes
+    ----------
+    allocated : int
+        The total size, in bytes, of the buffers of the pool, free or not
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.allocated = 0
+        self._free = []
+        self._lock = Lock()
+
+    def acquire(self, size):
+        """Take a buffer of at least some size, without waiting.
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes needed
+
+        Returns
+        -------
+        bytearray or None
+            A buffer, or None if taking one would exceed the cap
+        """
+        with self._lock:
+            fitting = [buffer for buffer in self._free if len(buffer) >= size]
+            if fitting:
+                buffer = min(fitting, key=len)
+                self._free.remove(buffer)
+                return buffer
+            while self._free and self.allocated + size > self.max_bytes:
+                self.allocated -= len(self._free.pop())
+            if self.allocated + size > self.max_bytes:
+                return None
+            self.allocated += size
+        return bytearray(size)
+
+    def release(self, buffer):
+        """Return a buffer to the pool for reuse."""
+        with self._lock:
+            self._free.append(buffer)
+
+    def clear(self):
+        """Drop the free buffers."""
+        with self._lock:
+            for buffer in self._free:
+                self.allocated -= len(buffer)
+            del self._free[:]
+
+
+class Prefetcher(object):
+    """Read chunks ahead of their upload, so that disk reads overlap sends.
+
+    Chunks are read as they near their upload, on a few threads of their
+    own, into buffers of a :class:`BufferPool`. The upload takes the
+    chunk data from its buffer, and keeps it for any retries, releasing it
+    once resolved. Chunks for which there is no room in the pool, and those
+    of files not read from disk, are read by the upload as usual. Buffers of
+    reads that fail or are cancelled before being taken are released
+    straight away.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The maximum memory, in bytes, used for chunk data read ahead
+    workers : int, optional
+        The number of threads reading chunks
+    stats : resumable.stats.UploadStats, optional
+        Statistics to record the time spent reading chunks in
+    """
+
+    def __init__(self, max_bytes, workers=2, stats=None):
+        self.buffers = BufferPool(max_bytes)
+        self.stats = stats
+        self._executor = ThreadPoolExecutor(workers)
+        self._pending = {}
+        self._in_use = {}
+        self._lock = Lock()
+
+    def schedule(self, file, chunk):
+        """Start reading a chunk that is soon to be uploaded.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        chunk : resumable.file.FileChunk
+
+        Returns
+        -------
+        bool or None
+            True if the chunk is being read, False if there is no room in
+            the pool for it, or None if it is not read ahead
+        """
+        if file.source is not None or not chunk.size:
+            # Already in memory, or read on demand from an object
+            return None
+        buffer = self.buffers.acquire(chunk.size)
+        if buffer is None:
+            return False
+        view = memoryview(buffer)[:chunk.size]
+        key = (file, chunk.index)
+        with self._lock:
+            future = self._executor.submit(self._read, file, chunk, view)
+            self._pending[key] = (future, buffer)
+        future.add_done_callback(partial(self._read_done, key))
+        return True
+
+    def _read(self, file, chunk, view):
+        start = monotonic()
+        received = file._read_into(chunk.start, view)
+        if self.stats is not None:
+            self.stats.observe(READ, monotonic() - start)
+        if received != chunk.size:
+            raise IOError('file ended before the end of the chunk')
+        return view
+
+    def _read_done(self, key, future):
+        """Release the buffer of a read not taken, if it came to nothing."""
+        if not future.cancelled() and future.exception() is None:
+            return
+        with self._lock:
+            future_and_buffer = self._pending.get(key)
+            if future_and_buffer is None or future_and_buffer[0] is not future:
+                # Taken already
+                return
+            del self._pending[key]
+        self.buffers.release(future_and_buffer[1])
+
+    def take(self, file, chunk):
+        """Get the data of a chunk read ahead, waiting for the read.
+
+        A read not yet started is cancelled rather than waited for, so that
+        the upload is not held up behind the reads of other chunks.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        chunk : resumable.file.FileChunk
+
+        Returns
+        -------
+        memoryview or None
+            The content of the chunk, valid until :meth:`release` is called,
+            or None if it was not read ahead
+        """
+        key = (file, chunk.index)
+        with self._lock:
+            future, buffer = self._pending.pop(key, (None, None))
+        if future is None:
+            return None
+        if future.cancel() or future.exception() is not None:
+            # Read by the upload instead, raising any error there
+            self.buffers.release(buffer)
+            return None
+        with self._lock:
+            self._in_use[key] = buffer
+        return future.result()
+
+    def discard(self, file):
+        """Drop the reads of chunks of a file not yet taken, such as once it
+        has failed or been cancelled.
+
+        Reads not yet started are cancelled, and the buffers of the others
+        are released once they finish.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        """
+        with self._lock:
+            keys = [key for key in self._pending if key[0] is file]
+            discarded = [self._pending.pop(key) for key in keys]
+        for future, buffer in discarded:
+            future.cancel()
+            future.add_done_callback(partial(self._discarded, buffer))
+
+    def _discarded(self, buffer, future):
+        self.buffers.release(buffer)
+
+    def release(self, file, chunk):
+        """Return the buffer of a chunk taken with :meth:`take` to the pool.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        chunk : resumable.file.FileChunk
+        """
+        with self._lock:
+            buffer = self._in_use.pop((file, chunk.index), None)
+        if buffer is not None:
+            self.buffers.release(buffer)
+
+    def close(self):
+        """Cancel pending reads, stop the reading threads and free buffers."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _ in pending:
+            future.cancel()
+        self._executor.shutdown()
+        self.buffers.clear()
@@ -0,0 +1,277 @@
+from __future__ import division
+
+import os
+import pickle
+import threading
+import multiprocessing
+from collections import deque
+
+from resumable.core import Resumable
+from resumable.file import FileChunk
+from resumable.chunk import ResumableError
+from resumable.util import CallbackDispatcher
+
+
+def _portable_error(error):
+    """Make sure an exception can be sent back to the parent process."""
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return ResumableError(repr(error))
+    return error
+
+
+def _run_worker(index, target, options, tasks, events):
+    """Upload the files sent to a worker process with a Resumable session."""
+
+    keys = {}
+    # The keys of files being added, in order. Their file_added callbacks run
+    # in the same order, but may run later on the callback thread
+    adding = deque()
+
+    def added(file):
+        key = keys[file] = adding.popleft()
+        events.put(('added', key, dict(
+            unique_identifier=str(file.unique_identifier),
+            size=file.size,
+            chunk_size=file.chunk_size,
+            num_chunks=len(file.chunks)
+        )))
+
+    def chunk_completed(file, chunk):
+        # Send the count, as chunk_completed callbacks may be coalesced
+        events.put((
+            'chunk_completed', keys[file],
+            (chunk.index, chunk.start, chunk.size,
+             str(file.unique_identifier), file.chunks_completed)
+        ))
+
+    def file_completed(file):
+        events.put(('completed', keys.pop(file), None))
+
+    error = None
+    try:
+        session = Resumable(target, **options)
+        session.file_added.register(added)
+        session.chunk_completed.register(chunk_completed)
+        session.file_completed.register(file_completed)
+        for key, path in iter(tasks.get, None):
+            adding.append(key)
+            session.add_file(path)
+        session.join()
+    except BaseException as exception:
+        error = _portable_error(exception)
+    events.put(('done', index, error))
+
+
+class RemoteFile(object):
+    """A file being uploaded by a worker process.
+
+    Mirrors the progress of the :class:`resumable.file.ResumableFile` in the
+    worker, as reported back to the parent process.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file
+    unique_identifier : str
+        The identifier of the file, or None until reported by the worker
+    size : int
+        The size of the file in bytes, or None until reported by the worker
+    chunk_size : int
+        The size, in bytes, of the chunks of the file, or None until reported
+    num_chunks : int
+        The number of chunks of the file, or None until reported
+    completed : resumable.util.CallbackDispatcher
+        Triggered when all chunks of the file have been uploaded
+    chunk_completed : resumable.util.CallbackDispatcher
+        Triggered when a chunk of the file has been uploaded, passing the
+        chunk, without its ``read`` function
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.unique_identifier = None
+        self.size = None
+        self.chunk_size = None
+        self.num_chunks = None
+        self.chunks_completed = 0
+        self.completed = CallbackDispatcher()
+        self.chunk_completed = CallbackDispatcher()
+
+    @property
+    def is_completed(self):
+        """Indicates if all chunks of this file have been uploaded."""
+        return self.num_chunks is not None and \
+            self.chunks_completed == self.num_chunks
+
+    @property
+    def fraction_completed(self):
+        """The fraction of the file that has been completed."""
+        if not self.num_chunks:
+            return 0.0
+        return self.chunks_completed / self.num_chunks
+
+
+class ProcessPoolResumable(object):
+    """A resumable.py upload client sharding files across processes.
+
+    Files are spread across ``processes`` worker processes, each running a
+    :class:`resumable.Resumable` session with its own connections and thread
+    pool, so that CPU-bound work per chunk, such as hashing or TLS, is not
+    limited to a single core by the GIL. Each file is uploaded entirely by
+    one worker, which is chosen to balance the bytes queued in each.
+
+    Callbacks are forwarded to this session's dispatchers in the parent
+    process, with :class:`RemoteFile` objects mirroring the files' progress.
+    They are triggered from a thread listening for events from the workers.
+
+    Parameters
+    ----------
+    target : str or list of str
+        The URL of the resumable upload target, or several, as for
+        :class:`resumable.Resumable`
+    processes : int, optional
+        The number of worker processes. Defaults to the number of CPUs
+    **options
+        Options of the :class:`resumable.Resumable` session of each worker.
+        These are sent to the workers, so must be picklable, and a journal
+        must be given by its path
+
+    Attributes
+    ----------
+    file_added : resumable.util.CallbackDispatcher
+        Triggered when a file has been added by a worker, passing the file
+        object
+    file_completed : resumable.util.CallbackDispatcher
+        Triggered when a file upload has completed, passing the file object
+    chunk_completed : resumable.util.CallbackDispatcher
+        Triggered when a chunk upload has completed, passing the file and chunk
+        objects
+    """
+
+    def __init__(self, target, processes=None, **options):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self.target = target
+        self.processes = processes
+        self.options = options
+
+        self.files = []
+        self._workers = []
+        self._tasks = []
+        self._queued_bytes = [0] * processes
+        self._events = None
+        self._listener = None
+        self._error = None
+
+        self.file_added = CallbackDispatcher()
+        self.file_completed = CallbackDispatcher()
+        self.chunk_completed = CallbackDispatcher()
+
+    def _start(self):
+        self._events = multiprocessing.Queue()
+        for index in range(self.processes):
+            tasks = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_run_worker,
+                args=(index, self.target, self.options, tasks, self._events)
+            )
+            worker.daemon = True
+            worker.start()
+            self._tasks.append(tasks)
+            self._workers.append(worker)
+        self._listener = threading.Thread(target=self._listen)
+        self._listener.daemon = True
+        self._listener.start()
+
+    def add_file(self, path):
+        """Add a file to be uploaded by one of the worker processes.
+
+        Parameters
+        ----------
+        path : str
+            The file of the path to be uploaded
+
+        Returns
+        -------
+        RemoteFile
+        """
+        if not self._workers:
+            self._start()
+
+        file = RemoteFile(path)
+        key = len(self.files)
+        self.files.append(file)
+
+        index = self._queued_bytes.index(min(self._queued_bytes))
+        self._queued_bytes[index] += os.path.getsize(file.path)
+        self._tasks[index].put((key, file.path))
+
+        return file
+
+    def _listen(self):
+        """Dispatch events from the workers until all are done."""
+        running = len(self._workers)
+        while running:
+            kind, key, value = self._events.get()
+            if kind == 'done':
+                running -= 1
+                if value is not None:
+                    self._error = value
+                    # Remaining workers are terminated, so stop listening
+                    return
+                continue
+            file = self.files[key]
+            if kind == 'added':
+                for name, attribute in value.items():
+                    setattr(file, name, attribute)
+                self.file_added.trigger(file)
+            elif kind == 'chunk_completed':
+                index, start, size, identifier, completed = value
+                file.unique_identifier = identifier
+                file.chunks_completed = completed
+                chunk = FileChunk(index, start, size, None)
+                file.chunk_completed.trigger(chunk)
+                self.chunk_completed.trigger(file, chunk)
+            elif kind == 'completed':
+                file.completed.trigger()
+                self.file_completed.trigger(file)
+
+    def _terminate(self):
+        """Stop all workers, abandoning their remaining uploads."""
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    def _wait(self):
+        for tasks in self._tasks:
+            tasks.put(None)
+        while self._listener.is_alive():
+            self._listener.join(0.1)
+            if not any(worker.is_alive() for worker in self._workers):
+                # All workers exited, but not all reported they were done
+                self._listener.join(1)
+                if self._listener.is_alive():
+                    raise ResumableError('worker process exited unexpectedly')
+        if self._error is not None:
+            raise self._error
+
+    def join(self):
+        """Block until all uploads are complete, or an error occurs."""
+        if not self._workers:
+            return
+        try:
+            self._wait()
+        except:  # noqa: E722
+            self._terminate()
+            raise
+        finally:
+            for worker in self._workers:
+                worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.join()
@@ -0,0 +1,152 @@
+from __future__ import division
+
+import time
+from threading import Lock
+
+from resumable.util import monotonic
+
+
+KiB = 1024
+
+# The default number of bytes that may be sent at once after a pause
+DEFAULT_BURST = 64 * KiB
+
+
+class TokenBucket(object):
+    """A limit on the rate at which bytes are sent, by a token bucket.
+
+    Tokens accumulate at ``rate`` per second, up to ``burst``, and each byte
+    sent takes one. Senders may take more tokens than there are, leaving a
+    debt, and wait until it would have been repaid, so that the average rate
+    never exceeds ``rate`` whatever the number or size of the sends sharing
+    the bucket. Request bodies take tokens as they are read by the
+    connection, a block at a time, so that the rate is smooth within each
+    request rather than enforced per chunk.
+
+    Parameters
+    ----------
+    rate : float, optional
+        The maximum rate, in bytes per second. None for no limit
+    burst : int, optional
+        The number of bytes that may be sent at once after a pause
+    """
+
+    def __init__(self, rate=None, burst=DEFAULT_BURST):
+        _check_rate(rate)
+        self._rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    @property
+    def rate(self):
+        """The maximum rate, in bytes per second, or None for no limit.
+
+        May be changed at any time, taking effect for bytes sent after.
+        """
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        _check_rate(rate)
+        with self._lock:
+            self._refill()
+            if rate is None:
+                self._tokens = self.burst
+            self._rate = rate
+
+    def _refill(self):
+        """Add the tokens accumulated since the last update."""
+        now = monotonic()
+        if self._rate is not None:
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self._rate
+            )
+        self._updated = now
+
+    def reserve(self, num_bytes):
+        """Take tokens for sending some bytes, without waiting.
+
+        Parameters
+        ----------
+        num_bytes : int
+            The number of bytes to be sent
+
+        Returns
+        -------
+        float
+            The time, in seconds, to wait before sending the bytes
+        """
+        with self._lock:
+            if self._rate is None:
+                return 0.0
+            self._refill()
+            self._tokens -= num_bytes
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self._rate
+
+    def consume(self, num_bytes):
+        """Wait until some bytes may be sent.
+
+        Parameters
+        ----------
+        num_bytes : int
+            The number of bytes to be sent
+        """
+        delay = self.reserve(num_bytes)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _check_rate(rate):
+    if rate is not None and rate <= 0:
+        raise ValueError('rate must be positive, or None for no limit')
+
+
+class Throttle(object):
+    """Waits for the tokens of several buckets at once.
+
+    Parameters
+    ----------
+    limits : list of TokenBucket
+        The buckets to take tokens from
+
+    Attributes
+    ----------
+    waited : float
+        The total time, in seconds, spent waiting for tokens
+    """
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.waited = 0.0
+
+    def __call__(self, num_bytes):
+        """Wait until all the buckets allow some bytes to be sent."""
+        delay = max(limit.reserve(num_bytes) for limit in self.limits)
+        if delay > 0:
+            time.sleep(delay)
+            self.waited += delay
+
+
+def make_throttle(limits):
+    """Make a function waiting for the tokens of several buckets at once.
+
+    Parameters
+    ----------
+    limits : iterable of TokenBucket or None
+        The buckets to take tokens from. None entries are ignored
+
+    Returns
+    -------
+    Throttle or None
+        Called with a number of bytes, waiting until all the buckets allow
+        them to be sent, or None if there are no buckets
+    """
+    limits = [limit for limit in limits if limit is not None]
+    if not limits:
+        return None
+    return Throttle(limits)
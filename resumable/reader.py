@@ -0,0 +1,367 @@
+import os
+import sys
+import mmap
+from collections import OrderedDict
+from threading import Lock
+
+
+MiB = 1024 * 1024
+
+# Largest file to map into memory when the address space is limited
+MMAP_MAX_SIZE_32BIT = 256 * MiB
+
+
+class PreadReader(object):
+    """Read byte ranges of a file with positional reads.
+
+    ``os.pread`` does not use or modify the file offset, so any number of
+    threads can read different ranges of the same file at once.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to read
+    """
+
+    def __init__(self, path):
+        self._fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        if hasattr(os, 'posix_fadvise'):
+            # Files are mostly read in order, so ask for more read-ahead
+            try:
+                os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+
+    def read(self, start, num_bytes):
+        """Read a byte range from the file."""
+        data = os.pread(self._fd, num_bytes, start)
+        if len(data) == num_bytes or not data:
+            return data
+        # Short read - keep reading until satisfied or at end of file
+        parts = [data]
+        received = len(data)
+        while received < num_bytes:
+            data = os.pread(self._fd, num_bytes - received, start + received)
+            if not data:
+                break
+            parts.append(data)
+            received += len(data)
+        return b''.join(parts)
+
+    def read_into(self, start, buffer):
+        """Read a byte range from the file into a writable buffer.
+
+        Returns the number of bytes read, less than the size of the buffer
+        only at the end of the file.
+        """
+        if not hasattr(os, 'preadv'):
+            return _copy_into(buffer, self.read(start, len(buffer)))
+        view = memoryview(buffer)
+        received = 0
+        while received < len(view):
+            count = os.preadv(self._fd, [view[received:]], start + received)
+            if not count:
+                break
+            received += count
+        return received
+
+    def close(self):
+        """Close the file."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class MmapReader(object):
+    """Read byte ranges of a file through a read-only memory map.
+
+    Slicing the map does not depend on a shared file offset, so threads can
+    read different ranges of the same file at once.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to read
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, start, num_bytes):
+        """Read a byte range from the file."""
+        return self._map[start:start + num_bytes]
+
+    def read_into(self, start, buffer):
+        """Read a byte range from the file into a writable buffer."""
+        return _copy_into(buffer, self._map[start:start + len(buffer)])
+
+    def close(self):
+        """Close the file."""
+        self._map.close()
+
+
+class SeekReader(object):
+    """Read byte ranges of a file object, serialised by a lock.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to read
+    """
+
+    def __init__(self, path):
+        self._fp = open(path, 'rb')
+        self._lock = Lock()
+
+    def read(self, start, num_bytes):
+        """Read a byte range from the file."""
+        with self._lock:
+            self._fp.seek(start)
+            return self._fp.read(num_bytes)
+
+    def read_into(self, start, buffer):
+        """Read a byte range from the file into a writable buffer."""
+        view = memoryview(buffer)
+        received = 0
+        with self._lock:
+            self._fp.seek(start)
+            while received < len(view):
+                count = self._fp.readinto(view[received:])
+                if not count:
+                    break
+                received += count
+        return received
+
+    def close(self):
+        """Close the file."""
+        self._fp.close()
+
+
+def _copy_into(buffer, data):
+    """Copy data to the start of a buffer, returning its length."""
+    memoryview(buffer)[:len(data)] = data
+    return len(data)
+
+
+def _can_mmap(size):
+    """Check if a file of the given size can be memory mapped."""
+    if size == 0:
+        # Empty files cannot be mapped
+        return False
+    if sys.maxsize > 2 ** 32:
+        return True
+    return size <= MMAP_MAX_SIZE_32BIT
+
+
+def open_reader(path, size):
+    """Open a reader for byte ranges of a file.
+
+    A backend that allows concurrent reads from multiple threads is chosen
+    where the platform supports it: positional reads where available (POSIX),
+    then a memory map if the file fits in the address space, falling back to
+    seeking a single file object under a lock.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file to read
+    size : int
+        The size of the file, in bytes
+
+    Returns
+    -------
+    PreadReader, MmapReader or SeekReader
+    """
+    if hasattr(os, 'pread'):
+        return PreadReader(path)
+    elif _can_mmap(size):
+        return MmapReader(path)
+    else:
+        return SeekReader(path)
+
+
+class _Handle(object):
+    """An open reader in a handle pool, with the number of reads using it."""
+
+    __slots__ = ('reader', 'users', 'discarded')
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.users = 0
+        self.discarded = False
+
+
+class HandlePool(object):
+    """A session-wide pool of open readers, capping open file descriptors.
+
+    Readers are opened on the first read of a file and kept open for further
+    reads, up to ``max_open`` at once. Beyond that, the least recently used
+    reader not in use is closed, and reopened transparently if its file is
+    read again. Readers in use are never closed, so the cap may be exceeded
+    while more files than ``max_open`` are being read at once.
+
+    Parameters
+    ----------
+    max_open : int, optional
+        The maximum number of readers to keep open. By default, readers are
+        kept open until discarded
+
+    Attributes
+    ----------
+    opened : int
+        The number of times a reader was opened, including reopening
+    """
+
+    def __init__(self, max_open=None):
+        self.max_open = max_open
+        self.opened = 0
+        self._handles = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def is_open(self, key):
+        """Indicates if the reader of a file is open.
+
+        Parameters
+        ----------
+        key : hashable
+            The key the file is read with
+        """
+        return key in self._handles
+
+    def read(self, key, path, size, start, num_bytes):
+        """Read a byte range from a file, opening it if needed.
+
+        Parameters
+        ----------
+        key : hashable
+            The key identifying the file in the pool
+        path : str
+            The path of the file
+        size : int
+            The size of the file, in bytes
+        start : int
+            The offset of the range to read
+        num_bytes : int
+            The number of bytes to read
+
+        Returns
+        -------
+        bytes
+        """
+        handle = self._acquire(key, path, size)
+        try:
+            return handle.reader.read(start, num_bytes)
+        finally:
+            self._release(handle)
+
+    def read_into(self, key, path, size, start, buffer):
+        """Read a byte range from a file into a buffer, opening it if needed.
+
+        Parameters
+        ----------
+        key : hashable
+            The key identifying the file in the pool
+        path : str
+            The path of the file
+        size : int
+            The size of the file, in bytes
+        start : int
+            The offset of the range to read
+        buffer : writable bytes-like
+            The buffer to read into, as many bytes as it holds
+
+        Returns
+        -------
+        int
+            The number of bytes read
+        """
+        handle = self._acquire(key, path, size)
+        try:
+            return handle.reader.read_into(start, buffer)
+        finally:
+            self._release(handle)
+
+    def _acquire(self, key, path, size):
+        with self._lock:
+            handle = self._handles.pop(key, None)
+            if handle is not None:
+                # Move to the most recently used end
+                self._handles[key] = handle
+                handle.users += 1
+                return handle
+
+        # Open outside the lock, so as not to hold up reads of other files
+        reader = open_reader(path, size)
+
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = _Handle(reader)
+                self._handles[key] = handle
+                self.opened += 1
+                reader = None
+            handle.users += 1
+            evicted = self._evict()
+
+        if reader is not None:
+            # Opened by another thread in the meantime
+            reader.close()
+        for other in evicted:
+            other.reader.close()
+        return handle
+
+    def _evict(self):
+        """Remove least recently used handles not in use, over the cap.
+
+        Must be called with the lock. Returns the handles to close.
+        """
+        evicted = []
+        if self.max_open is None:
+            return evicted
+        excess = len(self._handles) - self.max_open
+        for key, handle in list(self._handles.items()):
+            if excess <= 0:
+                break
+            if handle.users == 0:
+                del self._handles[key]
+                evicted.append(handle)
+                excess -= 1
+        return evicted
+
+    def _release(self, handle):
+        with self._lock:
+            handle.users -= 1
+            close = handle.discarded and handle.users == 0
+        if close:
+            handle.reader.close()
+
+    def discard(self, key):
+        """Close the reader of a file that will not be read again.
+
+        Parameters
+        ----------
+        key : hashable
+            The key identifying the file in the pool
+        """
+        with self._lock:
+            handle = self._handles.pop(key, None)
+            if handle is None:
+                return
+            handle.discarded = True
+            close = handle.users == 0
+        if close:
+            handle.reader.close()
+
+    def close(self):
+        """Close all readers."""
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            handle.discarded = True
+            if handle.users == 0:
+                handle.reader.close()
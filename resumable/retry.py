@@ -0,0 +1,172 @@
+import time
+import random
+from email.utils import parsedate_tz, mktime_tz
+from threading import Lock
+
+
+# Status codes with which a server may ask the client to slow down
+THROTTLING_STATUSES = (429, 503)
+
+
+def retry_after(response):
+    """Get the delay requested by a response's Retry-After header.
+
+    Parameters
+    ----------
+    response : requests.Response
+        The response to inspect
+
+    Returns
+    -------
+    float or None
+        The requested delay in seconds, or None if no delay was requested
+    """
+    if response.status_code not in THROTTLING_STATUSES:
+        return None
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+class ConstantBackoff(object):
+    """Wait a constant time between retries.
+
+    Parameters
+    ----------
+    delay : float, optional
+        The time, in seconds, to wait before each retry
+    """
+
+    def __init__(self, delay=0.0):
+        self._delay = delay
+
+    def delay(self, attempt, response=None):
+        """Get the time to wait before retrying a chunk upload.
+
+        Parameters
+        ----------
+        attempt : int
+            The number of failed attempts so far, starting from 1
+        response : requests.Response, optional
+            The response to the failed attempt, or None if it failed with a
+            connection error
+
+        Returns
+        -------
+        float
+            The delay in seconds
+        """
+        return self._delay
+
+
+class ExponentialBackoff(object):
+    """Exponential backoff with full jitter between retries.
+
+    The delay before each retry is chosen at random between zero and an
+    exponentially growing limit, spreading retries from concurrent uploads
+    out in time. Failures to connect to the server back off from a longer
+    base delay than failure responses, and a Retry-After header on a 429 or
+    503 response is honoured instead.
+
+    Parameters
+    ----------
+    base : float, optional
+        The limit, in seconds, on the delay before the first retry after a
+        failure response
+    cap : float, optional
+        The maximum limit, in seconds, on the delay before a retry
+    connection_base : float, optional
+        The limit, in seconds, on the delay before the first retry after a
+        connection error
+    max_retry_after : float, optional
+        The longest delay, in seconds, requested by Retry-After to honour
+    """
+
+    def __init__(self, base=0.1, cap=30.0, connection_base=1.0,
+                 max_retry_after=300.0):
+        self.base = base
+        self.cap = cap
+        self.connection_base = connection_base
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, response=None):
+        """Get the time to wait before retrying a chunk upload.
+
+        Parameters
+        ----------
+        attempt : int
+            The number of failed attempts so far, starting from 1
+        response : requests.Response, optional
+            The response to the failed attempt, or None if it failed with a
+            connection error
+
+        Returns
+        -------
+        float
+            The delay in seconds
+        """
+        if response is None:
+            base = self.connection_base
+        else:
+            requested = retry_after(response)
+            if requested is not None:
+                return min(requested, self.max_retry_after)
+            base = self.base
+        limit = min(self.cap, base * 2 ** (attempt - 1))
+        return random.uniform(0, limit)
+
+
+class RetryBudget(object):
+    """A session-wide limit on retries, relative to successful requests.
+
+    Retries draw from a balance that starts at ``reserve``, and each
+    successful request adds ``ratio`` back to it, up to ``reserve``. When a
+    server is struggling, retries are thereby limited to a fraction of the
+    requests that succeed, rather than adding to the load.
+
+    Parameters
+    ----------
+    ratio : float, optional
+        The number of retries earned by each successful request
+    reserve : float, optional
+        The number of retries available without any successful requests, and
+        the most that can be saved up
+    """
+
+    def __init__(self, ratio=0.1, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = float(reserve)
+        self._lock = Lock()
+
+    @property
+    def balance(self):
+        """The number of retries currently available."""
+        return self._balance
+
+    def deposit(self):
+        """Record a successful request."""
+        with self._lock:
+            self._balance = min(self.reserve, self._balance + self.ratio)
+
+    def withdraw(self):
+        """Take a retry from the budget.
+
+        Returns
+        -------
+        bool
+            True if the retry is within the budget
+        """
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
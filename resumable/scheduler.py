@@ -0,0 +1,586 @@
+import heapq
+import itertools
+from collections import OrderedDict, deque
+from functools import partial
+from threading import Condition, RLock
+
+from resumable.stats import QUEUE
+from resumable.util import monotonic
+
+
+# The number of queued files to look through for a preferred file
+PREFER_LOOKAHEAD = 64
+
+
+class QueuedFile(object):
+    """A file queued in a scheduler, as seen by scheduling policies.
+
+    Attributes
+    ----------
+    file : resumable.file.ResumableFile
+        The queued file
+    sequence : int
+        The position of the file in the order files were queued
+    in_flight : int
+        The number of chunks of the file currently submitted
+    last_turn : int
+        The number of chunks submitted by the scheduler, of any file, before
+        the last chunk of this file was, or -1 if none of it has been
+    """
+
+    __slots__ = ('file', 'sequence', 'in_flight', 'last_turn', 'edges',
+                 'chunks', 'entry', 'ahead')
+
+    def __init__(self, file, sequence, first_and_last=False):
+        self.file = file
+        self.sequence = sequence
+        self.in_flight = 0
+        self.last_turn = -1
+        self.edges, self.chunks = _chunk_order(file, first_and_last)
+        # The current entry of the file in the scheduler's heap, if any
+        self.entry = None
+        # The next chunks, taken from chunks to look ahead at, each with
+        # whether it is being read ahead
+        self.ahead = deque()
+
+    @property
+    def remaining_bytes(self):
+        """The approximate number of bytes of the file yet to be submitted."""
+        file = self.file
+        remaining = len(file.chunks) - file.chunks_completed - self.in_flight
+        return max(remaining, 0) * file.chunk_size
+
+
+def _chunk_order(file, first_and_last):
+    """The chunks of a file not yet completed, in the order to upload them.
+
+    Returns the number of chunks at the start of the order that are its first
+    or last chunk, and an iterator over the chunks.
+    """
+    chunks = file.chunks
+    edges = []
+    middle = iter(chunks)
+    if first_and_last and len(chunks) > 1:
+        last = len(chunks) - 1
+        edges = [
+            chunk for chunk in (chunks[0], chunks[last])
+            if not file.is_chunk_completed(chunk)
+        ]
+        middle = itertools.islice(chunks, 1, last)
+    remaining = (
+        chunk for chunk in middle if not file.is_chunk_completed(chunk)
+    )
+    return len(edges), itertools.chain(edges, remaining)
+
+
+class Scheduler(object):
+    """Lazily submit the chunks of queued files to an executor.
+
+    Chunks are only generated from the queued files as capacity becomes
+    available, so that no more than ``max_in_flight`` chunks are submitted to
+    the executor at any time, irrespective of the number and size of the files
+    queued.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        The executor to submit chunk resolution tasks to
+    resolve : callable
+        Called in the executor with the file and chunk to be resolved
+    max_in_flight : int
+        The maximum number of chunks submitted to the executor at once
+    concurrency : resumable.concurrency.AdaptiveConcurrency, optional
+        A limit on the number of chunks in flight that may vary over time,
+        further restricting ``max_in_flight``
+    group : callable, optional
+        Called with a file to get the group it belongs to, such as its upload
+        target. Groups have a ``limit`` attribute, restricting the number of
+        chunks of files in the group in flight at once. Files of groups at
+        their limit are passed over for later files in the queue
+    groups : iterable, optional
+        All the groups ``group`` may return, if known, such as the upload
+        targets. Queued files are then not looked through at all while every
+        group is at its limit, so that submitting a chunk does not take time
+        linear in the number of queued files when the groups, rather than
+        ``max_in_flight``, limit the chunks in flight
+    prefer : callable, optional
+        Called with a file to check if chunks of it should be submitted ahead
+        of chunks of files earlier in the queue, such as when the file is
+        already open. Only the first files of the queue are looked through,
+        and only with the first in, first out policy
+    policy : object, optional
+        The scheduling policy choosing which queued file to take the next
+        chunk from, with a ``key(queued)`` method called with the
+        :class:`QueuedFile` of each queued file. Chunks are taken from the
+        file with the smallest key that can be submitted. Ordering the queue
+        keeps a heap of the queued files, taking time logarithmic in their
+        number for each chunk. Keys that change other than by the scheduler
+        taking or completing chunks, such as file priorities, are picked up
+        once as many chunks as there are queued files have been taken. By
+        default, or if ``key`` is None, files are taken first in, first out.
+        See :mod:`resumable.scheduling`
+    max_per_file : int, optional
+        The maximum number of chunks of any one file in flight at once, so
+        that the chunks of other files are submitted alongside
+    first_and_last : bool, optional
+        Submit the first and last chunks of all queued files before the other
+        chunks of any file, like ``prioritizeFirstAndLastChunk`` of
+        resumable.js, so that the server can inspect the start and end of
+        files, such as their headers, early
+    stats : resumable.stats.UploadStats, optional
+        Statistics to record the time chunks wait in the executor in
+    fail_file : callable, optional
+        Called with a file and the exception raised preparing or resolving a
+        chunk of it. If given, the exception only fails that file, whose
+        remaining chunks are dropped, and other files carry on. By default
+        the first exception fails the scheduler, and is raised on waiting
+    failed : callable, optional
+        Called with the exception failing the scheduler, once it fails
+    prefetch : callable, optional
+        Called with a file and a chunk of it among the next ``lookahead`` to
+        be submitted, beyond those in flight, to start reading it ahead.
+        Returns True if the chunk is being read, None if it is not to be
+        read ahead, to be offered again later, or False if no more chunks
+        can be read ahead for now. Must not block
+    lookahead : int, optional
+        The number of chunks beyond those in flight offered to ``prefetch``.
+        They are looked for in the order files were queued, which with a
+        policy other than first in, first out only estimates the order they
+        are submitted in
+    """
+
+    def __init__(self, executor, resolve, max_in_flight, concurrency=None,
+                 group=None, prefer=None, policy=None, max_per_file=None,
+                 first_and_last=False, stats=None, fail_file=None,
+                 failed=None, prefetch=None, groups=None, lookahead=0):
+        self.executor = executor
+        self.resolve = resolve
+        self.max_in_flight = max_in_flight
+        self.concurrency = concurrency
+        self.group = group
+        self.groups = groups
+        self.prefer = prefer
+        self.policy = policy
+        self.max_per_file = max_per_file
+        self.first_and_last = first_and_last
+        self.stats = stats
+        self.fail_file = fail_file
+        self.failed = failed
+        self.prefetch = prefetch
+        self.lookahead = lookahead
+
+        # Ordered dictionaries, as ordered sets of queued files
+        self._queue = OrderedDict()
+        # Queued files whose first or last chunks are yet to be submitted
+        self._edges = OrderedDict()
+        self._by_file = {}
+        self._exhausted = []
+        # Entries of queued files ordered by the policy key, updated lazily
+        self._heap = []
+        self._heap_age = 0
+        self._pushes = itertools.count()
+        self._sequence = itertools.count()
+        self._turns = 0
+        self._futures = {}
+        self._group_in_flight = {}
+        self._deferred = set()
+        self._cancelled = False
+        self._error = None
+        # Done callbacks may run synchronously in the submitting thread, so
+        # the lock needs to be reentrant
+        self._condition = Condition(RLock())
+
+    @property
+    def in_flight(self):
+        """The number of chunks currently submitted to the executor."""
+        return len(self._futures)
+
+    @property
+    def queued_files(self):
+        """The number of files queued or waiting to be queued."""
+        return len(self._queue) + len(self._deferred)
+
+    @property
+    def cancelled(self):
+        """Indicates if the scheduler has been cancelled."""
+        return self._cancelled
+
+    def add(self, file):
+        """Queue the chunks of a file for upload.
+
+        Chunks of the file already marked as completed are skipped.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+            The file to queue
+        """
+        with self._condition:
+            if self._cancelled:
+                return
+            queued = QueuedFile(
+                file, next(self._sequence), self.first_and_last
+            )
+            self._queue[queued] = None
+            self._by_file.setdefault(file, []).append(queued)
+            if queued.edges:
+                self._edges[queued] = None
+            if self._key() is not None:
+                self._push(queued)
+            self._fill()
+
+    def add_when_ready(self, file, future):
+        """Queue the chunks of a file once a future has completed.
+
+        Used to overlap preparing a file, such as computing its identifier,
+        with uploading the chunks of other files. If the future raises an
+        exception, it is raised on waiting for this scheduler.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+            The file to queue
+        future : concurrent.futures.Future
+            The future to wait for
+        """
+        with self._condition:
+            self._deferred.add(future)
+        future.add_done_callback(partial(self._ready, file))
+
+    def track(self, future):
+        """Wait for a future on waiting for this scheduler.
+
+        Used for work that queues files, such as walking a directory. If the
+        future raises an exception, it is raised on waiting for this
+        scheduler.
+
+        Parameters
+        ----------
+        future : concurrent.futures.Future
+            The future to wait for
+        """
+        with self._condition:
+            self._deferred.add(future)
+        future.add_done_callback(partial(self._ready, None))
+
+    def _ready(self, file, future):
+        with self._condition:
+            self._deferred.discard(future)
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self._fail(future.exception(), file)
+            elif file is not None:
+                self._fill_from_callback(self.add, file)
+            self._condition.notify_all()
+
+    def wait_for_room(self, max_queued_files):
+        """Block while the queue is full, to feed it as a stream.
+
+        Parameters
+        ----------
+        max_queued_files : int
+            The number of queued files to wait for the queue to fall below
+
+        Returns
+        -------
+        bool
+            False if the scheduler was cancelled or failed while waiting
+        """
+        with self._condition:
+            while (not self._cancelled and self._error is None and
+                    self.queued_files >= max_queued_files):
+                self._condition.wait()
+            return not self._cancelled and self._error is None
+
+    def _fill_from_callback(self, fill, *args):
+        """Submit chunks from a future's callback, keeping any error.
+
+        An exception raised in the callback would be lost, so it is raised on
+        waiting instead.
+        """
+        try:
+            fill(*args)
+        except Exception as error:
+            self._fail(error)
+
+    def _fail(self, error, file=None):
+        """Record an exception, failing the file it concerns or everything.
+
+        Must be called with the lock.
+        """
+        if file is not None and self.fail_file is not None:
+            self._drop(file)
+            self.fail_file(file, error)
+            self._fill_from_callback(self._fill)
+        elif self._error is None:
+            self._error = error
+            if self.failed is not None:
+                self.failed(error)
+
+    def discard(self, file):
+        """Drop the chunks of a file not yet submitted, such as once it has
+        failed or been cancelled.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+            The file to drop
+        """
+        with self._condition:
+            self._drop(file)
+
+    def _drop(self, file):
+        """Remove a file from the queue, with its remaining chunks."""
+        for queued in list(self._by_file.get(file, [])):
+            self._remove(queued)
+
+    def _remove(self, queued):
+        """Remove a queued file, leaving any entry of it in the heap stale."""
+        del self._queue[queued]
+        self._edges.pop(queued, None)
+        queued.entry = None
+        entries = self._by_file[queued.file]
+        entries.remove(queued)
+        if not entries:
+            del self._by_file[queued.file]
+        self._condition.notify_all()
+
+    def _key(self):
+        return None if self.policy is None else self.policy.key
+
+    def _push(self, queued):
+        """Add an entry for a queued file to the heap, with its current key.
+
+        Any previous entry of the file is left in the heap, but is stale and
+        skipped once popped.
+        """
+        entry = (
+            self.policy.key(queued), queued.sequence, next(self._pushes),
+            queued
+        )
+        queued.entry = entry
+        heapq.heappush(self._heap, entry)
+
+    def _rebuild_heap(self):
+        """Recompute the keys of all queued files, dropping stale entries."""
+        del self._heap[:]
+        for queued in self._queue:
+            self._push(queued)
+        self._heap_age = 0
+
+    def _has_capacity(self, group):
+        if group is None:
+            return True
+        return self._group_in_flight.get(group, 0) < group.limit
+
+    def _next_chunk(self):
+        """Get the next chunk to be submitted, with its file and group.
+
+        Returns None if no chunks remain that can be submitted.
+        """
+        try:
+            return self._find_chunk()
+        finally:
+            # Removed only once done iterating over the queue
+            for queued in self._exhausted:
+                if queued in self._queue:
+                    self._remove(queued)
+            del self._exhausted[:]
+
+    def _all_groups_full(self):
+        if self.group is None or self.groups is None:
+            return False
+        return not any(self._has_capacity(group) for group in self.groups)
+
+    def _find_chunk(self):
+        if self._all_groups_full():
+            return None
+        for queued in self._edges:
+            item = self._take(queued)
+            if item is not None:
+                return item
+        key = self._key()
+        if key is not None:
+            return self._next_by_key(key)
+        if self.prefer is not None:
+            for queued in self._preferred_entries():
+                item = self._take(queued)
+                if item is not None:
+                    return item
+        for queued in self._queue:
+            item = self._take(queued)
+            if item is not None:
+                return item
+        return None
+
+    def _next_by_key(self, key):
+        """Get the next chunk from the queued files in order of a key.
+
+        Entries of files whose key has grown since they were pushed are pushed
+        again with their current key, and the heap is rebuilt once as many
+        chunks as there are queued files have been taken, so that keys that
+        have fallen are picked up too.
+        """
+        self._heap_age += 1
+        if self._heap_age > len(self._queue):
+            self._rebuild_heap()
+        blocked = []
+        item = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            queued = entry[-1]
+            if queued.entry is not entry:
+                continue
+            if key(queued) != entry[0]:
+                self._push(queued)
+                continue
+            item = self._take(queued)
+            if item is not None:
+                # Pushed again once the chunk is submitted
+                queued.entry = None
+                break
+            if not self._exhausted or self._exhausted[-1] is not queued:
+                # At its limit rather than out of chunks
+                blocked.append(entry)
+        for entry in blocked:
+            heapq.heappush(self._heap, entry)
+        return item
+
+    def _preferred_entries(self):
+        entries = []
+        for queued in itertools.islice(self._queue, PREFER_LOOKAHEAD):
+            if self.prefer(queued.file):
+                entries.append(queued)
+        return entries
+
+    def _take(self, queued):
+        """Take the next chunk of a queued file, if it can be submitted.
+
+        A file with no chunks left is removed from the queue once the next
+        chunk has been found.
+        """
+        if (self.max_per_file is not None and
+                queued.in_flight >= self.max_per_file):
+            return None
+        file = queued.file
+        group = None if self.group is None else self.group(file)
+        if not self._has_capacity(group):
+            return None
+        if queued.ahead:
+            return queued, queued.ahead.popleft()[0], group
+        for chunk in queued.chunks:
+            return queued, chunk, group
+        self._exhausted.append(queued)
+        return None
+
+    def _window(self):
+        """The current maximum number of chunks in flight."""
+        if self.concurrency is None:
+            return self.max_in_flight
+        return min(self.max_in_flight, self.concurrency.limit)
+
+    def _fill(self):
+        """Submit chunks until the in flight limit is reached."""
+        while self._error is None and len(self._futures) < self._window():
+            item = self._next_chunk()
+            if item is None:
+                break
+            queued, chunk, group = item
+            if self.stats is None:
+                future = self.executor.submit(
+                    self.resolve, queued.file, chunk
+                )
+            else:
+                future = self.executor.submit(
+                    self._resolve_queued, monotonic(), queued.file, chunk
+                )
+            self._futures[future] = queued, group
+            queued.in_flight += 1
+            queued.last_turn = self._turns
+            self._turns += 1
+            if queued.edges:
+                queued.edges -= 1
+                if not queued.edges:
+                    self._edges.pop(queued, None)
+            if self._key() is not None and queued in self._queue:
+                self._push(queued)
+            if group is not None:
+                self._group_in_flight[group] = (
+                    self._group_in_flight.get(group, 0) + 1
+                )
+            future.add_done_callback(self._chunk_done)
+        self._look_ahead()
+
+    def _look_ahead(self):
+        """Offer the next chunks to be submitted to ``prefetch``."""
+        if self.prefetch is None or self._error is not None:
+            return
+        remaining = self.lookahead
+        for queued in self._queue:
+            ahead = queued.ahead
+            index = 0
+            while remaining > 0:
+                if index == len(ahead):
+                    chunk = next(queued.chunks, None)
+                    if chunk is None:
+                        break
+                    ahead.append([chunk, False])
+                entry = ahead[index]
+                index += 1
+                remaining -= 1
+                if not entry[1]:
+                    started = self.prefetch(queued.file, entry[0])
+                    if started is False:
+                        return
+                    entry[1] = bool(started)
+            if remaining <= 0:
+                return
+
+    def _resolve_queued(self, submitted, file, chunk):
+        """Resolve a chunk, recording the time it waited in the executor."""
+        self.stats.observe(QUEUE, monotonic() - submitted)
+        return self.resolve(file, chunk)
+
+    def _chunk_done(self, future):
+        with self._condition:
+            if future not in self._futures:
+                return
+            queued, group = self._futures.pop(future)
+            queued.in_flight -= 1
+            if group is not None:
+                self._group_in_flight[group] -= 1
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self._fail(future.exception(), queued.file)
+            else:
+                self._fill_from_callback(self._fill)
+            self._condition.notify_all()
+
+    def wait(self):
+        """Wait until all queued chunks have been resolved.
+
+        Raises
+        ------
+        Exception
+            The first exception raised while resolving a chunk
+        """
+        with self._condition:
+            while self._error is None and (
+                    self._futures or self._queue or self._deferred):
+                self._condition.wait()
+            if self._error is not None:
+                raise self._error
+
+    def cancel(self):
+        """Drop all queued chunks and cancel those not yet started."""
+        with self._condition:
+            self._cancelled = True
+            self._queue.clear()
+            self._edges.clear()
+            self._by_file.clear()
+            del self._heap[:]
+            for future in list(self._futures) + list(self._deferred):
+                future.cancel()
+            self._condition.notify_all()
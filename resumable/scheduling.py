@@ -0,0 +1,71 @@
+class FifoPolicy(object):
+    """Upload files in the order they were queued.
+
+    Later files are only started when the chunks of earlier files are all in
+    flight, or when their upload target is at its limit.
+    """
+
+    key = None
+
+
+class SmallestRemainingFirst(object):
+    """Upload the file with the fewest bytes left to upload first.
+
+    Small files, and files that are nearly done, finish ahead of a backlog of
+    large files, minimising the mean time taken for files to complete. Large
+    files only progress when no smaller files can.
+    """
+
+    def key(self, queued):
+        return queued.remaining_bytes, queued.sequence
+
+
+class RoundRobin(object):
+    """Take one chunk from each queued file in turn.
+
+    All queued files progress at the same rate of chunks, with newly queued
+    files taking their turn straight away.
+    """
+
+    def key(self, queued):
+        return queued.last_turn, queued.sequence
+
+
+class PriorityPolicy(object):
+    """Upload files in order of their ``priority`` attribute, highest first.
+
+    Files of the same priority are uploaded in the order they were queued.
+    The priority of a file may be changed while it is queued. A lowered
+    priority applies to the next chunk, and a raised one once as many chunks
+    as there are queued files have been taken.
+    """
+
+    def key(self, queued):
+        return -queued.file.priority, queued.sequence
+
+
+POLICIES = {
+    'fifo': FifoPolicy,
+    'smallest_remaining': SmallestRemainingFirst,
+    'round_robin': RoundRobin,
+    'priority': PriorityPolicy
+}
+
+
+def make_policy(name):
+    """Get a scheduling policy by name.
+
+    Parameters
+    ----------
+    name : str
+        ``'fifo'``, ``'smallest_remaining'``, ``'round_robin'`` or
+        ``'priority'``
+
+    Returns
+    -------
+    object
+    """
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError('unknown scheduling policy {0!r}'.format(name))
@@ -0,0 +1,108 @@
+import os
+from threading import Lock
+
+
+class BufferSource(object):
+    """Upload data held in memory, such as bytes or a numpy array.
+
+    Chunks are read as ``memoryview`` slices of the buffer, without copying
+    it, so the buffer must not be modified while it is uploaded.
+
+    Parameters
+    ----------
+    data : bytes-like
+        An object supporting the buffer protocol. Multi-dimensional or typed
+        buffers are uploaded as their raw bytes, and must be contiguous
+    """
+
+    def __init__(self, data):
+        view = memoryview(data)
+        if view.ndim != 1 or view.itemsize != 1:
+            view = view.cast('B')
+        self._view = view
+        self.size = len(view)
+
+    def read(self, start, num_bytes):
+        """Read a byte range of the buffer, as a memoryview."""
+        return self._view[start:start + num_bytes]
+
+
+class FileObjectSource(object):
+    """Upload the content of a seekable binary file object.
+
+    Reads seek the file object under a lock, so that chunks may be read from
+    several threads. The file object is not closed by the upload.
+
+    Parameters
+    ----------
+    fileobj : file-like
+        The file object, with ``seek``, ``tell`` and ``read`` methods
+    size : int, optional
+        The number of bytes to upload from the start of the object. Defaults
+        to its length
+    """
+
+    def __init__(self, fileobj, size=None):
+        self._fileobj = fileobj
+        self._lock = Lock()
+        if size is None:
+            with self._lock:
+                fileobj.seek(0, os.SEEK_END)
+                size = fileobj.tell()
+        self.size = size
+
+    def read(self, start, num_bytes):
+        """Read a byte range of the file object."""
+        with self._lock:
+            self._fileobj.seek(start)
+            return self._fileobj.read(num_bytes)
+
+
+class CallableSource(object):
+    """Upload data returned by a function for each byte range.
+
+    Parameters
+    ----------
+    read : callable
+        Called with the offset and number of bytes of a range, returning its
+        data as a bytes-like object. May be called from several threads at
+        once
+    size : int
+        The total number of bytes to upload
+    """
+
+    def __init__(self, read, size):
+        self._read = read
+        self.size = size
+
+    def read(self, start, num_bytes):
+        """Read a byte range by calling the function."""
+        return self._read(start, num_bytes)
+
+
+def make_source(data, size=None):
+    """Make a source for data to upload that is not a file on disk.
+
+    Parameters
+    ----------
+    data : object
+        A source, a bytes-like object, a seekable file object, or a callable
+        returning the data of a byte range given its offset and size
+    size : int, optional
+        The number of bytes to upload from a file object or callable.
+        Required for a callable
+
+    Returns
+    -------
+    BufferSource, FileObjectSource or CallableSource
+        Or ``data`` itself if it is already a source
+    """
+    if isinstance(data, (BufferSource, FileObjectSource, CallableSource)):
+        return data
+    if hasattr(data, 'read') and hasattr(data, 'seek'):
+        return FileObjectSource(data, size)
+    if callable(data):
+        if size is None:
+            raise ValueError('the size of a callable source must be given')
+        return CallableSource(data, size)
+    return BufferSource(data)
@@ -0,0 +1,364 @@
+from __future__ import division
+
+import weakref
+from bisect import bisect_left
+from threading import Lock
+
+from resumable.util import monotonic
+
+
+# The phases of resolving a chunk that are timed
+QUEUE = 'queue'
+READ = 'read'
+TEST = 'test'
+SEND = 'send'
+BACKOFF = 'backoff'
+PHASES = (QUEUE, READ, TEST, SEND, BACKOFF)
+
+# The upper bounds, in seconds, of the buckets of the phase histograms
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0
+)
+
+COUNTERS = (
+    ('chunks_sent', 'Chunks uploaded'),
+    ('chunks_skipped', 'Chunks found on the server already'),
+    ('bytes_sent', 'Bytes of chunk data uploaded'),
+    ('bytes_skipped', 'Bytes of chunk data found on the server already'),
+    ('retries', 'Retried chunk uploads')
+)
+
+
+class Histogram(object):
+    """A distribution of observed values, counted in buckets.
+
+    Parameters
+    ----------
+    buckets : sequence of float
+        The upper bounds of the buckets, in increasing order. Values above
+        the last bound are counted in an unbounded bucket
+
+    Attributes
+    ----------
+    count : int
+        The number of values observed
+    sum : float
+        The sum of the values observed
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Count a value. Not thread safe."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """The number of values at or below each bound, the last infinite.
+
+        Returns
+        -------
+        list of (float, int)
+        """
+        bounds = self.buckets + (float('inf'),)
+        total = 0
+        result = []
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class _Rate(object):
+    """An exponentially weighted moving average of a rate of bytes."""
+
+    def __init__(self, interval, smoothing):
+        self.interval = interval
+        self.smoothing = smoothing
+        self.rate = None
+        self._sample_start = monotonic()
+        self._sample_bytes = 0
+
+    def record(self, num_bytes, now):
+        self._sample_bytes += num_bytes
+        elapsed = now - self._sample_start
+        if elapsed < self.interval:
+            return
+        rate = self._sample_bytes / elapsed
+        if self.rate is None:
+            self.rate = rate
+        else:
+            self.rate += self.smoothing * (rate - self.rate)
+        self._sample_start = now
+        self._sample_bytes = 0
+
+
+def _remaining_bytes(file):
+    if file.is_completed:
+        return 0
+    return file.size * (1 - file.fraction_completed)
+
+
+class UploadStats(object):
+    """Counters, timings and throughput of the uploads of a session.
+
+    The time spent resolving chunks is observed in a histogram per phase:
+
+    * ``queue``, waiting in the executor for an upload thread
+    * ``read``, reading chunk data from disk, which is part of ``send``
+    * ``test``, testing for a chunk on the server with a GET request
+    * ``send``, each attempt at sending a chunk with a POST request
+    * ``backoff``, waiting to retry a failed upload
+
+    Throughput is measured as an exponentially weighted moving average of
+    the rate chunk data is uploaded at, sampled over ``interval``, for the
+    session and each file, from which the time left to upload them is
+    estimated.
+
+    Parameters
+    ----------
+    files : list of resumable.file.ResumableFile, optional
+        The files of the session, whose remaining size the time left for the
+        session is estimated from
+    interval : float, optional
+        The period, in seconds, over which to sample the throughput
+    smoothing : float, optional
+        The weight given to each new throughput sample, between 0 and 1
+
+    Attributes
+    ----------
+    chunks_sent : int
+        The number of chunks uploaded
+    chunks_skipped : int
+        The number of chunks found on the server already by testing for them
+    bytes_sent : int
+        The number of bytes of chunk data uploaded
+    bytes_skipped : int
+        The number of bytes of chunks found on the server already
+    retries : int
+        The number of retried chunk uploads
+    phases : dict
+        A :class:`Histogram` of the time, in seconds, spent in each phase
+    """
+
+    def __init__(self, files=None, interval=1.0, smoothing=0.3):
+        self.files = [] if files is None else files
+        self.interval = interval
+        self.smoothing = smoothing
+        self.chunks_sent = 0
+        self.chunks_skipped = 0
+        self.bytes_sent = 0
+        self.bytes_skipped = 0
+        self.retries = 0
+        self.phases = dict((phase, Histogram()) for phase in PHASES)
+        self._rate = _Rate(interval, smoothing)
+        self._file_rates = weakref.WeakKeyDictionary()
+        self._lock = Lock()
+
+    def observe(self, phase, seconds):
+        """Record the time spent in a phase of resolving a chunk.
+
+        Parameters
+        ----------
+        phase : str
+            One of :data:`PHASES`
+        seconds : float
+            The time spent
+        """
+        with self._lock:
+            self.phases[phase].observe(seconds)
+
+    def record_sent(self, file, num_bytes):
+        """Record the upload of a chunk of a file.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        num_bytes : int
+            The size of the chunk
+        """
+        now = monotonic()
+        with self._lock:
+            self.chunks_sent += 1
+            self.bytes_sent += num_bytes
+            self._rate.record(num_bytes, now)
+            rate = self._file_rates.get(file)
+            if rate is None:
+                # Measure the file from its first chunk completing
+                self._file_rates[file] = _Rate(self.interval, self.smoothing)
+            else:
+                rate.record(num_bytes, now)
+
+    def record_skipped(self, file, num_bytes):
+        """Record a chunk of a file found on the server already.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        num_bytes : int
+            The size of the chunk
+        """
+        with self._lock:
+            self.chunks_skipped += 1
+            self.bytes_skipped += num_bytes
+
+    def record_retry(self, delay):
+        """Record the retry of a chunk upload.
+
+        Parameters
+        ----------
+        delay : float
+            The time, in seconds, waited before retrying
+        """
+        with self._lock:
+            self.retries += 1
+            self.phases[BACKOFF].observe(delay)
+
+    @property
+    def throughput(self):
+        """The rate chunk data is uploaded at, in bytes per second, or None
+        until measured."""
+        return self._rate.rate
+
+    def file_throughput(self, file):
+        """The rate chunk data of a file is uploaded at.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+
+        Returns
+        -------
+        float or None
+            The rate in bytes per second, or None until measured
+        """
+        with self._lock:
+            rate = self._file_rates.get(file)
+        return None if rate is None else rate.rate
+
+    def eta(self):
+        """Estimate the time left to upload all files of the session.
+
+        Returns
+        -------
+        float or None
+            The time in seconds, or None until the throughput is measured
+        """
+        remaining = sum(_remaining_bytes(file) for file in list(self.files))
+        if not remaining:
+            return 0.0
+        throughput = self.throughput
+        if not throughput:
+            return None
+        return remaining / throughput
+
+    def file_eta(self, file):
+        """Estimate the time left to upload a file.
+
+        Files whose throughput is not measured yet, such as small files, are
+        estimated at the throughput of the session.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+
+        Returns
+        -------
+        float or None
+            The time in seconds, or None until the throughput is measured
+        """
+        remaining = _remaining_bytes(file)
+        if not remaining:
+            return 0.0
+        throughput = self.file_throughput(file) or self.throughput
+        if not throughput:
+            return None
+        return remaining / throughput
+
+    def as_dict(self):
+        """Export the statistics as a dict, such as for JSON.
+
+        Returns
+        -------
+        dict
+            The counters by name, ``phases`` with the ``count``, ``sum`` and
+            cumulative ``buckets`` of each phase, ``throughput`` and ``eta``
+        """
+        with self._lock:
+            result = dict((name, getattr(self, name)) for name, _ in COUNTERS)
+            result['phases'] = dict(
+                (phase, {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': histogram.cumulative()
+                })
+                for phase, histogram in self.phases.items()
+            )
+        result['throughput'] = self.throughput
+        result['eta'] = self.eta()
+        return result
+
+    def prometheus(self, prefix='resumable'):
+        """Export the statistics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            The prefix of the metric names
+
+        Returns
+        -------
+        str
+        """
+        stats = self.as_dict()
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, name, help_text))
+            lines.append('# TYPE {0}_{1} {2}'.format(prefix, name, kind))
+
+        for name, help_text in COUNTERS:
+            metric(name + '_total', 'counter', help_text)
+            lines.append('{0}_{1}_total {2}'.format(prefix, name, stats[name]))
+
+        metric('phase_seconds', 'histogram', 'Time spent resolving chunks')
+        for phase in PHASES:
+            histogram = stats['phases'][phase]
+            for bound, count in histogram['buckets']:
+                lines.append(
+                    '{0}_phase_seconds_bucket{{phase="{1}",le="{2}"}} '
+                    '{3}'.format(prefix, phase, _format(bound), count)
+                )
+            lines.append('{0}_phase_seconds_sum{{phase="{1}"}} {2}'.format(
+                prefix, phase, _format(histogram['sum'])
+            ))
+            lines.append('{0}_phase_seconds_count{{phase="{1}"}} {2}'.format(
+                prefix, phase, histogram['count']
+            ))
+
+        metric('throughput_bytes_per_second', 'gauge',
+               'Moving average of the upload rate')
+        lines.append('{0}_throughput_bytes_per_second {1}'.format(
+            prefix, _format(stats['throughput'])
+        ))
+        metric('eta_seconds', 'gauge', 'Estimated time left to upload')
+        lines.append('{0}_eta_seconds {1}'.format(
+            prefix, _format(stats['eta'])
+        ))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _format(value):
+    """Format a sample value as Prometheus expects."""
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
@@ -0,0 +1,212 @@
+import bisect
+import hashlib
+from threading import RLock
+
+
+# The number of points each target has on the hash ring, spreading files
+# evenly across targets
+REPLICAS = 100
+
+
+def _hash(key):
+    digest = hashlib.md5(str(key).encode('utf-8')).hexdigest()
+    return int(digest[:16], 16)
+
+
+class Target(object):
+    """An upload endpoint, with its own connections and concurrency limit.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the resumable upload target
+    sessions : resumable.transport.SessionPool
+        The sessions to make requests to the target with
+    concurrency : resumable.concurrency.FixedConcurrency
+        The limit on chunk uploads in flight to the target
+    max_failures : int, optional
+        The number of consecutive failed requests after which the target is
+        ejected, if other targets remain
+
+    Attributes
+    ----------
+    failures : int
+        The number of consecutive failed requests to the target
+    ejected : bool
+        If the target has been ejected, after which no further files are
+        assigned to it
+    """
+
+    def __init__(self, url, sessions, concurrency, max_failures=None):
+        self.url = url
+        self.sessions = sessions
+        self.concurrency = concurrency
+        self.max_failures = max_failures
+        self.failures = 0
+        self.ejected = False
+        self._pool = None
+
+    def __repr__(self):
+        return 'Target({0!r})'.format(self.url)
+
+    @property
+    def limit(self):
+        """The current limit on chunk uploads in flight to the target."""
+        return self.concurrency.limit
+
+    def record_success(self):
+        """Record a successful request to the target."""
+        self.failures = 0
+
+    def record_failure(self):
+        """Record a failed request to the target, possibly ejecting it."""
+        self.failures += 1
+        if (self._pool is not None and self.max_failures is not None and
+                self.failures >= self.max_failures):
+            self._pool.eject(self)
+
+
+class TargetPool(object):
+    """Assign files to upload targets by consistent hashing.
+
+    Files are assigned by their unique identifier, so that all chunks of a
+    file, and a resumed upload of it, go to the same target. When a target is
+    ejected, files not yet started on it are reassigned to the next target on
+    the hash ring, while other files keep their assignment.
+
+    Parameters
+    ----------
+    targets : list of Target
+        The targets to assign files to
+    replicas : int, optional
+        The number of points on the hash ring for each target
+    """
+
+    def __init__(self, targets, replicas=REPLICAS):
+        self.targets = list(targets)
+        if not self.targets:
+            raise ValueError('at least one target is required')
+        self._ring = []
+        for index, target in enumerate(self.targets):
+            target._pool = self
+            for replica in range(replicas):
+                point = _hash('{0}#{1}'.format(target.url, replica))
+                self._ring.append((point, index))
+        self._ring.sort()
+        self._points = [point for point, _ in self._ring]
+        self._assignments = {}
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, index):
+        return self.targets[index]
+
+    def __iter__(self):
+        return iter(self.targets)
+
+    @property
+    def throughput(self):
+        """The combined throughput of the targets in bytes per second.
+
+        None until the throughput of any target is known.
+        """
+        known = [
+            target.concurrency.throughput for target in self.targets
+            if target.concurrency.throughput is not None
+        ]
+        return sum(known) if known else None
+
+    def assign(self, identifier):
+        """Get the target for a file identifier.
+
+        Parameters
+        ----------
+        identifier : str
+            The unique identifier of the file
+
+        Returns
+        -------
+        Target
+            The first target not ejected at or after the identifier's point
+            on the hash ring
+        """
+        start = bisect.bisect(self._points, _hash(identifier))
+        for offset in range(len(self._ring)):
+            _, index = self._ring[(start + offset) % len(self._ring)]
+            if not self.targets[index].ejected:
+                return self.targets[index]
+        # Never reached, as the last remaining target is not ejected
+        return self.targets[0]
+
+    def target_for(self, file):
+        """Get the target a file is currently assigned to.
+
+        A file not yet started is reassigned if its target has been ejected,
+        unless it is resumed from a journal, with chunks on that target.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+
+        Returns
+        -------
+        Target
+        """
+        with self._lock:
+            target, started = self._assignments.get(file, (None, False))
+            if target is None or (
+                    target.ejected and not started and not file.resumed):
+                target = self.assign(file.unique_identifier)
+                self._assignments[file] = (target, started)
+            return target
+
+    def start(self, file):
+        """Get the target to upload a chunk of a file to.
+
+        Fixes the assignment of the file, so that all of its chunks go to the
+        same target.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+
+        Returns
+        -------
+        Target
+        """
+        with self._lock:
+            target = self.target_for(file)
+            self._assignments[file] = (target, True)
+            return target
+
+    def eject(self, target):
+        """Stop assigning files to a target, unless it is the last one left.
+
+        Parameters
+        ----------
+        target : Target
+        """
+        with self._lock:
+            remaining = [
+                other for other in self.targets
+                if other is not target and not other.ejected
+            ]
+            if remaining:
+                target.ejected = True
+
+    def release(self, file):
+        """Forget the assignment of a file that is no longer uploaded.
+
+        Parameters
+        ----------
+        file : resumable.file.ResumableFile
+        """
+        with self._lock:
+            self._assignments.pop(file, None)
+
+    def close(self):
+        """Close the sessions of all targets."""
+        for target in self.targets:
+            target.sessions.close()
@@ -0,0 +1,148 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+SHARED = 'shared'
+PER_THREAD = 'per_thread'
+
+# The number of hosts to keep connection pools for, per session
+POOL_HOSTS = 10
+
+
+def drain(response):
+    """Read any unread body of a response.
+
+    Once the body is read, the connection is returned to its pool for reuse,
+    even if the session streams responses.
+
+    Parameters
+    ----------
+    response : requests.Response
+    """
+    response.content
+
+
+class SessionPool(object):
+    """The HTTP sessions uploads are made with, and their connection pools.
+
+    With ``'shared'`` pooling, all threads use one session, whose connection
+    pool holds ``pool_size`` connections per host. With ``'per_thread'``
+    pooling, each thread gets its own session holding one connection per
+    host, with no contention between threads for the pool. Per-thread
+    sessions are created with the headers, authentication and TLS options of
+    the ``session`` attribute.
+
+    In both modes a thread waits for a connection to be returned to the pool
+    rather than opening one that would be discarded after use, so that
+    connections are kept alive and reused.
+
+    Parameters
+    ----------
+    pool_size : int
+        The number of threads making requests at once
+    pooling : str, optional
+        ``'shared'`` or ``'per_thread'``
+
+    Attributes
+    ----------
+    session : requests.Session
+        The shared session, or the template for per-thread sessions
+    """
+
+    def __init__(self, pool_size, pooling=SHARED):
+        if pooling not in (SHARED, PER_THREAD):
+            raise ValueError('unknown connection pooling {0!r}'.format(
+                pooling
+            ))
+        self.pool_size = pool_size
+        self.pooling = pooling
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+        self._closed_stats = None
+        if pooling == SHARED:
+            self.session = self._new_session(pool_size)
+        else:
+            self.session = requests.Session()
+
+    def _new_session(self, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_HOSTS, pool_maxsize=pool_size,
+            pool_block=True
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def get(self):
+        """Get the session to use from the current thread.
+
+        Returns
+        -------
+        requests.Session
+        """
+        if self.pooling == SHARED:
+            return self.session
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._new_session(1)
+            session.headers.update(self.session.headers)
+            session.auth = self.session.auth
+            session.verify = self.session.verify
+            session.cert = self.session.cert
+            session.proxies.update(self.session.proxies)
+            self._local.session = session
+        return session
+
+    def stats(self):
+        """Count the connections opened and the requests made over them.
+
+        Returns
+        -------
+        dict
+            ``connections``, the number of connections opened, ``requests``,
+            the number of requests made, and ``reused``, the number of
+            requests made over a connection opened for an earlier request
+        """
+        if self._closed_stats is not None:
+            return dict(self._closed_stats)
+        connections = 0
+        num_requests = 0
+        with self._lock:
+            sessions = list(self._sessions)
+        for session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    connections += pool.num_connections
+                    num_requests += pool.num_requests
+        return {
+            'connections': connections,
+            'requests': num_requests,
+            'reused': max(0, num_requests - connections)
+        }
+
+    def close(self):
+        """Close all sessions and their connections, including the sessions
+        of threads that have exited and the per-thread template.
+
+        The statistics of the closed sessions remain available.
+        """
+        if self._closed_stats is not None:
+            return
+        self._closed_stats = self.stats()
+        with self._lock:
+            sessions = list(self._sessions)
+            del self._sessions[:]
+        if self.session not in sessions:
+            sessions.append(self.session)
+        for session in sessions:
+            session.close()
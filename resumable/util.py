@@ -1,8 +1,50 @@
+import time
+
+
+# A clock for measuring durations, unaffected by system clock changes
+monotonic = getattr(time, 'monotonic', time.time)
+
+# The types of text strings, including unicode on Python 2
+try:
+    string_types = basestring  # noqa: F821
+except NameError:  # Python 3
+    string_types = str
+
+# Whether bytes are plain strings, which can't be joined with or compressed
+# from memoryview objects
+PY2 = bytes is str
+
+
+def as_bytes(data):
+    """Make chunk data usable where bytes are expected.
+
+    Chunks of in-memory sources and read ahead chunks are memoryview slices,
+    which are only copied to bytes on Python 2.
+    """
+    if PY2 and isinstance(data, memoryview):
+        return data.tobytes()
+    return data
+
+
 class CallbackDispatcher(object):
-    """Dispatch callbacks to registered targets."""
+    """Dispatch callbacks to registered targets.
 
-    def __init__(self):
+    Parameters
+    ----------
+    events : resumable.events.EventDispatcher, optional
+        Runs the callbacks on its own thread. By default callbacks are run
+        on the thread triggering them
+    key : object, optional
+        The object, such as a file, that events of this dispatcher relate to
+    progress : bool, optional
+        If events of this dispatcher report progress, and may be coalesced
+    """
+
+    def __init__(self, events=None, key=None, progress=False):
         self.targets = []
+        self.events = events
+        self.key = key
+        self.progress = progress
 
     def register(self, callback):
         """Register a callback.
@@ -19,6 +61,13 @@ class CallbackDispatcher(object):
 
         All arguments are passed through to the registered callbacks.
         """
+        if self.events is None:
+            self._dispatch(*args, **kwargs)
+        else:
+            self.events.post(self._dispatch, args, kwargs, key=self.key,
+                             progress=self.progress)
+
+    def _dispatch(self, *args, **kwargs):
         for callback in self.targets:
             callback(*args, **kwargs)
 
@@ -0,0 +1,112 @@
+import os
+import stat
+import fnmatch
+
+try:
+    from os import scandir
+except ImportError:  # Python < 3.5
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+class WalkedFile(object):
+    """A file found by walking a directory.
+
+    Attributes
+    ----------
+    path : str
+        The path of the file
+    relative_path : str
+        The path of the file relative to the parent of the walked directory,
+        with ``/`` separators, as a browser reports for files of a directory
+    size : int
+        The size of the file in bytes, from the stat result of the walk
+    """
+
+    __slots__ = ('path', 'relative_path', 'size')
+
+    def __init__(self, path, relative_path, size):
+        self.path = path
+        self.relative_path = relative_path
+        self.size = size
+
+    def __repr__(self):
+        return 'WalkedFile({0!r}, {1!r}, {2!r})'.format(
+            self.path, self.relative_path, self.size
+        )
+
+
+def _entries(directory):
+    """Iterate over the entries of a directory, like os.scandir."""
+    if scandir is not None:
+        for entry in scandir(directory):
+            yield entry
+    else:
+        for name in os.listdir(directory):
+            yield _ListedEntry(directory, name)
+
+
+class _ListedEntry(object):
+    """A minimal stand-in for os.DirEntry, where scandir is unavailable."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self._lstat = None
+
+    def stat(self, follow_symlinks=True):
+        if follow_symlinks:
+            return os.stat(self.path)
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return self._lstat
+
+    def is_dir(self, follow_symlinks=True):
+        return stat.S_ISDIR(self.stat(follow_symlinks).st_mode)
+
+    def is_file(self, follow_symlinks=True):
+        return stat.S_ISREG(self.stat(follow_symlinks).st_mode)
+
+
+def walk_files(root, pattern=None, recursive=True):
+    """Find the files in a directory, as a stream.
+
+    Files are yielded as they are found, with their size taken from the stat
+    results of the walk, so that they can be uploaded while the walk goes on.
+    Entries are listed in the order of the filesystem, and subdirectories are
+    walked depth first, without following symbolic links to directories.
+
+    Parameters
+    ----------
+    root : str
+        The directory to walk
+    pattern : str, optional
+        A shell-style pattern, such as ``'*.csv'``, that the names of files
+        must match
+    recursive : bool, optional
+        If files in subdirectories are included
+
+    Yields
+    ------
+    WalkedFile
+    """
+    root = str(root)
+    prefix = os.path.basename(os.path.normpath(root))
+    pending = [(root, prefix)]
+    while pending:
+        directory, relative = pending.pop()
+        subdirectories = []
+        for entry in _entries(directory):
+            relative_path = '/'.join([relative, entry.name]) \
+                if relative else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if recursive:
+                    subdirectories.append((entry.path, relative_path))
+            elif entry.is_file():
+                if pattern is None or fnmatch.fnmatch(entry.name, pattern):
+                    yield WalkedFile(
+                        entry.path, relative_path, entry.stat().st_size
+                    )
+        pending.extend(reversed(subdirectories))
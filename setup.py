@@ -48,10 +48,15 @@ setup(
         'mock',
         'pytest-mock',
         'six',
-        'flask'
+        'flask',
+        'aiohttp; python_version >= "3.6"'
     ],
     install_requires=[
         'requests',
         'futures; python_version == "2.7"'
-    ]
+    ],
+    extras_require={
+        'aio': ['aiohttp'],
+        'zstd': ['zstandard']
+    }
 )
@@ -0,0 +1,11 @@
+import sys
+
+
+# The asyncio client uses syntax that does not parse before Python 3.6
+collect_ignore = []
+if sys.version_info < (3, 6):
+    collect_ignore.append('test_aio.py')
+
+# The benchmarks only measure memory with tracemalloc, from Python 3.4
+if sys.version_info < (3, 4):
+    collect_ignore.append('test_benchmarks.py')
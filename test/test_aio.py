@@ -0,0 +1,226 @@
+import asyncio
+import threading
+
+import pytest
+
+from test.fixture import (  # noqa: F401
+    SAMPLE_CONTENT, TEST_CHUNK_SIZE, SAMPLE_CONTENT_CHUNKS, sample_file,
+    server
+)
+from test.test_integration import expected_requests
+
+pytest.importorskip('aiohttp')
+
+from resumable import AsyncResumable  # noqa: E402
+
+
+def normalised(requests):
+    return sorted((method, sorted(data)) for method, data in requests)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_async_resumable(server, sample_file):  # noqa: F811
+
+    async def upload():
+        async with AsyncResumable(
+            target=server.endpoint,
+            chunk_size=TEST_CHUNK_SIZE,
+            simultaneous_uploads=2
+        ) as r:
+            return r.add_file(sample_file)
+
+    resumable_file = run(upload())
+
+    assert resumable_file.is_completed
+    expected = expected_requests(resumable_file, sample_file)
+    assert normalised(server.received) == normalised(expected)
+
+
+def test_async_resumable_callbacks(server, tmpdir):  # noqa: F811
+
+    paths = []
+    for index in range(5):
+        path = tmpdir.join('file-{0}.txt'.format(index))
+        path.write(SAMPLE_CONTENT)
+        paths.append(path)
+
+    completed = []
+    chunks = []
+
+    async def upload():
+        r = AsyncResumable(
+            target=server.endpoint,
+            chunk_size=TEST_CHUNK_SIZE,
+            simultaneous_uploads=4,
+            test_chunks=False,
+            content_identifiers=True
+        )
+        r.file_completed.register(completed.append)
+        r.chunk_completed.register(lambda file, chunk: chunks.append(chunk))
+        files = [r.add_file(path) for path in paths]
+        await r.join()
+        return files
+
+    files = run(upload())
+
+    assert sorted(completed, key=id) == sorted(files, key=id)
+    assert len(chunks) == len(paths) * len(SAMPLE_CONTENT_CHUNKS)
+    assert len(server.received) == len(chunks)
+    # Identical content gives identical identifiers
+    assert len(set(file.unique_identifier for file in files)) == 1
+
+
+def test_async_resumable_journal(mocker, server, tmpdir):  # noqa: F811
+
+    from resumable.journal import JournalEntry
+
+    path = tmpdir.join('file.txt')
+    path.write(SAMPLE_CONTENT)
+    record = JournalEntry.record
+    journal_threads = set()
+    callback_threads = set()
+
+    def spy_record(entry, index):
+        journal_threads.add(threading.current_thread())
+        record(entry, index)
+
+    mocker.patch.object(JournalEntry, 'record', spy_record)
+
+    async def upload():
+        async with AsyncResumable(
+            target=server.endpoint,
+            chunk_size=TEST_CHUNK_SIZE,
+            journal=str(tmpdir.join('journal.db'))
+        ) as r:
+            r.chunk_completed.register(
+                lambda file, chunk: callback_threads.add(
+                    threading.current_thread()
+                )
+            )
+            return r.add_file(path)
+
+    resumable_file = run(upload())
+
+    assert resumable_file.is_completed
+    # The journal is written off the event loop, callbacks run on it
+    assert threading.current_thread() not in journal_threads
+    assert callback_threads == set([threading.current_thread()])
+
+
+def test_async_resumable_permanent_error(tmpdir):
+
+    from resumable.chunk import ResumableError
+
+    path = tmpdir.join('file.txt')
+    path.write(SAMPLE_CONTENT)
+
+    async def upload(target):
+        async with AsyncResumable(
+            target=target, chunk_size=TEST_CHUNK_SIZE, test_chunks=False
+        ) as r:
+            r.add_file(path)
+
+    async def main():
+        async def handle(reader, writer):
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(
+                b'HTTP/1.1 500 Error\r\nContent-Length: 0\r\n'
+                b'Connection: close\r\n\r\n'
+            )
+            await writer.drain()
+            writer.close()
+
+        listener = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            await upload('http://127.0.0.1:{0}/upload'.format(port))
+        finally:
+            listener.close()
+
+    with pytest.raises(ResumableError):
+        run(main())
+
+
+def run_against(responses, upload):
+    """Run an upload against a server giving each of ``responses`` in turn,
+    and then OK, where a response of None drops the connection."""
+
+    responses = list(responses)
+
+    async def handle(reader, writer):
+        head = await reader.readuntil(b'\r\n\r\n')
+        for line in head.split(b'\r\n'):
+            name, _, value = line.partition(b':')
+            if name.lower() == b'content-length':
+                await reader.readexactly(int(value))
+        response = responses.pop(0) if responses else b'200 OK'
+        if response is not None:
+            writer.write(
+                b'HTTP/1.1 ' + response + b'\r\nContent-Length: 0\r\n'
+                b'Connection: close\r\n\r\n'
+            )
+            await writer.drain()
+        writer.close()
+
+    async def main():
+        listener = await asyncio.start_server(handle, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await upload('http://127.0.0.1:{0}/upload'.format(port))
+        finally:
+            listener.close()
+
+    return run(main())
+
+
+def test_async_resumable_retry(tmpdir):
+
+    from resumable.retry import ExponentialBackoff, RetryBudget
+
+    path = tmpdir.join('file.txt')
+    path.write(SAMPLE_CONTENT)
+    budget = RetryBudget(reserve=2)
+
+    async def upload(target):
+        async with AsyncResumable(
+            target=target, chunk_size=len(SAMPLE_CONTENT), test_chunks=False,
+            retry_policy=ExponentialBackoff(connection_base=0.01),
+            retry_budget=budget
+        ) as r:
+            return r.add_file(path)
+
+    resumable_file = run_against(
+        [None, b'503 Unavailable\r\nRetry-After: 0.1'], upload
+    )
+
+    assert resumable_file.is_completed
+    assert resumable_file.retries == 2
+    # Backed off as asked by the server
+    assert resumable_file.backoff_time >= 0.1
+    assert budget.balance == 0.1
+
+
+def test_async_resumable_retry_budget_exhausted(tmpdir):
+
+    from resumable.chunk import ResumableError
+    from resumable.retry import RetryBudget
+
+    path = tmpdir.join('file.txt')
+    path.write(SAMPLE_CONTENT)
+
+    async def upload(target):
+        async with AsyncResumable(
+            target=target, chunk_size=TEST_CHUNK_SIZE, test_chunks=False,
+            retry_budget=RetryBudget(reserve=1)
+        ) as r:
+            r.add_file(path)
+
+    with pytest.raises(ResumableError, match='budget'):
+        run_against([b'503 Unavailable\r\nRetry-After: 0'] * 10, upload)
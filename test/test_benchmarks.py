@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from resumable.multipart import MultipartEncoder
+from benchmarks.server import Receiver, parse_multipart
+from benchmarks.run import parse_size, main
+
+
+CONTENT = b'0123456789' * 10
+
+
+def fields(number, identifier='identifier'):
+    return {
+        'resumableIdentifier': identifier,
+        'resumableChunkNumber': str(number),
+        'resumableChunkSize': '40'
+    }
+
+
+def test_parse_multipart():
+    body = MultipartEncoder(fields(2), 'file', lambda offset, num_bytes: (
+        CONTENT[offset:offset + num_bytes]
+    ), len(CONTENT))
+    parsed, data = parse_multipart(body.read(), body.content_type)
+    assert parsed == fields(2)
+    assert data == CONTENT
+
+
+def test_receiver_assemble(tmpdir):
+    receiver = Receiver(str(tmpdir))
+    assert not receiver.test(fields(1))
+    for number in [3, 1, 2]:
+        start = (number - 1) * 40
+        receiver.store(fields(number), CONTENT[start:start + 40])
+    assert receiver.test(fields(1))
+    assert tmpdir.join('identifier').read_binary() == CONTENT
+
+
+@pytest.mark.parametrize('text, size', [
+    ('100', 100), ('64K', 65536), ('1.5M', 1572864), ('2GiB', 2 ** 31)
+])
+def test_parse_size(text, size):
+    assert parse_size(text) == size
+
+
+def test_run(tmpdir):
+    output = tmpdir.join('results.jsonl')
+    main([
+        '--chunk-sizes', '1K', '--simultaneous-uploads', '2',
+        '--test-chunks', 'true', '--files', '2', '--file-sizes', '3K',
+        '--scheduling', 'round_robin', '--output', str(output)
+    ])
+    record, = [json.loads(line) for line in output.readlines()]
+    assert record['chunk_size'] == 1024
+    assert record['scheduling'] == 'round_robin'
+    results = record['results']
+    assert results['chunks'] == 6
+    assert results['requests'] == 12
+    assert results['bytes'] == 6144
+    assert results['peak_traced_bytes'] > 0
+    assert results['max_rss'] is None or results['max_rss'] > 0
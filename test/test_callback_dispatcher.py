@@ -15,3 +15,22 @@ def test_callback_dispatcher():
 
     for callback in callbacks:
         callback.assert_called_once_with('foo', 'bar', key='value')
+
+
+def test_callback_dispatcher_events():
+
+    events = Mock()
+    key = object()
+    dispatcher = CallbackDispatcher(events, key=key, progress=True)
+    callback = Mock()
+    dispatcher.register(callback)
+
+    dispatcher.trigger('foo', key='value')
+
+    callback.assert_not_called()
+    events.post.assert_called_once_with(
+        dispatcher._dispatch, ('foo',), {'key': 'value'}, key=key,
+        progress=True
+    )
+    dispatcher._dispatch('foo', key='value')
+    callback.assert_called_once_with('foo', key='value')
@@ -1,16 +1,37 @@
-from mock import Mock, call
+from concurrent.futures import Future
+from io import BytesIO
+import zlib
+
+from mock import Mock
 import pytest
+import requests
+from werkzeug.formparser import parse_form_data
 
 from resumable.util import Config
 from resumable.file import FileChunk
-from resumable.chunk import ResumableError, resolve_chunk
+from resumable.chunk import ResumableError, ChunkProbe, resolve_chunk
+from resumable.compression import ChunkCompressor
+from resumable.multipart import MultipartEncoder
+from resumable.prefetch import Prefetcher
+from resumable.retry import ConstantBackoff, RetryBudget
+from resumable.stats import UploadStats
 
 
 TEST_TARGET = 'http://example.com/upload'
 TEST_PATH = '/path/to/file.txt'
 TEST_CHUNK_SIZE = 100
 TEST_FILE_SIZE = 123
-MOCK_CHUNK_DATA = 'foo ' * 25
+MOCK_CHUNK_DATA = b'foo ' * 25
+
+
+def mock_config(**kwargs):
+    options = dict(
+        target=TEST_TARGET, test_chunks=True, permanent_errors=[500],
+        max_chunk_retries=100, max_test_misses=None,
+        retry_policy=ConstantBackoff(0)
+    )
+    options.update(kwargs)
+    return Config(**options)
 
 
 def mock_session(test_status=404, send_status=200):
@@ -26,16 +47,23 @@ def mock_session(test_status=404, send_status=200):
 def mock_file(path=TEST_PATH):
     return Mock(
         path=path,
+        relative_path=path,
         size=TEST_FILE_SIZE,
         chunk_size=TEST_CHUNK_SIZE,
         unique_identifier='unique identifier',
-        chunks=['foo', 'bar']
+        chunks=['foo', 'bar'],
+        probe=ChunkProbe(),
+        rate_limit=None,
+        future=Future(),
+        _read_bytes=Mock(side_effect=lambda start, num_bytes: (
+            MOCK_CHUNK_DATA[start:start + num_bytes]
+        ))
     )
 
 
 def mock_chunk():
     return FileChunk(
-        index=0, size=100, read=Mock(return_value=MOCK_CHUNK_DATA)
+        index=0, start=0, size=100, read=Mock(return_value=MOCK_CHUNK_DATA)
     )
 
 
@@ -60,11 +88,14 @@ def assert_get(session, **kwargs):
 
 
 def assert_post(session, times=1, **kwargs):
-    single_call = call(
-        TEST_TARGET, data=expected_form_data(**kwargs),
-        files={'file': MOCK_CHUNK_DATA}
-    )
-    session.post.assert_has_calls([single_call] * times)
+    assert session.post.call_count == times
+    for args, call_kwargs in session.post.call_args_list:
+        assert args == (TEST_TARGET,)
+        body = call_kwargs['data']
+        assert isinstance(body, MultipartEncoder)
+        assert call_kwargs['headers'] == {'Content-Type': body.content_type}
+        assert body.fields == expected_form_data(**kwargs)
+        assert MOCK_CHUNK_DATA in body.read()
 
 
 @pytest.mark.parametrize('path, file_type, test_status', [
@@ -76,9 +107,7 @@ def assert_post(session, times=1, **kwargs):
 def test_resolve_chunk(path, file_type, test_status):
 
     session = mock_session()
-    config = Config(
-        target=TEST_TARGET, test_chunks=True, permanent_errors=[500]
-    )
+    config = mock_config()
     file = mock_file(path)
     chunk = mock_chunk()
 
@@ -92,9 +121,7 @@ def test_resolve_chunk(path, file_type, test_status):
 def test_resolve_chunk_exists():
 
     session = mock_session(test_status=200)
-    config = Config(
-        target=TEST_TARGET, test_chunks=True, permanent_errors=[500]
-    )
+    config = mock_config()
     file = mock_file()
     chunk = mock_chunk()
 
@@ -108,9 +135,7 @@ def test_resolve_chunk_exists():
 def test_resolve_chunk_no_test():
 
     session = mock_session()
-    config = Config(
-        target=TEST_TARGET, test_chunks=False, permanent_errors=[500]
-    )
+    config = mock_config(test_chunks=False)
     file = mock_file()
     chunk = mock_chunk()
 
@@ -124,9 +149,7 @@ def test_resolve_chunk_no_test():
 def test_resolve_chunk_send_permanent_error():
 
     session = mock_session(send_status=500)
-    config = Config(
-        target=TEST_TARGET, test_chunks=True, permanent_errors=[500]
-    )
+    config = mock_config()
     file = mock_file()
     chunk = mock_chunk()
 
@@ -141,10 +164,7 @@ def test_resolve_chunk_send_permanent_error():
 def test_resolve_chunk_send_exceed_max_retries():
 
     session = mock_session(send_status=418)
-    config = Config(
-        target=TEST_TARGET, test_chunks=True, permanent_errors=[500],
-        max_chunk_retries=10
-    )
+    config = mock_config(max_chunk_retries=10)
     file = mock_file()
     chunk = mock_chunk()
 
@@ -154,3 +174,323 @@ def test_resolve_chunk_send_exceed_max_retries():
     assert_get(session)
     assert_post(session, times=10)
     file.mark_chunk_completed.assert_not_called()
+
+
+def test_resolve_chunk_stops_retrying_done_file():
+
+    session = mock_session(send_status=418)
+    config = mock_config(max_chunk_retries=10)
+    file = mock_file()
+    session.post.side_effect = lambda *args, **kwargs: (
+        session.post.call_count == 2 and file.future.cancel(),
+        Mock(status_code=418)
+    )[1]
+
+    resolve_chunk(session, config, file, mock_chunk())
+
+    assert session.post.call_count == 2
+    file.mark_chunk_completed.assert_not_called()
+
+
+def test_resolve_chunk_stop_testing():
+
+    session = mock_session()
+    config = mock_config(max_test_misses=2)
+    file = mock_file()
+
+    for _ in range(4):
+        resolve_chunk(session, config, file, mock_chunk())
+
+    assert session.get.call_count == 2
+    assert session.post.call_count == 4
+
+
+def test_resolve_chunk_continue_testing_on_hits():
+
+    session = mock_session(test_status=200)
+    config = mock_config(max_test_misses=2)
+    file = mock_file()
+
+    for _ in range(4):
+        resolve_chunk(session, config, file, mock_chunk())
+
+    assert session.get.call_count == 4
+    session.post.assert_not_called()
+
+
+def test_resolve_chunk_resume_testing_after_retry():
+
+    session = mock_session()
+    session.post.side_effect = [
+        Mock(status_code=418), Mock(status_code=200), Mock(status_code=200)
+    ]
+    config = mock_config(max_chunk_retries=10, max_test_misses=1)
+    file = mock_file()
+
+    # Testing stops after the first miss, but the retry resumes it
+    resolve_chunk(session, config, file, mock_chunk())
+    assert session.get.call_count == 1
+    resolve_chunk(session, config, file, mock_chunk())
+    assert session.get.call_count == 2
+
+
+@pytest.mark.parametrize('statuses, congested', [
+    ([200], False),
+    ([503, 200], True)
+])
+def test_resolve_chunk_records_concurrency(statuses, congested):
+
+    session = mock_session()
+    session.post.side_effect = [
+        Mock(status_code=code, headers={}) for code in statuses
+    ]
+    concurrency = Mock()
+
+    resolve_chunk(session, mock_config(test_chunks=False), mock_file(),
+                  mock_chunk(), concurrency=concurrency)
+
+    concurrency.record.assert_called_once()
+    args, kwargs = concurrency.record.call_args
+    assert args[1] == 100
+    assert kwargs == {'congested': congested}
+
+
+def test_resolve_chunk_retry_connection_error(mocker):
+
+    sleep = mocker.patch('resumable.chunk.time.sleep')
+    session = mock_session()
+    session.post.side_effect = [
+        requests.exceptions.ConnectionError(), Mock(status_code=200)
+    ]
+    config = mock_config(test_chunks=False, retry_policy=ConstantBackoff(2))
+    file = mock_file()
+    chunk = mock_chunk()
+
+    resolve_chunk(session, config, file, chunk)
+
+    assert session.post.call_count == 2
+    sleep.assert_called_once_with(2)
+    file.record_retry.assert_called_once_with(2)
+    file.mark_chunk_completed.assert_called_once_with(chunk)
+
+
+def test_resolve_chunk_retry_budget_exhausted():
+
+    session = mock_session(send_status=418)
+    config = mock_config(test_chunks=False)
+    budget = RetryBudget(reserve=2)
+    file = mock_file()
+
+    with pytest.raises(ResumableError):
+        resolve_chunk(session, config, file, mock_chunk(),
+                      retry_budget=budget)
+
+    assert session.post.call_count == 3
+    assert budget.balance == 0
+    file.mark_chunk_completed.assert_not_called()
+
+
+def test_resolve_chunk_retry_budget_deposit():
+
+    session = mock_session()
+    budget = Mock()
+
+    resolve_chunk(session, mock_config(test_chunks=False), mock_file(),
+                  mock_chunk(), retry_budget=budget)
+
+    budget.deposit.assert_called_once_with()
+    budget.withdraw.assert_not_called()
+
+
+def test_resolve_chunk_target():
+
+    session = mock_session()
+    session.post.side_effect = [
+        requests.exceptions.ConnectionError(), Mock(status_code=200)
+    ]
+    session.get.side_effect = requests.exceptions.ConnectionError()
+    target = Mock(url='https://other.example.com/upload')
+    file = mock_file()
+    chunk = mock_chunk()
+
+    resolve_chunk(session, mock_config(), file, chunk, target=target)
+
+    session.get.assert_called_once()
+    for args, _ in session.post.call_args_list:
+        assert args == (target.url,)
+    assert target.record_failure.call_count == 2
+    target.record_success.assert_called_once_with()
+    file.mark_chunk_completed.assert_called_once_with(chunk)
+
+
+def test_resolve_chunk_compressed():
+
+    session = mock_session()
+    compressor = Mock(encoding='gzip')
+    compressor.compress.return_value = b'compressed'
+    file = mock_file()
+    chunk = mock_chunk()
+
+    resolve_chunk(session, mock_config(test_chunks=False), file, chunk,
+                  compressor=compressor)
+
+    compressor.compress.assert_called_once_with(file, MOCK_CHUNK_DATA)
+    body = session.post.call_args[1]['data']
+    assert body.fields['resumableChunkEncoding'] == 'gzip'
+    assert body.size == len(b'compressed')
+    assert b'compressed' in body.read()
+
+
+def test_resolve_chunk_not_compressed():
+
+    session = mock_session()
+    compressor = Mock(compressible=Mock(return_value=False))
+
+    resolve_chunk(session, mock_config(test_chunks=False), mock_file(),
+                  mock_chunk(), compressor=compressor)
+
+    compressor.compress.assert_not_called()
+    assert_post(session)
+
+
+def test_resolve_chunk_rate_limit():
+
+    session = mock_session()
+    rate_limit = Mock()
+    rate_limit.reserve.return_value = 0
+    file = mock_file()
+    file.rate_limit = Mock()
+    file.rate_limit.reserve.return_value = 0
+
+    resolve_chunk(session, mock_config(test_chunks=False), file,
+                  mock_chunk(), rate_limit=rate_limit)
+
+    assert_post(session)
+    body = session.post.call_args[1]['data']
+    for limit in [rate_limit, file.rate_limit]:
+        limit.reserve.assert_called_once_with(len(body))
+
+
+def test_resolve_chunk_stats():
+
+    responses = iter([Mock(status_code=503), Mock(status_code=200)])
+
+    def post(url, data, headers):
+        data.read()
+        return next(responses)
+
+    session = mock_session()
+    session.post.side_effect = post
+    stats = UploadStats()
+    file = mock_file()
+    chunk = mock_chunk()
+
+    resolve_chunk(session, mock_config(), file, chunk, stats=stats)
+
+    assert stats.chunks_sent == 1
+    assert stats.bytes_sent == chunk.size
+    assert stats.retries == 1
+    assert stats.chunks_skipped == 0
+    counts = dict(
+        (phase, histogram.count) for phase, histogram in stats.phases.items()
+    )
+    assert counts == {'queue': 0, 'read': 2, 'test': 1, 'send': 2,
+                      'backoff': 1}
+
+
+def test_resolve_chunk_stats_skipped():
+
+    session = mock_session(test_status=200)
+    stats = UploadStats()
+    chunk = mock_chunk()
+
+    resolve_chunk(session, mock_config(), mock_file(), chunk, stats=stats)
+
+    assert stats.chunks_skipped == 1
+    assert stats.bytes_skipped == chunk.size
+    assert stats.chunks_sent == 0
+    assert stats.phases['send'].count == 0
+
+
+def test_resolve_chunk_data():
+
+    session = mock_session(send_status=503)
+    session.post.side_effect = [Mock(status_code=503), Mock(status_code=200)]
+    file = mock_file()
+
+    resolve_chunk(session, mock_config(test_chunks=False), file,
+                  mock_chunk(), data=memoryview(MOCK_CHUNK_DATA))
+
+    # Sent on every attempt without reading the file
+    assert_post(session, times=2)
+    file._read_bytes.assert_not_called()
+
+
+@pytest.mark.parametrize('py2', [False, True])
+@pytest.mark.parametrize('compress', [False, True])
+def test_resolve_chunk_prefetched(mocker, py2, compress):
+    mocker.patch('resumable.util.PY2', py2)
+
+    def read_into(start, buffer):
+        buffer[:] = MOCK_CHUNK_DATA[start:start + len(buffer)]
+        return len(buffer)
+
+    session = mock_session()
+    file = mock_file()
+    file.source = None
+    file._read_into = Mock(side_effect=read_into)
+    chunk = mock_chunk()
+    prefetcher = Prefetcher(1024)
+    prefetcher.schedule(file, chunk)
+    data = prefetcher.take(file, chunk)
+    assert isinstance(data, memoryview)
+    compressor = ChunkCompressor('gzip') if compress else None
+
+    resolve_chunk(session, mock_config(test_chunks=False), file, chunk,
+                  compressor=compressor, data=data)
+
+    body = session.post.call_args[1]['data']
+    content = body.read()
+    assert isinstance(content, bytes)
+    _, _, files = parse_form_data({
+        'wsgi.input': BytesIO(content),
+        'CONTENT_TYPE': body.content_type,
+        'CONTENT_LENGTH': str(len(content)),
+        'REQUEST_METHOD': 'POST'
+    })
+    payload = files['file'].read()
+    if compress:
+        assert body.fields['resumableChunkEncoding'] == 'gzip'
+        payload = zlib.decompress(payload, 31)
+    assert payload == MOCK_CHUNK_DATA
+    prefetcher.close()
+
+
+def test_resolve_chunk_latency_excludes_rate_limit(mocker):
+
+    clock = Mock(return_value=0.0)
+    mocker.patch('resumable.chunk.monotonic', clock)
+
+    def sleep(delay):
+        clock.return_value += delay
+
+    mocker.patch('resumable.ratelimit.time.sleep', sleep)
+    rate_limit = Mock()
+    rate_limit.reserve.return_value = 2.0
+
+    def post(url, data, headers):
+        data.read()
+        clock.return_value += 0.5
+        return Mock(status_code=200)
+
+    session = mock_session()
+    session.post.side_effect = post
+    concurrency = Mock()
+
+    resolve_chunk(session, mock_config(test_chunks=False), mock_file(),
+                  mock_chunk(), concurrency=concurrency,
+                  rate_limit=rate_limit)
+
+    latency, num_bytes = concurrency.record.call_args[0]
+    assert latency == pytest.approx(0.5)
+    assert num_bytes == 100
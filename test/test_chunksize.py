@@ -0,0 +1,27 @@
+import pytest
+
+from resumable.chunksize import AdaptiveChunkSize, KiB, MiB
+
+
+@pytest.mark.parametrize('file_size, throughput, in_flight, expected', [
+    # Small files get the server's minimum
+    (4 * KiB, None, 1, 256 * KiB),
+    # Large files are split into about the target number of chunks
+    (10000 * MiB, None, 1, 10 * MiB),
+    # Huge files are limited by the server's maximum
+    (10 ** 12, None, 1, 64 * MiB),
+    # Fast uploads get larger chunks
+    (100 * MiB, 40 * MiB, 4, 20 * MiB),
+    # Sizes are aligned
+    (1000 * MiB + 1, None, 1, MiB + 64 * KiB)
+])
+def test_adaptive_chunk_size(file_size, throughput, in_flight, expected):
+    policy = AdaptiveChunkSize()
+    assert policy(file_size, throughput, in_flight) == expected
+
+
+def test_adaptive_chunk_size_memory_limit():
+    policy = AdaptiveChunkSize(memory_limit=64 * MiB)
+    assert policy(10 ** 12, None, 16) == 4 * MiB
+    # The server's minimum takes precedence
+    assert policy(10 ** 12, None, 1024) == 256 * KiB
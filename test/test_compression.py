@@ -0,0 +1,88 @@
+import os
+import zlib
+
+from mock import Mock
+import pytest
+
+from resumable.compression import (
+    GzipCodec, ChunkCompressor, make_codec, zstd_available
+)
+
+
+TEXT = b'timestamp,level,message\n' + b'1234,INFO,all is well\n' * 1000
+
+
+def mock_file(path, content):
+    return Mock(
+        path=path, size=len(content),
+        _read_bytes=Mock(side_effect=lambda start, num_bytes: (
+            content[start:start + num_bytes]
+        ))
+    )
+
+
+def test_gzip_codec():
+    compressed = GzipCodec().compress(TEXT)
+    assert len(compressed) < len(TEXT) / 5
+    assert zlib.decompress(compressed, 31) == TEXT
+
+
+def test_make_codec(mocker):
+    mocker.patch('resumable.compression.zstd_available', return_value=False)
+    assert isinstance(make_codec('gzip'), GzipCodec)
+    assert isinstance(make_codec('auto'), GzipCodec)
+    with pytest.raises(ValueError):
+        make_codec('lzw')
+
+
+@pytest.mark.skipif(not zstd_available(), reason='zstandard not installed')
+def test_zstd_codec():
+    import zstandard
+    codec = make_codec('zstd')
+    assert codec.encoding == 'zstd'
+    decompressor = zstandard.ZstdDecompressor()
+    assert decompressor.decompress(codec.compress(TEXT)) == TEXT
+
+
+@pytest.mark.parametrize('path, content, expected', [
+    ('/logs/app.csv', TEXT, True),
+    ('/logs/app', TEXT, True),
+    ('/images/drawing.svg', TEXT, True),
+    ('/images/photo.jpg', TEXT, False),
+    ('/archives/logs.zip', TEXT, False),
+    ('/data/random.csv', os.urandom(100000), False),
+    ('/data/empty.csv', b'', False)
+])
+def test_compressible(path, content, expected):
+    compressor = ChunkCompressor('gzip')
+    file = mock_file(path, content)
+    assert compressor.compressible(file) == expected
+    # The decision is made once per file
+    assert compressor.compressible(file) == expected
+    assert file._read_bytes.call_count <= 1
+
+
+def test_compress():
+    compressor = ChunkCompressor('gzip')
+    file = mock_file('/logs/app.csv', TEXT)
+    compressed = compressor.compress(file, TEXT[:1000])
+    assert zlib.decompress(compressed, 31) == TEXT[:1000]
+    # Chunks that would grow are sent uncompressed
+    assert compressor.compress(file, os.urandom(1000)) is None
+    assert compressor.compress(mock_file('/a.jpg', TEXT), TEXT) is None
+
+
+@pytest.mark.parametrize('py2', [False, True])
+def test_compress_memoryview(mocker, py2):
+    mocker.patch('resumable.util.PY2', py2)
+    codec = GzipCodec()
+    mocker.spy(codec, 'compress')
+    compressor = ChunkCompressor(codec)
+    view = memoryview(TEXT)
+    file = mock_file('/logs/app.csv', view)
+
+    compressed = compressor.compress(file, view[:1000])
+
+    assert zlib.decompress(compressed, 31) == TEXT[:1000]
+    (data,), _ = codec.compress.call_args
+    assert isinstance(data, bytes) == py2
@@ -0,0 +1,98 @@
+from mock import Mock
+import pytest
+
+from resumable.concurrency import FixedConcurrency, AdaptiveConcurrency
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = Mock(return_value=0.0)
+    mocker.patch('resumable.concurrency.monotonic', clock)
+    return clock
+
+
+def test_fixed_concurrency(clock):
+    concurrency = FixedConcurrency(5, interval=1.0, smoothing=0.5)
+    assert concurrency.limit == 5
+    assert concurrency.throughput is None
+
+    clock.return_value = 0.5
+    concurrency.record(0.1, 100)
+    assert concurrency.throughput is None
+
+    clock.return_value = 1.0
+    concurrency.record(0.1, 100)
+    assert concurrency.throughput == 200
+
+    clock.return_value = 2.0
+    concurrency.record(0.1, 400, congested=True)
+    assert concurrency.throughput == 300
+    assert concurrency.limit == 5
+
+
+def test_adaptive_increase(clock):
+    concurrency = AdaptiveConcurrency(4)
+    assert concurrency.limit == 1
+
+    for limit in [2, 3, 4, 4]:
+        for _ in range(concurrency.limit):
+            clock.return_value += 1.0
+            concurrency.record(1.0, 100)
+        assert concurrency.limit == limit
+
+
+def test_adaptive_hold_without_improvement(clock):
+    concurrency = AdaptiveConcurrency(10, initial_limit=2)
+
+    for _ in range(2):
+        clock.return_value += 1.0
+        concurrency.record(1.0, 100)
+    assert concurrency.limit == 3
+
+    # Throughput falls in the next round
+    for _ in range(3):
+        clock.return_value += 2.0
+        concurrency.record(1.0, 100)
+    assert concurrency.limit == 3
+
+
+@pytest.mark.parametrize('latency, congested', [
+    (1.0, True),
+    (2.5, False)
+])
+def test_adaptive_backoff(clock, latency, congested):
+    concurrency = AdaptiveConcurrency(16, initial_limit=8)
+    concurrency.record(1.0, 100)
+
+    concurrency.record(latency, 100, congested=congested)
+    assert concurrency.limit == 4
+
+    # Only backs off once per round
+    concurrency.record(latency, 100, congested=congested)
+    assert concurrency.limit == 4
+
+
+def test_adaptive_min_limit(clock):
+    concurrency = AdaptiveConcurrency(16, min_limit=2, initial_limit=2)
+    concurrency.record(1.0, 100, congested=True)
+    assert concurrency.limit == 2
+
+
+def test_adaptive_mixed_chunk_sizes(clock):
+    concurrency = AdaptiveConcurrency(16)
+
+    # A short last chunk of a file does not set the baseline...
+    concurrency.record(0.02, 1000)
+    for _ in range(50):
+        for _ in range(concurrency.limit):
+            clock.return_value += 0.1
+            concurrency.record(0.1, 1024 * 1024)
+    assert concurrency.limit == 16
+    assert concurrency.baseline_bytes == 1024 * 1024
+
+    # ...nor counts as congested against the full-size chunks
+    concurrency.record(0.09, 1000)
+    assert concurrency.limit == 16
+
+    concurrency.record(0.25, 1024 * 1024)
+    assert concurrency.limit == 8
@@ -0,0 +1,189 @@
+import time
+import threading
+
+from mock import Mock
+import pytest
+
+from resumable.events import EventDispatcher
+
+
+def test_events_run_in_order_on_thread():
+
+    calls = []
+
+    def callback(value):
+        calls.append((value, threading.current_thread()))
+
+    events = EventDispatcher()
+    for value in range(100):
+        events.post(callback, (value,))
+    events.close()
+
+    assert [value for value, _ in calls] == list(range(100))
+    threads = set(thread for _, thread in calls)
+    assert len(threads) == 1
+    assert threading.current_thread() not in threads
+
+
+def test_events_do_not_block_trigger():
+
+    release = threading.Event()
+    events = EventDispatcher()
+
+    start = time.time()
+    events.post(release.wait)
+    events.post(Mock())
+    assert time.time() - start < 0.5
+
+    release.set()
+    events.close()
+
+
+def test_events_bounded():
+
+    release = threading.Event()
+    events = EventDispatcher(max_queued=1)
+    events.post(release.wait)
+    # Wait for the first callback to start, leaving room for one more
+    while events._queue:
+        time.sleep(0.001)
+    events.post(Mock())
+
+    posted = threading.Event()
+
+    def post():
+        events.post(Mock())
+        posted.set()
+
+    thread = threading.Thread(target=post)
+    thread.start()
+    assert not posted.wait(0.1)
+
+    release.set()
+    assert posted.wait(1)
+    thread.join()
+    events.close()
+
+
+def test_events_error():
+
+    class IntentionalException(Exception):
+        pass
+
+    after = Mock()
+    events = EventDispatcher()
+    events.post(Mock(side_effect=IntentionalException()))
+    events.post(after)
+    events.close()
+
+    assert isinstance(events.error, IntentionalException)
+    after.assert_called_once_with()
+
+
+def test_events_after_close():
+
+    callback = Mock()
+    events = EventDispatcher()
+    events.close()
+    events.post(callback, ('foo',))
+    callback.assert_called_once_with('foo')
+
+
+def test_events_callback_posts_event():
+
+    second = Mock()
+    events = EventDispatcher(max_queued=1)
+    events.post(lambda: [events.post(second) for _ in range(3)])
+    events.close()
+    assert second.call_count == 3
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = Mock(return_value=0.0)
+    mocker.patch('resumable.events.monotonic', clock)
+    return clock
+
+
+def test_events_coalesce_progress(clock):
+
+    calls = []
+    release = threading.Event()
+    events = EventDispatcher(progress_rate=2)
+    key = object()
+
+    # Hold the dispatcher thread while progress is posted
+    events.post(release.wait)
+    for value in range(5):
+        events.post(calls.append, (value,), key=key, progress=True)
+    release.set()
+    while events._pending:
+        time.sleep(0.001)
+    assert calls == [4]
+
+    # The next progress event is due half a second after the last
+    events.post(calls.append, (5,), key=key, progress=True)
+    events.post(calls.append, (6,), key=key, progress=True)
+    time.sleep(0.05)
+    assert calls == [4]
+    clock.return_value = 0.5
+    events.post(calls.append, (7,), key=key, progress=True)
+    while events._pending:
+        time.sleep(0.001)
+    assert calls == [4, 7]
+
+    events.close()
+
+
+def test_events_forget_progress(clock):
+
+    calls = []
+    release = threading.Event()
+    events = EventDispatcher(progress_rate=2)
+    keys = [object(), object()]
+
+    events.post(release.wait)
+    for key in keys:
+        events.post(calls.append, (key,), key=key, progress=True)
+    release.set()
+    while events._pending:
+        time.sleep(0.001)
+    assert len(events._last_progress) == 2
+
+    # A waiting progress event of a forgotten key runs straight away
+    events.post(calls.append, ('late',), key=keys[0], progress=True)
+    events.forget(keys[0])
+    while 'late' not in calls:
+        time.sleep(0.001)
+    assert keys[0] not in events._last_progress
+
+    # Times no longer delaying any event are dropped
+    clock.return_value = 0.5
+    other = object()
+    events.post(calls.append, (other,), key=other, progress=True)
+    while events._pending:
+        time.sleep(0.001)
+    assert list(events._last_progress) == [other]
+
+    events.close()
+
+
+def test_events_flush_progress_before_other_events(clock):
+
+    calls = []
+    events = EventDispatcher(progress_rate=1)
+    key = object()
+    other = object()
+
+    events.post(calls.append, ('progress 1',), key=key, progress=True)
+    while events._pending:
+        time.sleep(0.001)
+    events.post(calls.append, ('progress 2',), key=key, progress=True)
+    events.post(calls.append, ('progress other',), key=other, progress=True)
+    events.post(calls.append, ('completed',), key=key)
+    events.close()
+
+    assert calls.index('progress 2') < calls.index('completed')
+    assert sorted(calls) == sorted([
+        'progress 1', 'progress 2', 'progress other', 'completed'
+    ])
@@ -1,26 +1,18 @@
-from mock import Mock, MagicMock, call
+from mock import Mock
 
 import pytest
 
 from resumable.file import ResumableFile, build_chunks
+from resumable.reader import HandlePool
+from resumable.source import BufferSource
 from test.fixture import (  # noqa: F401
     SAMPLE_CONTENT, TEST_CHUNK_SIZE, SAMPLE_CONTENT_CHUNKS, sample_file
 )
 
 
 @pytest.fixture
-def mock_lock(mocker):
-    lock = MagicMock()
-    mocker.patch('resumable.file.Lock', Mock(return_value=lock))
-    return lock
-
-
-@pytest.fixture
-def mock_open(mocker):
-    file = Mock(seek=Mock(), read=Mock(), close=Mock())
-    open = Mock(return_value=file)
-    mocker.patch('resumable.file.open', open)
-    return open
+def mock_open_reader(mocker):
+    return mocker.patch('resumable.reader.open_reader')
 
 
 def test_build_chunks(sample_file):  # noqa: F811
@@ -51,14 +43,33 @@ def test_build_chunks(sample_file):  # noqa: F811
     read_bytes.assert_called_once_with(200, 33)
 
 
+def test_build_chunks_lazy():
+
+    read_bytes = Mock()
+    chunks = build_chunks(read_bytes, 10 ** 15, 1)
+
+    assert len(chunks) == 10 ** 15
+    assert chunks[-1].index == 10 ** 15 - 1
+    assert chunks[-1].start == 10 ** 15 - 1
+    assert chunks[10 ** 12].size == 1
+    assert [chunk.index for chunk in chunks[5:8]] == [5, 6, 7]
+    read_bytes.assert_not_called()
+
+    with pytest.raises(IndexError):
+        chunks[10 ** 15]
+
+
 def test_file(mocker, sample_file):  # noqa: F811
-    mock_build_chunks = mocker.patch('resumable.file.build_chunks')
+    mock_build_chunks = mocker.patch(
+        'resumable.file.build_chunks', return_value=['one', 'two']
+    )
 
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
 
     assert file.path == sample_file
     assert file.chunk_size == TEST_CHUNK_SIZE
     assert file.size == len(SAMPLE_CONTENT)
+    assert file.relative_path == file.path
     assert file.chunks == mock_build_chunks.return_value
 
     mock_build_chunks.assert_called_once_with(
@@ -66,65 +77,171 @@ def test_file(mocker, sample_file):  # noqa: F811
     )
 
 
-def test_close(sample_file, mock_open):  # noqa: F811
+def test_file_known_size(mocker, sample_file):  # noqa: F811
+    getsize = mocker.patch('resumable.file.os.path.getsize')
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE,
+                         relative_path='dir/sample-file.txt',
+                         size=len(SAMPLE_CONTENT))
+
+    getsize.assert_not_called()
+    assert file.size == len(SAMPLE_CONTENT)
+    assert file.relative_path == 'dir/sample-file.txt'
+
+
+def test_file_source(mocker):
+
+    open_reader = mocker.patch('resumable.reader.open_reader')
+    journal = Mock()
+    content = b'sample content afsdfas'
+
+    file = ResumableFile('reports/sample.txt', 10, journal,
+                         source=BufferSource(content))
+
+    assert file.path == 'reports/sample.txt'
+    assert file.relative_path == 'reports/sample.txt'
+    assert file.size == len(content)
+    assert len(file.chunks) == 3
+    data = file.chunks[1].read()
+    assert isinstance(data, memoryview)
+    assert data == content[10:20]
+    open_reader.assert_not_called()
+    journal.entry.assert_not_called()
+
+
+def test_close(sample_file, mock_open_reader):  # noqa: F811
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    # Opened lazily
+    mock_open_reader.assert_not_called()
+    assert not file.is_open
+
+    file.chunks[0].read()
+    mock_open_reader.assert_called_once_with(
+        str(sample_file), len(SAMPLE_CONTENT)
+    )
+    assert file.is_open
+
     file.close()
-    mock_open.return_value.close.assert_called_once()
+    mock_open_reader.return_value.close.assert_called_once()
+    assert not file.is_open
+
 
+def test_shared_handles(sample_file, mock_open_reader):  # noqa: F811
+    handles = HandlePool(max_open=1)
+    first = ResumableFile(sample_file, TEST_CHUNK_SIZE, handles=handles)
+    second = ResumableFile(sample_file, TEST_CHUNK_SIZE, handles=handles)
 
-def test_mark_chunk_completed(mocker, sample_file):  # noqa: F811
+    first.chunks[0].read()
+    second.chunks[0].read()
+    assert not first.is_open
+    assert second.is_open
+    assert mock_open_reader.call_count == 2
 
-    chunk = Mock()
-    mocker.patch('resumable.file.build_chunks', return_value=[chunk])
+
+def test_mark_chunk_completed(sample_file):  # noqa: F811
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    completed = Mock()
+    chunk_completed = Mock()
+    file.completed.register(completed)
+    file.chunk_completed.register(chunk_completed)
+
+    file.mark_chunk_completed(file.chunks[1])
+
+    assert file.is_chunk_completed(file.chunks[1])
+    assert not file.is_chunk_completed(file.chunks[0])
+    chunk_completed.assert_called_once_with(file.chunks[1])
+    completed.assert_not_called()
+
+
+def test_mark_chunk_completed_twice(sample_file):  # noqa: F811
 
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
-    file.mark_chunk_completed(chunk)
+    chunk_completed = Mock()
+    file.chunk_completed.register(chunk_completed)
 
-    assert file._chunk_done == {chunk: True}
+    file.mark_chunk_completed(file.chunks[1])
+    file.mark_chunk_completed(file.chunks[1])
+
+    assert file.fraction_completed == 1. / 3
+    chunk_completed.assert_called_once()
+
+
+def test_mark_all_chunks_completed(sample_file):  # noqa: F811
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    completed = Mock()
+    file.completed.register(completed)
+
+    for chunk in file.chunks:
+        file.mark_chunk_completed(chunk)
+
+    completed.assert_called_once_with()
+
+
+def test_completed_after_last_chunk(sample_file):  # noqa: F811
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    calls = []
+    file.chunk_completed.register(lambda chunk: calls.append(chunk))
+    file.completed.register(lambda: calls.append('completed'))
+
+    for chunk in file.chunks:
+        file.mark_chunk_completed(chunk)
+
+    assert calls == list(file.chunks) + ['completed']
+
+
+def test_future(sample_file):  # noqa: F811
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    assert not file.future.done()
+
+    for chunk in file.chunks:
+        file.mark_chunk_completed(chunk)
+    assert file.future.result(0) is file
+
+    # Only the first outcome counts
+    file.fail(ValueError())
+    file.cancel()
+    assert file.future.result(0) is file
+
+
+def test_future_failed(sample_file):  # noqa: F811
+
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    error = ValueError()
+    file.fail(error)
+    assert file.future.exception(0) is error
+
+    file.mark_chunk_completed(file.chunks[0])
+    assert file.future.exception(0) is error
+
+    cancelled = ResumableFile(sample_file, TEST_CHUNK_SIZE)
+    cancelled.cancel()
+    assert cancelled.future.cancelled()
 
 
 def test_is_completed(sample_file):  # noqa: F811
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
-    file._chunk_done = {'one': True, 'two': True, 'three': True}
+    for chunk in file.chunks:
+        file.mark_chunk_completed(chunk)
     assert file.is_completed is True
 
 
 def test_not_completed(sample_file):  # noqa: F811
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
-    file._chunk_done = {'one': True, 'two': False, 'three': False}
+    file.mark_chunk_completed(file.chunks[0])
     assert file.is_completed is False
 
 
 def test_fraction_completed(sample_file):  # noqa: F811
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
-    file._chunk_done = {'one': True, 'two': False, 'three': False}
+    file.mark_chunk_completed(file.chunks[2])
     assert file.fraction_completed == 1. / 3
+    assert file.chunks_completed == 1
 
 
 def test_read_bytes(sample_file):  # noqa: F811
     file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
     assert file._read_bytes(2, 10) == SAMPLE_CONTENT[2:12]
-
-
-def test_read_bytes_lock(sample_file, mock_lock, mock_open):  # noqa: F811
-
-    # Collect all lock and file related calls together
-    manager = Mock(
-        lock=mock_lock,
-        open=mock_open,
-        file=mock_open.return_value
-    )
-
-    # Creating a file should cause the file to be opened in rb mode
-    file = ResumableFile(sample_file, TEST_CHUNK_SIZE)
-    assert manager.mock_calls == [call.open(sample_file, 'rb')]
-    manager.reset_mock()
-
-    # Reading bytes from the file should happen in the contect of the lock
-    file._read_bytes(2, 10)
-    assert manager.mock_calls == [
-        call.lock.__enter__(),
-        call.file.seek(2),
-        call.file.read(10),
-        call.lock.__exit__(None, None, None)
-    ]
@@ -0,0 +1,73 @@
+import hashlib
+
+import pytest
+
+from resumable import identifier
+from resumable.identifier import ContentHasher
+from resumable.source import BufferSource
+
+
+CONTENT = bytes(bytearray(range(256))) * 40
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    identifier._cache.clear()
+
+
+def expected_identifier(content, leaf_size):
+    digests = b''.join(
+        hashlib.sha256(content[start:start + leaf_size]).digest()
+        for start in range(0, len(content), leaf_size)
+    )
+    return '{0}-{1}'.format(len(content), hashlib.sha256(digests).hexdigest())
+
+
+@pytest.mark.parametrize('leaf_size', [100, 1000, 100000])
+def test_identify(tmpdir, leaf_size):
+    path = tmpdir.join('file')
+    path.write(CONTENT, 'wb')
+
+    hasher = ContentHasher(workers=2, leaf_size=leaf_size)
+    assert hasher.identify(str(path)) == \
+        expected_identifier(CONTENT, leaf_size)
+    hasher.shutdown()
+
+
+def test_identify_same_content(tmpdir):
+    first = tmpdir.join('first')
+    first.write(CONTENT, 'wb')
+    second = tmpdir.join('second')
+    second.write(CONTENT, 'wb')
+    other = tmpdir.join('other')
+    other.write(CONTENT[::-1], 'wb')
+
+    hasher = ContentHasher(workers=2, leaf_size=1000)
+    assert hasher.identify(str(first)) == hasher.identify(str(second))
+    assert hasher.identify(str(first)) != hasher.identify(str(other))
+    hasher.shutdown()
+
+
+def test_identify_source(tmpdir):
+    path = tmpdir.join('file')
+    path.write(CONTENT, 'wb')
+
+    hasher = ContentHasher(workers=2, leaf_size=1000)
+    assert hasher.identify_source(BufferSource(CONTENT)) == \
+        hasher.identify(str(path))
+    hasher.shutdown()
+
+
+def test_identify_cached(mocker, tmpdir):
+    path = tmpdir.join('file')
+    path.write(CONTENT, 'wb')
+
+    hasher = ContentHasher(workers=2, leaf_size=1000)
+    hash_file = mocker.spy(hasher, '_hash_file')
+
+    first = hasher.identify(str(path))
+    second = ContentHasher(workers=1, leaf_size=1000).identify(str(path))
+
+    assert first == second
+    assert hash_file.call_count == 1
+    hasher.shutdown()
@@ -1,3 +1,5 @@
+import pytest
+
 from resumable import Resumable
 
 from test.fixture import (  # noqa: F401
@@ -31,14 +33,83 @@ def expected_requests(resumable_file, testfile):
     return all_requests
 
 
-def test_resumable(server, sample_file):  # noqa: F811
+@pytest.mark.parametrize('pooling', ['shared', 'per_thread'])
+def test_resumable(server, sample_file, pooling):  # noqa: F811
 
     with Resumable(
         target=server.endpoint,
         chunk_size=TEST_CHUNK_SIZE,
-        simultaneous_uploads=1
+        simultaneous_uploads=1,
+        connection_pooling=pooling
+    ) as r:
+        resumable_file = r.add_file(sample_file)
+
+    expected = expected_requests(resumable_file, sample_file)
+    assert sorted(server.received) == sorted(expected)
+
+    stats = r.targets[0].sessions.stats()
+    assert stats['requests'] == len(expected)
+    assert 1 <= stats['connections'] <= len(expected)
+
+
+def test_resumable_content_identifiers(server, sample_file):  # noqa: F811
+
+    with Resumable(
+        target=server.endpoint,
+        chunk_size=TEST_CHUNK_SIZE,
+        simultaneous_uploads=1,
+        content_identifiers=True
     ) as r:
         resumable_file = r.add_file(sample_file)
 
+    assert resumable_file.unique_identifier.startswith(
+        '{0}-'.format(len(SAMPLE_CONTENT))
+    )
     expected = expected_requests(resumable_file, sample_file)
     assert sorted(server.received) == sorted(expected)
+
+
+def test_resumable_add_directory(server, tmpdir):  # noqa: F811
+
+    directory = tmpdir.mkdir('upload')
+    directory.join('one.txt').write(SAMPLE_CONTENT)
+    directory.mkdir('sub').join('two.txt').write(SAMPLE_CONTENT)
+    directory.join('skipped.dat').write(SAMPLE_CONTENT)
+
+    with Resumable(
+        target=server.endpoint,
+        chunk_size=TEST_CHUNK_SIZE
+    ) as r:
+        added = r.add_directory(directory, pattern='*.txt')
+
+    assert sorted(file.relative_path for file in added.result()) == \
+        ['upload/one.txt', 'upload/sub/two.txt']
+    relative_paths = set(
+        dict(request.data)['resumableRelativePath']
+        for request in server.received
+    )
+    assert relative_paths == set(['upload/one.txt', 'upload/sub/two.txt'])
+    assert len(server.received) == 4 * len(SAMPLE_CONTENT_CHUNKS)
+
+
+def test_resumable_add_source(server):  # noqa: F811
+
+    with Resumable(
+        target=server.endpoint,
+        chunk_size=TEST_CHUNK_SIZE,
+        simultaneous_uploads=1
+    ) as r:
+        resumable_file = r.add_source(
+            bytearray(SAMPLE_CONTENT), 'sample-file.txt',
+            relative_path='memory/sample-file.txt'
+        )
+
+    assert resumable_file.future.result() is resumable_file
+    received = sorted(server.received)
+    assert len(received) == 2 * len(SAMPLE_CONTENT_CHUNKS)
+    for request in received:
+        fields = dict(request.data)
+        assert fields['resumableFilename'] == 'sample-file.txt'
+        assert fields['resumableRelativePath'] == 'memory/sample-file.txt'
+        assert fields['resumableType'] == 'text/plain'
+        assert fields['resumableTotalSize'] == str(len(SAMPLE_CONTENT))
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+
+from resumable.journal import Journal
+from resumable.file import ResumableFile
+from test.fixture import (  # noqa: F401
+    SAMPLE_CONTENT, TEST_CHUNK_SIZE, sample_file
+)
+
+
+def recorded(path):
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT identifier, completed FROM files')
+    result = [(identifier, bytes(completed)) for identifier, completed in rows]
+    connection.close()
+    return result
+
+
+def test_new_entry(tmpdir, sample_file):  # noqa: F811
+    journal = Journal(str(tmpdir.join('journal.db')))
+    entry = journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'identifier')
+
+    assert entry.identifier == 'identifier'
+    assert not entry.resumed
+    assert list(entry.completed_indices()) == []
+
+
+def test_resume_entry(tmpdir, sample_file):  # noqa: F811
+    path = str(tmpdir.join('journal.db'))
+
+    journal = Journal(path, sync_every=1000)
+    entry = journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'identifier')
+    entry.record(0)
+    entry.record(9)
+    journal.close()
+
+    journal = Journal(path)
+    entry = journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'other')
+
+    assert entry.identifier == 'identifier'
+    assert entry.resumed
+    assert list(entry.completed_indices()) == [0, 9]
+    assert entry.is_chunk_completed(9)
+    assert not entry.is_chunk_completed(8)
+    assert not entry.is_chunk_completed(100)
+
+
+def test_batched_sync(tmpdir, sample_file):  # noqa: F811
+    path = str(tmpdir.join('journal.db'))
+
+    journal = Journal(path, sync_every=3)
+    entry = journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'identifier')
+    entry.record(0)
+
+    # Not yet synced to disk
+    assert recorded(path) == []
+
+    entry.record(1)
+    assert recorded(path) == [('identifier', b'\x03')]
+
+
+def test_modified_file(tmpdir, sample_file):  # noqa: F811
+    path = str(tmpdir.join('journal.db'))
+
+    journal = Journal(path)
+    journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'identifier')
+    journal.close()
+
+    stat = os.stat(str(sample_file))
+    os.utime(str(sample_file), (stat.st_atime, stat.st_mtime + 10))
+
+    journal = Journal(path)
+    entry = journal.entry(str(sample_file), TEST_CHUNK_SIZE, 'other')
+    assert entry.identifier == 'other'
+    assert not entry.resumed
+
+
+def test_file_restore(tmpdir, sample_file):  # noqa: F811
+    path = str(tmpdir.join('journal.db'))
+
+    journal = Journal(path)
+    file = ResumableFile(sample_file, TEST_CHUNK_SIZE, journal)
+    file.mark_chunk_completed(file.chunks[1])
+    file.close()
+    journal.close()
+
+    journal = Journal(path)
+    restored = ResumableFile(sample_file, TEST_CHUNK_SIZE, journal)
+
+    assert restored.unique_identifier == str(file.unique_identifier)
+    assert restored.is_chunk_completed(restored.chunks[1])
+    assert restored.fraction_completed == 1. / 3
+    assert not restored.probe.enabled
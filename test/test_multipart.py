@@ -0,0 +1,98 @@
+from io import BytesIO
+
+from mock import Mock
+import pytest
+from werkzeug.formparser import parse_form_data
+
+from resumable.multipart import MultipartEncoder
+
+
+FIELDS = {'resumableChunkNumber': 3, 'resumableFilename': u'caf\xe9.txt'}
+CONTENT = bytes(bytearray(range(256))) * 10
+
+
+def encoder(**kwargs):
+    read = Mock(side_effect=lambda offset, num_bytes: (
+        CONTENT[offset:offset + num_bytes]
+    ))
+    return MultipartEncoder(FIELDS, 'file', read, len(CONTENT), **kwargs)
+
+
+def parse(body):
+    data = body.read()
+    environ = {
+        'wsgi.input': BytesIO(data),
+        'CONTENT_TYPE': body.content_type,
+        'CONTENT_LENGTH': str(len(data)),
+        'REQUEST_METHOD': 'POST'
+    }
+    _, form, files = parse_form_data(environ)
+    return data, form, files
+
+
+def test_encoder():
+    body = encoder()
+    data, form, files = parse(body)
+
+    assert len(data) == len(body)
+    assert dict(form.items()) == {
+        'resumableChunkNumber': '3', 'resumableFilename': u'caf\xe9.txt'
+    }
+    assert files['file'].read() == CONTENT
+    assert files['file'].filename == 'file'
+
+
+@pytest.mark.parametrize('read_size', [1, 7, 100, 4096])
+def test_encoder_incremental(mocker, read_size):
+    mocker.patch('resumable.multipart.os.urandom', return_value=b'0' * 16)
+    expected = encoder().read()
+
+    body = encoder(block_size=64)
+    parts = []
+    while True:
+        data = body.read(read_size)
+        if not data:
+            break
+        assert len(data) <= read_size
+        parts.append(data)
+
+    assert b''.join(parts) == expected
+
+
+def test_encoder_bounded_reads():
+    body = encoder(block_size=64)
+    body.read()
+    for (offset, num_bytes), _ in body.read_file.call_args_list:
+        assert num_bytes <= 64
+
+
+def test_encoder_truncated_file():
+    body = MultipartEncoder({}, 'file', Mock(return_value=b''), 10)
+    with pytest.raises(IOError):
+        body.read()
+
+
+def test_encoder_throttle():
+    throttle = Mock()
+    body = encoder(throttle=throttle)
+    data = body.read(100) + body.read()
+    body.read()
+
+    assert throttle.call_args_list == [((100,),), ((len(data) - 100,),)]
+
+
+@pytest.mark.parametrize('py2', [False, True])
+def test_encoder_memoryview(mocker, py2):
+    mocker.patch('resumable.util.PY2', py2)
+    mocker.patch('resumable.multipart.os.urandom', return_value=b'0' * 16)
+    expected = encoder(block_size=64).read()
+
+    view = memoryview(CONTENT)
+    read = Mock(side_effect=lambda offset, num_bytes: (
+        view[offset:offset + num_bytes]
+    ))
+    body = MultipartEncoder(FIELDS, 'file', read, len(CONTENT), block_size=64)
+    data = body.read(100) + body.read()
+
+    assert isinstance(data, bytes)
+    assert data == expected
@@ -0,0 +1,186 @@
+import time
+import threading
+
+from mock import Mock
+
+from resumable.file import FileChunk
+from resumable.prefetch import BufferPool, Prefetcher
+from resumable.stats import UploadStats
+
+
+CONTENT = bytes(bytearray(range(256)))
+
+
+def mock_file(read_into=None):
+    def copy_into(start, buffer):
+        data = CONTENT[start:start + len(buffer)]
+        buffer[:len(data)] = data
+        return len(data)
+
+    return Mock(source=None,
+                _read_into=Mock(side_effect=read_into or copy_into))
+
+
+def wait_for_reads(prefetcher):
+    for future, _ in list(prefetcher._pending.values()):
+        future.exception()
+
+
+def chunk(index, size=16):
+    return FileChunk(index, index * size, size, Mock())
+
+
+def test_buffer_pool():
+    pool = BufferPool(100)
+
+    first = pool.acquire(40)
+    second = pool.acquire(40)
+    assert len(first) == len(second) == 40
+    assert pool.acquire(40) is None
+    assert pool.allocated == 80
+
+    pool.release(first)
+    assert pool.acquire(30) is first
+    pool.release(first)
+    pool.release(second)
+
+    # Free buffers too small are dropped to make room
+    third = pool.acquire(60)
+    assert len(third) == 60
+    assert pool.allocated <= 100
+
+    pool.clear()
+    assert pool.allocated == 60
+
+
+def test_prefetch():
+    stats = UploadStats()
+    prefetcher = Prefetcher(64, stats=stats)
+    file = mock_file()
+    chunks = [chunk(index) for index in range(3)]
+
+    for item in chunks:
+        prefetcher.schedule(file, item)
+    wait_for_reads(prefetcher)
+    for item in chunks:
+        data = prefetcher.take(file, item)
+        assert data == CONTENT[item.start:item.start + item.size]
+        prefetcher.release(file, item)
+
+    assert file._read_into.call_count == 3
+    assert stats.phases['read'].count == 3
+    # Buffers are reused
+    assert prefetcher.buffers.allocated <= 48
+    prefetcher.close()
+
+
+def test_prefetch_memory_cap():
+    prefetcher = Prefetcher(32)
+    file = mock_file()
+    chunks = [chunk(index) for index in range(3)]
+
+    for item in chunks:
+        prefetcher.schedule(file, item)
+    wait_for_reads(prefetcher)
+
+    assert prefetcher.take(file, chunks[0]) is not None
+    assert prefetcher.take(file, chunks[1]) is not None
+    # No room left to read the third ahead
+    assert prefetcher.take(file, chunks[2]) is None
+    assert prefetcher.buffers.allocated == 32
+    prefetcher.close()
+
+
+def test_prefetch_skips_sources():
+    prefetcher = Prefetcher(64)
+    file = mock_file()
+    file.source = Mock()
+
+    prefetcher.schedule(file, chunk(0))
+
+    assert prefetcher.take(file, chunk(0)) is None
+    file._read_into.assert_not_called()
+    prefetcher.close()
+
+
+def test_prefetch_error():
+    prefetcher = Prefetcher(64)
+    file = mock_file(read_into=Mock(side_effect=IOError()))
+
+    prefetcher.schedule(file, chunk(0))
+    wait_for_reads(prefetcher)
+
+    # Left for the upload to read, and fail, itself
+    assert prefetcher.take(file, chunk(0)) is None
+    assert prefetcher.buffers.acquire(64) is not None
+    prefetcher.close()
+
+
+def test_prefetch_error_releases_buffer():
+    prefetcher = Prefetcher(16)
+    file = mock_file(read_into=Mock(side_effect=IOError()))
+
+    prefetcher.schedule(file, chunk(0))
+    deadline = time.time() + 5
+    while prefetcher._pending:
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+    # Free for the next read without being taken
+    assert prefetcher.buffers.acquire(16) is not None
+    prefetcher.close()
+
+
+def test_prefetch_discard():
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def blocked(start, buffer):
+        started.set()
+        proceed.wait(5)
+        return len(buffer)
+
+    prefetcher = Prefetcher(32, workers=1)
+    file = mock_file(read_into=blocked)
+
+    prefetcher.schedule(file, chunk(0))
+    assert started.wait(5)
+    prefetcher.schedule(file, chunk(1))
+    prefetcher.discard(file)
+    assert not prefetcher._pending
+    assert file._read_into.call_count == 1
+
+    # The buffer of the read in progress is released once it finishes
+    assert prefetcher.buffers.acquire(32) is None
+    proceed.set()
+    deadline = time.time() + 5
+    while prefetcher.buffers.acquire(32) is None:
+        assert time.time() < deadline
+        time.sleep(0.001)
+    prefetcher.close()
+
+
+def test_prefetch_not_started():
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def blocked(start, buffer):
+        started.set()
+        proceed.wait(5)
+        return len(buffer)
+
+    prefetcher = Prefetcher(64, workers=1)
+    blocking = mock_file(read_into=blocked)
+    file = mock_file()
+
+    prefetcher.schedule(blocking, chunk(0))
+    assert started.wait(5)
+    prefetcher.schedule(file, chunk(1))
+
+    # Not waited for behind the blocked read
+    assert prefetcher.take(file, chunk(1)) is None
+    file._read_into.assert_not_called()
+
+    proceed.set()
+    assert prefetcher.take(blocking, chunk(0)) is not None
+    prefetcher.close()
@@ -0,0 +1,90 @@
+from mock import Mock
+import pytest
+
+from resumable.chunk import ResumableError
+from resumable.process import ProcessPoolResumable, _run_worker
+
+from test.fixture import (  # noqa: F401
+    SAMPLE_CONTENT, TEST_CHUNK_SIZE, SAMPLE_CONTENT_CHUNKS, server, Request
+)
+
+
+@pytest.fixture
+def sample_files(tmpdir):
+    paths = []
+    for index in range(3):
+        path = tmpdir.join('sample-{0}.txt'.format(index))
+        path.write(SAMPLE_CONTENT)
+        paths.append(path)
+    return paths
+
+
+def test_process_pool(server, sample_files):  # noqa: F811
+
+    file_added = Mock()
+    chunk_completed = Mock()
+    file_completed = Mock()
+
+    with ProcessPoolResumable(
+        server.endpoint, processes=2, chunk_size=TEST_CHUNK_SIZE,
+        simultaneous_uploads=1
+    ) as session:
+        session.file_added.register(file_added)
+        session.chunk_completed.register(chunk_completed)
+        session.file_completed.register(file_completed)
+        files = [session.add_file(path) for path in sample_files]
+
+    num_chunks = len(SAMPLE_CONTENT_CHUNKS)
+    assert len(server.received) == 2 * num_chunks * len(files)
+    identifiers = set(
+        dict(request.data)['resumableIdentifier']
+        for request in server.received
+    )
+    assert identifiers == set(file.unique_identifier for file in files)
+
+    assert file_added.call_count == len(files)
+    assert chunk_completed.call_count == num_chunks * len(files)
+    assert file_completed.call_count == len(files)
+    for file in files:
+        assert file.size == len(SAMPLE_CONTENT)
+        assert file.num_chunks == num_chunks
+        assert file.is_completed
+        assert file.fraction_completed == 1.0
+
+
+def test_process_pool_error(server, sample_files):  # noqa: F811
+
+    session = ProcessPoolResumable(
+        server.url + '/missing', processes=2, chunk_size=TEST_CHUNK_SIZE,
+        test_chunks=False
+    )
+    files = [session.add_file(path) for path in sample_files]
+
+    with pytest.raises(ResumableError):
+        session.join()
+    assert not any(file.is_completed for file in files)
+
+
+def test_run_worker_threaded_callbacks(server, tmpdir):  # noqa: F811
+
+    paths = []
+    for index in range(3):
+        path = tmpdir.join('sample-{0}.txt'.format(index))
+        path.write_binary(b'x' * TEST_CHUNK_SIZE * (index + 1))
+        paths.append(str(path))
+    tasks = Mock(get=Mock(side_effect=list(enumerate(paths)) + [None]))
+    events = Mock()
+
+    _run_worker(0, server.endpoint, dict(
+        chunk_size=TEST_CHUNK_SIZE, threaded_callbacks=True
+    ), tasks, events)
+
+    sent = [call[0][0] for call in events.put.call_args_list]
+    assert sent[-1] == ('done', 0, None)
+    for key in range(len(paths)):
+        added, = [info for event, k, info in sent
+                  if event == 'added' and k == key]
+        assert added['size'] == TEST_CHUNK_SIZE * (key + 1)
+        completed = [event for event, k, _ in sent
+                     if event == 'chunk_completed' and k == key]
+        assert len(completed) == key + 1
@@ -0,0 +1,98 @@
+from mock import Mock
+import pytest
+
+from resumable.ratelimit import TokenBucket, make_throttle
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = Mock(return_value=100.0)
+    mocker.patch('resumable.ratelimit.monotonic', clock)
+    return clock
+
+
+def test_token_bucket_burst(clock):
+    bucket = TokenBucket(1000, burst=500)
+    assert bucket.reserve(200) == 0
+    assert bucket.reserve(300) == 0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+
+def test_token_bucket_debt(clock):
+    bucket = TokenBucket(1000, burst=500)
+    # Sends larger than the burst wait for the whole debt
+    assert bucket.reserve(2500) == pytest.approx(2.0)
+    assert bucket.reserve(1000) == pytest.approx(3.0)
+
+    clock.return_value += 3.0
+    assert bucket.reserve(0) == 0
+
+
+def test_token_bucket_refill(clock):
+    bucket = TokenBucket(1000, burst=500)
+    bucket.reserve(500)
+    clock.return_value += 0.2
+    assert bucket.reserve(200) == 0
+    assert bucket.reserve(100) == pytest.approx(0.1)
+
+    # Tokens do not accumulate beyond the burst
+    clock.return_value += 10
+    assert bucket.reserve(600) == pytest.approx(0.1)
+
+
+def test_token_bucket_unlimited(clock):
+    bucket = TokenBucket()
+    assert bucket.rate is None
+    assert bucket.reserve(10 ** 12) == 0
+
+
+def test_token_bucket_change_rate(clock):
+    bucket = TokenBucket(1000, burst=500)
+    bucket.reserve(1500)
+
+    bucket.rate = 500
+    assert bucket.reserve(500) == pytest.approx(3.0)
+
+    bucket.rate = None
+    assert bucket.reserve(10 ** 12) == 0
+
+    bucket.rate = 1000
+    assert bucket.reserve(500) == 0
+    assert bucket.reserve(500) == pytest.approx(0.5)
+
+
+@pytest.mark.parametrize('rate', [0, -1])
+def test_token_bucket_invalid_rate(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
+    bucket = TokenBucket()
+    with pytest.raises(ValueError):
+        bucket.rate = rate
+
+
+def test_token_bucket_consume(mocker, clock):
+    sleep = mocker.patch('resumable.ratelimit.time.sleep')
+    bucket = TokenBucket(1000, burst=500)
+    bucket.consume(500)
+    sleep.assert_not_called()
+    bucket.consume(250)
+    sleep.assert_called_once_with(pytest.approx(0.25))
+
+
+def test_make_throttle(mocker, clock):
+    sleep = mocker.patch('resumable.ratelimit.time.sleep')
+    session = TokenBucket(1000, burst=100)
+    file = TokenBucket(100, burst=100)
+
+    throttle = make_throttle([session, None, file])
+    throttle(100)
+    sleep.assert_not_called()
+
+    # Waits for the slowest of the buckets
+    throttle(50)
+    sleep.assert_called_once_with(pytest.approx(0.5))
+    assert throttle.waited == pytest.approx(0.5)
+
+
+def test_make_throttle_unlimited():
+    assert make_throttle([None, None]) is None
@@ -0,0 +1,204 @@
+import os
+import threading
+
+from mock import Mock, MagicMock, call
+import pytest
+
+from resumable.reader import (
+    PreadReader, MmapReader, SeekReader, HandlePool, open_reader
+)
+from test.fixture import SAMPLE_CONTENT, sample_file  # noqa: F401
+
+
+READERS = [SeekReader, MmapReader]
+if hasattr(os, 'pread'):
+    READERS.append(PreadReader)
+
+
+@pytest.fixture
+def mock_lock(mocker):
+    lock = MagicMock()
+    mocker.patch('resumable.reader.Lock', Mock(return_value=lock))
+    return lock
+
+
+@pytest.fixture
+def mock_open(mocker):
+    file = Mock(seek=Mock(), read=Mock(), close=Mock())
+    open = Mock(return_value=file)
+    mocker.patch('resumable.reader.open', open, create=True)
+    return open
+
+
+@pytest.mark.parametrize('reader_class', READERS)
+def test_read(sample_file, reader_class):  # noqa: F811
+    reader = reader_class(str(sample_file))
+    assert reader.read(2, 10) == SAMPLE_CONTENT[2:12]
+    assert reader.read(15, 100) == SAMPLE_CONTENT[15:]
+    reader.close()
+
+
+@pytest.mark.parametrize('reader_class', READERS)
+def test_read_into(sample_file, reader_class):  # noqa: F811
+    reader = reader_class(str(sample_file))
+    buffer = bytearray(10)
+    assert reader.read_into(2, buffer) == 10
+    assert buffer == SAMPLE_CONTENT[2:12]
+
+    buffer = bytearray(100)
+    received = reader.read_into(15, memoryview(buffer)[:50])
+    assert received == len(SAMPLE_CONTENT) - 15
+    assert buffer[:received] == SAMPLE_CONTENT[15:]
+    reader.close()
+
+
+@pytest.mark.parametrize('reader_class', READERS)
+def test_read_concurrent(tmpdir, reader_class):
+    content = bytes(bytearray(range(256))) * 1024
+    path = tmpdir.join('concurrent')
+    path.write(content, 'wb')
+    reader = reader_class(str(path))
+
+    results = {}
+
+    def read(start):
+        results[start] = reader.read(start, 4096)
+
+    threads = [
+        threading.Thread(target=read, args=(start,))
+        for start in range(0, len(content), 4096)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reader.close()
+
+    for start, data in results.items():
+        assert data == content[start:start + 4096]
+
+
+def test_seek_reader_lock(sample_file, mock_lock, mock_open):  # noqa: F811
+
+    # Collect all lock and file related calls together
+    manager = Mock(
+        lock=mock_lock,
+        open=mock_open,
+        file=mock_open.return_value
+    )
+
+    # Creating a reader should cause the file to be opened in rb mode
+    reader = SeekReader(sample_file)
+    assert manager.mock_calls == [call.open(sample_file, 'rb')]
+    manager.reset_mock()
+
+    # Reading bytes from the file should happen in the context of the lock
+    reader.read(2, 10)
+    assert manager.mock_calls == [
+        call.lock.__enter__(),
+        call.file.seek(2),
+        call.file.read(10),
+        call.lock.__exit__(None, None, None)
+    ]
+
+
+@pytest.mark.parametrize('has_pread, size, maxsize, expected', [
+    (True, 100, 2 ** 63 - 1, PreadReader),
+    (False, 100, 2 ** 63 - 1, MmapReader),
+    (False, 0, 2 ** 63 - 1, SeekReader),
+    (False, 2 ** 30, 2 ** 31 - 1, SeekReader),
+    (False, 100, 2 ** 31 - 1, MmapReader)
+])
+def test_open_reader(mocker, has_pread, size, maxsize, expected):
+    mocker.patch('resumable.reader.sys.maxsize', maxsize)
+    os_mock = mocker.patch('resumable.reader.os')
+    if not has_pread:
+        del os_mock.pread
+    for name in ['PreadReader', 'MmapReader', 'SeekReader']:
+        mocker.patch('resumable.reader.' + name)
+
+    import resumable.reader
+    reader = open_reader('/mock/path', size)
+
+    assert reader == getattr(resumable.reader, expected.__name__).return_value
+
+
+@pytest.fixture
+def mock_readers(mocker):
+    readers = {}
+
+    def open_mock_reader(path, size):
+        reader = Mock(read=Mock(return_value=path.encode('ascii')))
+        readers.setdefault(path, []).append(reader)
+        return reader
+
+    mocker.patch('resumable.reader.open_reader', open_mock_reader)
+    return readers
+
+
+def test_handle_pool(mock_readers):
+    pool = HandlePool(max_open=2)
+
+    assert pool.read('a', 'a', 1, 0, 1) == b'a'
+    assert pool.read('b', 'b', 1, 0, 1) == b'b'
+    assert pool.read('a', 'a', 1, 0, 1) == b'a'
+    assert pool.read('c', 'c', 1, 0, 1) == b'c'
+
+    # The least recently used is closed
+    assert pool.is_open('a') and pool.is_open('c')
+    assert not pool.is_open('b')
+    mock_readers['b'][0].close.assert_called_once_with()
+    assert len(mock_readers['a']) == 1
+
+    # ...and reopened transparently
+    assert pool.read('b', 'b', 1, 0, 1) == b'b'
+    assert len(mock_readers['b']) == 2
+    assert pool.opened == 4
+    assert len(pool) == 2
+
+    pool.discard('b')
+    mock_readers['b'][1].close.assert_called_once_with()
+    pool.close()
+    mock_readers['a'][0].close.assert_called_once_with()
+    mock_readers['c'][0].close.assert_called_once_with()
+
+
+def test_handle_pool_read_into(mock_readers):
+    pool = HandlePool()
+    buffer = bytearray(4)
+    pool.read_into('a', 'a', 4, 0, buffer)
+    pool.read_into('a', 'a', 4, 2, buffer)
+
+    assert mock_readers['a'][0].read_into.call_args_list == [
+        call(0, buffer), call(2, buffer)
+    ]
+    assert pool.opened == 1
+    pool.close()
+
+
+def test_handle_pool_in_use(mock_readers):
+    pool = HandlePool(max_open=1)
+    reading = threading.Event()
+    proceed = threading.Event()
+
+    def slow_read(start, num_bytes):
+        reading.set()
+        proceed.wait()
+        return b'a'
+
+    pool.read('a', 'a', 1, 0, 1)
+    mock_readers['a'][0].read.side_effect = slow_read
+    thread = threading.Thread(target=pool.read, args=('a', 'a', 1, 0, 1))
+    thread.start()
+    reading.wait()
+
+    # A reader in use is not evicted, nor closed when discarded
+    pool.read('b', 'b', 1, 0, 1)
+    assert pool.is_open('a')
+    pool.discard('a')
+    mock_readers['a'][0].close.assert_not_called()
+
+    proceed.set()
+    thread.join()
+    mock_readers['a'][0].close.assert_called_once_with()
+    assert pool.is_open('b')
@@ -1,9 +1,11 @@
 import time
+import threading
 
 from mock import Mock, call
 import pytest
 
 from resumable.core import Resumable
+from resumable.prefetch import Prefetcher
 from resumable.util import Config
 
 
@@ -12,7 +14,9 @@ MOCK_TARGET = 'https://example.com/upload'
 
 @pytest.fixture
 def session_mock(mocker):
-    return mocker.patch('requests.Session')
+    session_mock = mocker.patch('requests.Session')
+    session_mock.return_value.adapters = {}
+    return session_mock
 
 
 @pytest.fixture
@@ -20,6 +24,14 @@ def executor_mock(mocker):
     return mocker.patch('resumable.core.ThreadPoolExecutor')
 
 
+def mock_file(chunks):
+    return Mock(
+        chunks=chunks, is_completed=False, unique_identifier='identifier',
+        is_chunk_completed=Mock(return_value=False),
+        future=Mock(done=Mock(return_value=False))
+    )
+
+
 def test_resumable(session_mock, executor_mock):
 
     mock_sim_uploads = 5
@@ -46,7 +58,28 @@ def test_resumable(session_mock, executor_mock):
         headers=mock_headers,
         max_chunk_retries=mock_max_chunk_retries,
         permanent_errors=mock_permanent_errors,
-        test_chunks=mock_test_chunks
+        test_chunks=mock_test_chunks,
+        max_queued_chunks=mock_sim_uploads,
+        max_test_misses=None,
+        content_identifiers=False,
+        hash_workers=None,
+        adaptive_concurrency=False,
+        chunk_size_policy=None,
+        retry_policy=None,
+        connection_pooling='shared',
+        max_target_failures=10,
+        compression=None,
+        max_open_files=256,
+        scheduling='fifo',
+        max_chunks_per_file=None,
+        prioritize_first_and_last_chunk=False,
+        max_rate=None,
+        max_file_rate=None,
+        threaded_callbacks=False,
+        max_queued_callbacks=1024,
+        progress_rate=None,
+        daemon=False,
+        prefetch_memory=None
     )
 
     assert manager.session == session_mock.return_value
@@ -60,7 +93,7 @@ def test_resumable(session_mock, executor_mock):
 
 def test_add_file(mocker, session_mock):
 
-    file = Mock(chunks=['foo', 'bar'])
+    file = mock_file(['foo', 'bar'])
     file_mock = mocker.patch('resumable.core.ResumableFile', return_value=file)
     resolve_chunk_mock = mocker.patch('resumable.core.resolve_chunk')
 
@@ -71,24 +104,316 @@ def test_add_file(mocker, session_mock):
     manager.add_file(mock_path)
     manager.join()
 
-    file_mock.assert_called_once_with(mock_path, mock_chunk_size)
+    file_mock.assert_called_once_with(mock_path, mock_chunk_size, None,
+                                      relative_path=None, size=None,
+                                      handles=manager.handles, events=None,
+                                      source=None)
     assert manager.files == [file]
 
     resolve_chunk_mock.assert_has_calls([
-        call(session_mock.return_value, manager.config, file, 'foo'),
-        call(session_mock.return_value, manager.config, file, 'bar')
+        call(session_mock.return_value, manager.config, file, 'foo',
+             concurrency=manager.targets[0].concurrency,
+             retry_budget=manager.retry_budget, target=manager.targets[0],
+             compressor=None, rate_limit=manager.rate_limit,
+             stats=manager.stats, data=None),
+        call(session_mock.return_value, manager.config, file, 'bar',
+             concurrency=manager.targets[0].concurrency,
+             retry_budget=manager.retry_budget, target=manager.targets[0],
+             compressor=None, rate_limit=manager.rate_limit,
+             stats=manager.stats, data=None)
     ])
 
 
+def test_add_file_priority(mocker, session_mock):
+
+    files = [mock_file(['low']), mock_file(['high'])]
+    mocker.patch('resumable.core.ResumableFile', side_effect=files)
+    resolve_chunk_mock = mocker.patch('resumable.core.resolve_chunk')
+
+    manager = Resumable(MOCK_TARGET, scheduling='priority')
+    assert manager.scheduler.policy.key is not None
+    for file, priority in zip(files, [1, 2]):
+        assert manager.add_file('/mock/path', priority=priority) is file
+        assert file.priority == priority
+    manager.join()
+
+    assert resolve_chunk_mock.call_count == 2
+
+
+def test_add_file_rate_limit(mocker, session_mock):
+
+    files = [mock_file(['foo']), mock_file(['bar'])]
+    mocker.patch('resumable.core.ResumableFile', side_effect=files)
+    mocker.patch('resumable.core.resolve_chunk')
+
+    manager = Resumable(MOCK_TARGET, max_rate=2000, max_file_rate=1000)
+    assert manager.rate_limit.rate == 2000
+    manager.add_file('/mock/path')
+    manager.add_file('/mock/path', max_rate=500)
+    manager.join()
+
+    assert [file.rate_limit.rate for file in files] == [1000, 500]
+
+
+def test_threaded_callbacks(mocker, session_mock):
+
+    mocker.patch('resumable.core.resolve_chunk',
+                 lambda session, config, file, chunk, **kwargs:
+                 file.mark_chunk_completed(chunk))
+    mocker.patch('resumable.file.os.path.getsize', return_value=300)
+    callback_threads = set()
+    calls = []
+
+    def record(*args):
+        callback_threads.add(threading.current_thread())
+        calls.append(args)
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, threaded_callbacks=True)
+    manager.file_added.register(record)
+    manager.chunk_completed.register(record)
+    manager.file_completed.register(record)
+    file = manager.add_file('/mock/path')
+    manager.join()
+
+    assert calls == [(file,)] + [(file, chunk) for chunk in file.chunks] + \
+        [(file,)]
+    assert len(callback_threads) == 1
+    assert threading.current_thread() not in callback_threads
+
+
+def test_threaded_callbacks_error(mocker, session_mock):
+
+    class IntentionalException(Exception):
+        pass
+
+    mocker.patch('resumable.core.ResumableFile', return_value=mock_file([]))
+    manager = Resumable(MOCK_TARGET, threaded_callbacks=True)
+    manager.file_added.register(Mock(side_effect=IntentionalException()))
+    manager.add_file('/mock/path')
+
+    with pytest.raises(IntentionalException):
+        manager.join()
+
+
+def test_daemon(mocker, session_mock):
+
+    class IntentionalException(Exception):
+        pass
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        if file.path == '/mock/bad':
+            raise IntentionalException()
+        file.mark_chunk_completed(chunk)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    mocker.patch('resumable.file.os.path.getsize', return_value=300)
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, daemon=True)
+    good = manager.add_file('/mock/good')
+    bad = manager.add_file('/mock/bad')
+
+    done, not_done = manager.wait([good, bad], timeout=5)
+    assert done == {good, bad}
+    assert not_done == set()
+    assert good.future.result() is good
+    assert good.is_completed
+    assert isinstance(bad.future.exception(), IntentionalException)
+    assert manager.files == []
+
+    # The session carries on with the next batch
+    files = [manager.add_file('/mock/{0}'.format(i)) for i in range(3)]
+    assert set(manager.as_completed(files, timeout=5)) == set(files)
+    assert all(file.is_completed for file in files)
+    assert manager.files == []
+
+    manager.close()
+    assert manager.scheduler.cancelled
+
+
+def test_daemon_releases_files(mocker, session_mock):
+
+    class IntentionalException(Exception):
+        pass
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        if file.path.startswith('/mock/bad') and chunk.index == 1:
+            raise IntentionalException()
+        file.mark_chunk_completed(chunk)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    mocker.patch('resumable.file.os.path.getsize', return_value=300)
+
+    manager = Resumable(
+        MOCK_TARGET, chunk_size=100, simultaneous_uploads=1, daemon=True,
+        threaded_callbacks=True, progress_rate=1,
+        scheduling='round_robin'
+    )
+    files = [
+        manager.add_file('/mock/{0}-{1}'.format(name, index))
+        for index in range(20) for name in ['good', 'bad']
+    ]
+    done, not_done = manager.wait(files, timeout=5)
+    assert not_done == set()
+
+    assert manager.files == []
+    assert not manager.targets._assignments
+    assert not manager.scheduler._queue
+    assert not manager.scheduler._by_file
+    assert not manager.events._pending
+    assert not manager.events._last_progress
+    manager.close()
+
+
+def test_close_cancels_files(mocker, session_mock):
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        started.set()
+        release.wait(5)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    mocker.patch('resumable.file.os.path.getsize', return_value=300)
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, daemon=True)
+    file = manager.add_file('/mock/path')
+    assert started.wait(5)
+
+    done, not_done = manager.wait(timeout=0.01)
+    assert not_done == {file}
+
+    release.set()
+    manager.close()
+    assert file.future.cancelled()
+
+
+@pytest.mark.parametrize('method', ['wait', 'as_completed'])
+def test_close_wakes_waiters(mocker, session_mock, method):
+
+    release = threading.Event()
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        release.wait(5)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    mocker.patch('resumable.file.os.path.getsize', return_value=300)
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, daemon=True)
+    files = [manager.add_file('/mock/{0}'.format(i)) for i in range(5)]
+
+    returned = threading.Event()
+
+    def wait():
+        if method == 'wait':
+            manager.wait(files)
+        else:
+            list(manager.as_completed(files))
+        returned.set()
+
+    thread = threading.Thread(target=wait)
+    thread.daemon = True
+    thread.start()
+    time.sleep(0.05)
+    assert not returned.is_set()
+
+    release.set()
+    start = time.time()
+    manager.close()
+    assert returned.wait(2)
+    assert time.time() - start < 2
+    assert all(file.future.cancelled() for file in files)
+
+
+def test_add_source(mocker, session_mock):
+
+    sent = []
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        sent.append(bytes(chunk.read()))
+        file.mark_chunk_completed(chunk)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    policy = Mock(return_value=10)
+    content = b'sample content afsdfas'
+
+    manager = Resumable(MOCK_TARGET, simultaneous_uploads=1,
+                        chunk_size_policy=policy)
+    file = manager.add_source(content, 'sample.txt', 'memory/sample.txt')
+    manager.join()
+
+    policy.assert_called_once_with(len(content), None, 1)
+    assert file.path == 'sample.txt'
+    assert file.relative_path == 'memory/sample.txt'
+    assert file.is_completed
+    assert b''.join(sent) == content
+
+
+def test_prefetch(mocker, session_mock, tmpdir):
+
+    content = bytes(bytearray(range(256))) * 4
+    path = tmpdir.join('file')
+    path.write(content, 'wb')
+    sent = []
+
+    def mock_resolve_chunk(session, config, file, chunk, data=None,
+                           **kwargs):
+        # Give the next chunks time to be read ahead
+        time.sleep(0.01)
+        sent.append((chunk.index, data is not None, bytes(
+            chunk.read() if data is None else data
+        )))
+        file.mark_chunk_completed(chunk)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, simultaneous_uploads=2,
+                        test_chunks=False, prefetch_memory=1000)
+    file = manager.add_file(str(path))
+    manager.join()
+
+    assert file.is_completed
+    assert b''.join(data for _, _, data in sorted(sent)) == content
+    # All but the chunks sent straight away were read ahead of their send
+    assert sorted(
+        index for index, prefetched, _ in sent if not prefetched
+    ) == [0, 1]
+    assert manager.prefetcher.buffers.allocated <= 1000
+
+
+@pytest.mark.parametrize('exists', [True, False])
+def test_prefetch_tested_chunks(mocker, session_mock, tmpdir, exists):
+
+    path = tmpdir.join('file')
+    path.write(b'x' * 1000, 'wb')
+
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
+        file.probe.record(exists)
+        file.mark_chunk_completed(chunk)
+
+    mocker.patch('resumable.core.resolve_chunk', mock_resolve_chunk)
+    schedule = mocker.spy(Prefetcher, 'schedule')
+
+    manager = Resumable(MOCK_TARGET, chunk_size=100, simultaneous_uploads=1,
+                        max_queued_chunks=1, prefetch_memory=1000)
+    manager.add_file(str(path))
+    manager.join()
+
+    # Only read ahead once chunks are found missing from the server, after
+    # the first has been, by when the second is being sent
+    scheduled = [args[2].index for args, _ in schedule.call_args_list]
+    assert scheduled == ([] if exists else list(range(2, 10)))
+
+
 def test_add_file_failure(mocker, session_mock):
 
     class IntentionalException(Exception):
         pass
 
-    file = Mock(chunks=['one', 'two', 'three', 'four'])
+    file = mock_file(['one', 'two', 'three', 'four'])
     mocker.patch('resumable.core.ResumableFile', return_value=file)
 
-    def mock_resolve_chunk(session, config, file, chunk):
+    def mock_resolve_chunk(session, config, file, chunk, **kwargs):
         if chunk == 'one':
             return
         elif chunk == 'two':
@@ -111,6 +436,72 @@ def test_add_file_failure(mocker, session_mock):
     assert join_duration < 0.3
 
 
+def test_add_file_chunk_size_policy(mocker, session_mock):
+
+    file_mock = mocker.patch(
+        'resumable.core.ResumableFile', return_value=mock_file([])
+    )
+    mocker.patch('resumable.core.os.path.getsize', return_value=1234)
+    policy = Mock(return_value=567)
+
+    manager = Resumable(MOCK_TARGET, simultaneous_uploads=2,
+                        chunk_size_policy=policy)
+    manager.add_file('/mock/path')
+    manager.join()
+
+    policy.assert_called_once_with(1234, manager.targets.throughput, 2)
+    file_mock.assert_called_once_with('/mock/path', 567, None,
+                                      relative_path=None, size=None,
+                                      handles=manager.handles, events=None,
+                                      source=None)
+
+
+@pytest.mark.parametrize('options', [
+    {'content_identifiers': True},
+    {'journal': Mock()}
+])
+def test_add_file_chunk_size_policy_resumable(mocker, session_mock, options):
+
+    mocker.patch('resumable.core.ResumableFile', return_value=mock_file([]))
+    mocker.patch('resumable.core.os.path.getsize', return_value=1234)
+    policy = Mock(return_value=567)
+
+    manager = Resumable(MOCK_TARGET, simultaneous_uploads=2,
+                        chunk_size_policy=policy, **options)
+    manager.targets[0].concurrency.throughput = 1000
+    manager.add_file('/mock/path')
+    manager.join()
+
+    # Independent of the throughput, so that resumes split files the same
+    policy.assert_called_once_with(1234, None, 2)
+
+
+def test_add_file_already_completed(mocker, session_mock):
+
+    file = Mock(chunks=['foo', 'bar'], is_completed=True)
+    mocker.patch('resumable.core.ResumableFile', return_value=file)
+    resolve_chunk_mock = mocker.patch('resumable.core.resolve_chunk')
+
+    manager = Resumable(MOCK_TARGET)
+    manager.add_file('/mock/path')
+    manager.join()
+
+    file.completed.trigger.assert_called_once_with()
+    resolve_chunk_mock.assert_not_called()
+
+
+def test_journal(mocker, session_mock):
+
+    journal_mock = mocker.patch('resumable.core.Journal')
+
+    manager = Resumable(MOCK_TARGET, journal='/mock/journal')
+    journal_mock.assert_called_once_with('/mock/journal')
+    assert manager.journal == journal_mock.return_value
+
+    manager.join()
+    journal_mock.return_value.close.assert_called_once_with()
+
+
 def test_context_manager():
 
     manager = Resumable(MOCK_TARGET)
@@ -120,3 +511,29 @@ def test_context_manager():
         assert entered_manager is manager
 
     manager.join.assert_called_once()
+
+
+def test_text_options(mocker, session_mock):
+
+    journal_mock = mocker.patch('resumable.core.Journal')
+
+    # unicode on Python 2 is not a str, but still a single URL and path
+    manager = Resumable(u'https://example.com/upload', journal=u'/journal')
+
+    assert [target.url for target in manager.targets] == [MOCK_TARGET]
+    journal_mock.assert_called_once_with(u'/journal')
+    manager.join()
+
+
+def test_multiple_targets(session_mock, executor_mock):
+
+    targets = [MOCK_TARGET, 'https://other.example.com/upload']
+    manager = Resumable(targets, simultaneous_uploads=2)
+
+    assert [target.url for target in manager.targets] == targets
+    assert manager.config.max_queued_chunks == 4
+    executor_mock.assert_called_once_with(4)
+    assert [target.limit for target in manager.targets] == [2, 2]
+    first, second = manager.targets
+    assert first.concurrency is not second.concurrency
+    assert first.sessions is not second.sessions
@@ -0,0 +1,71 @@
+import time
+from email.utils import formatdate
+
+from mock import Mock
+import pytest
+
+from resumable.retry import (
+    retry_after, ConstantBackoff, ExponentialBackoff, RetryBudget
+)
+
+
+def mock_response(status_code, **headers):
+    return Mock(status_code=status_code, headers=headers)
+
+
+@pytest.mark.parametrize('response, expected', [
+    (mock_response(503, **{'Retry-After': '5'}), 5.0),
+    (mock_response(429, **{'Retry-After': '1.5'}), 1.5),
+    (mock_response(429, **{'Retry-After': '-3'}), 0.0),
+    (mock_response(429, **{'Retry-After': 'soon'}), None),
+    (mock_response(429), None),
+    (mock_response(418, **{'Retry-After': '5'}), None)
+])
+def test_retry_after(response, expected):
+    assert retry_after(response) == expected
+
+
+def test_retry_after_date():
+    value = formatdate(time.time() + 60, usegmt=True)
+    response = mock_response(503, **{'Retry-After': value})
+    assert 55 < retry_after(response) <= 60
+
+
+def test_constant_backoff():
+    policy = ConstantBackoff(3)
+    assert policy.delay(1) == 3
+    assert policy.delay(10, mock_response(418)) == 3
+
+
+@pytest.mark.parametrize('attempt, response, limit', [
+    (1, mock_response(418), 0.1),
+    (3, mock_response(418), 0.4),
+    (20, mock_response(418), 30.0),
+    (1, None, 1.0),
+    (2, None, 2.0)
+])
+def test_exponential_backoff(mocker, attempt, response, limit):
+    uniform = mocker.patch('resumable.retry.random.uniform',
+                           return_value=0.5)
+    assert ExponentialBackoff().delay(attempt, response) == 0.5
+    uniform.assert_called_once_with(0, pytest.approx(limit))
+
+
+def test_exponential_backoff_retry_after():
+    policy = ExponentialBackoff(max_retry_after=10)
+    assert policy.delay(1, mock_response(429, **{'Retry-After': '4'})) == 4
+    assert policy.delay(1, mock_response(429, **{'Retry-After': '60'})) == 10
+
+
+def test_retry_budget():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    for _ in range(10):
+        budget.deposit()
+    assert budget.balance == 2
@@ -0,0 +1,523 @@
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from mock import Mock
+import pytest
+
+from resumable.scheduler import Scheduler
+from resumable.scheduling import PriorityPolicy, SmallestRemainingFirst
+
+
+def mock_file(chunks):
+    return Mock(chunks=chunks, is_chunk_completed=Mock(return_value=False))
+
+
+def test_scheduler():
+
+    files = [mock_file(['one', 'two']), mock_file(['three'])]
+    resolve = Mock()
+
+    executor = ThreadPoolExecutor(2)
+    scheduler = Scheduler(executor, resolve, 2)
+    for file in files:
+        scheduler.add(file)
+    scheduler.wait()
+    executor.shutdown()
+
+    resolved = [call[0] for call in resolve.call_args_list]
+    assert len(resolved) == 3
+    assert set(resolved) == set([
+        (files[0], 'one'), (files[0], 'two'), (files[1], 'three')
+    ])
+    assert scheduler.in_flight == 0
+
+
+def test_scheduler_bounded():
+
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def resolve(file, chunk):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.001)
+        with lock:
+            state['running'] -= 1
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            assert scheduler.in_flight < 3
+            return super(CountingExecutor, self).submit(*args, **kwargs)
+
+    executor = CountingExecutor(4)
+    scheduler = Scheduler(executor, resolve, 3)
+    scheduler.add(mock_file(range(100)))
+    assert scheduler.in_flight <= 3
+    scheduler.wait()
+    executor.shutdown()
+
+    assert state['peak'] <= 3
+
+
+def test_scheduler_lazy():
+
+    generated = []
+
+    def chunks():
+        for index in range(1000):
+            generated.append(index)
+            yield index
+
+    executor = Mock(submit=Mock(side_effect=lambda *args: Mock()))
+    scheduler = Scheduler(executor, Mock(), 5)
+    scheduler.add(mock_file(chunks()))
+
+    assert executor.submit.call_count == 5
+    assert len(generated) == 5
+
+
+def test_scheduler_error():
+
+    class IntentionalException(Exception):
+        pass
+
+    def resolve(file, chunk):
+        if chunk == 1:
+            raise IntentionalException()
+
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2)
+    scheduler.add(mock_file(range(1000)))
+
+    with pytest.raises(IntentionalException):
+        scheduler.wait()
+    scheduler.cancel()
+    executor.shutdown()
+
+
+def test_scheduler_fail_file():
+
+    class IntentionalException(Exception):
+        pass
+
+    bad = mock_file(range(1000))
+    good = mock_file(range(10))
+    resolved = []
+
+    def resolve(file, chunk):
+        if file is bad and chunk == 1:
+            raise IntentionalException()
+        resolved.append((file, chunk))
+
+    fail_file = Mock()
+    failed = Mock()
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2, fail_file=fail_file,
+                          failed=failed)
+    scheduler.add(bad)
+    scheduler.add(good)
+    scheduler.wait()
+    executor.shutdown()
+
+    fail_file.assert_called_once()
+    assert fail_file.call_args[0][0] is bad
+    assert isinstance(fail_file.call_args[0][1], IntentionalException)
+    failed.assert_not_called()
+    # The failed file's remaining chunks were dropped, the other file's not
+    assert len([chunk for file, chunk in resolved if file is bad]) < 10
+    assert [chunk for file, chunk in resolved if file is good] == \
+        list(range(10))
+
+
+def test_scheduler_failed():
+
+    class IntentionalException(Exception):
+        pass
+
+    def resolve(file, chunk):
+        raise IntentionalException()
+
+    failed = Mock()
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2, failed=failed)
+    scheduler.add(mock_file(range(10)))
+
+    with pytest.raises(IntentionalException):
+        scheduler.wait()
+    scheduler.cancel()
+    executor.shutdown()
+
+    failed.assert_called_once()
+    assert isinstance(failed.call_args[0][0], IntentionalException)
+
+
+def test_scheduler_prefetch():
+
+    files = [mock_file(['a1', 'a2', 'a3']), mock_file(['b1', 'b2'])]
+    prefetched = []
+
+    def prefetch(file, chunk):
+        prefetched.append(chunk)
+        return True
+
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, prefetch=prefetch,
+                          lookahead=3)
+    scheduler.add(files[0])
+    assert prefetched == ['a2', 'a3']
+    scheduler.add(files[1])
+    assert prefetched == ['a2', 'a3', 'b1']
+
+    # The chunks looked ahead at are submitted in order, and each is only
+    # read ahead once
+    assert [chunk for _, chunk in submitted_order(scheduler, executor)] == [
+        'a1', 'a2', 'a3', 'b1', 'b2'
+    ]
+    assert prefetched == ['a2', 'a3', 'b1', 'b2']
+
+
+def test_scheduler_prefetch_no_room():
+
+    file = mock_file(['one', 'two', 'three', 'four'])
+    room = {'one': None, 'two': None, 'three': False, 'four': True}
+    offered = []
+
+    def prefetch(file, chunk):
+        offered.append(chunk)
+        return room[chunk]
+
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, prefetch=prefetch,
+                          lookahead=10)
+    scheduler.add(file)
+    # Chunks not read ahead are offered again, up to the first without room
+    assert offered == ['two', 'three']
+    room['three'] = True
+    next(iter(scheduler._futures)).set_result(None)
+    assert offered == ['two', 'three', 'three', 'four']
+
+
+def test_scheduler_skips_completed():
+
+    file = Mock(
+        chunks=['one', 'two', 'three'],
+        is_chunk_completed=Mock(side_effect=lambda chunk: chunk == 'two')
+    )
+    resolve = Mock()
+
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2)
+    scheduler.add(file)
+    scheduler.wait()
+    executor.shutdown()
+
+    assert sorted(call[0][1] for call in resolve.call_args_list) == \
+        ['one', 'three']
+
+
+def test_scheduler_add_when_ready():
+
+    file = mock_file(['one'])
+    resolve = Mock()
+    ready = Future()
+
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2)
+    scheduler.add_when_ready(file, ready)
+    resolve.assert_not_called()
+
+    ready.set_result(None)
+    scheduler.wait()
+    executor.shutdown()
+
+    resolve.assert_called_once_with(file, 'one')
+
+
+def test_scheduler_add_when_ready_error():
+
+    class IntentionalException(Exception):
+        pass
+
+    resolve = Mock()
+    ready = Future()
+    ready.set_exception(IntentionalException())
+
+    scheduler = Scheduler(Mock(), resolve, 2)
+    scheduler.add_when_ready(mock_file(['one']), ready)
+
+    with pytest.raises(IntentionalException):
+        scheduler.wait()
+    resolve.assert_not_called()
+
+
+def test_scheduler_concurrency():
+
+    concurrency = Mock(limit=2)
+    executor = Mock(submit=Mock(side_effect=lambda *args: Mock()))
+    scheduler = Scheduler(executor, Mock(), 5, concurrency)
+    scheduler.add(mock_file(range(100)))
+    assert scheduler.in_flight == 2
+
+
+def test_scheduler_group_limit():
+
+    groups = {'a': Mock(limit=1), 'b': Mock(limit=2)}
+    files = [mock_file(range(10)), mock_file(range(10))]
+    files[0].group = 'a'
+    files[1].group = 'b'
+
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 5,
+                          group=lambda file: groups[file.group])
+    for file in files:
+        scheduler.add(file)
+
+    # The first file is held at its group's limit, passing over to the next
+    submitted = [call[0][1] for call in executor.submit.call_args_list]
+    assert submitted.count(files[0]) == 1
+    assert submitted.count(files[1]) == 2
+    assert scheduler.in_flight == 3
+
+    # Completing a chunk in a group frees a place for that group only
+    first = next(future for future, (_, group) in scheduler._futures.items()
+                 if group is groups['a'])
+    first.set_result(None)
+    submitted = [call[0][1] for call in executor.submit.call_args_list]
+    assert submitted.count(files[0]) == 2
+    assert scheduler.in_flight == 3
+
+
+@pytest.mark.parametrize('policy', [None, SmallestRemainingFirst()])
+def test_scheduler_groups_full(policy):
+
+    target = Mock(limit=2)
+    group = Mock(return_value=target)
+    files = [mock_file(['one']) for _ in range(100)]
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 10, group=group,
+                          groups=[target], policy=policy)
+    for file in files:
+        file.chunks_completed = 0
+        file.chunk_size = 1
+        scheduler.add(file)
+
+    # Queued files are not looked through once the group is found full
+    assert scheduler.in_flight == 2
+    assert group.call_count == 3
+
+    assert len(submitted_order(scheduler, executor)) == 100
+
+
+def test_scheduler_callback_error():
+
+    class IntentionalException(Exception):
+        pass
+
+    ready = Future()
+    scheduler = Scheduler(Mock(), Mock(), 2, group=Mock(
+        side_effect=IntentionalException()
+    ))
+    scheduler.add_when_ready(mock_file(['one']), ready)
+    ready.set_result(None)
+
+    with pytest.raises(IntentionalException):
+        scheduler.wait()
+
+
+def test_scheduler_track_error():
+
+    class IntentionalException(Exception):
+        pass
+
+    work = Future()
+    scheduler = Scheduler(Mock(), Mock(), 2)
+    scheduler.track(work)
+    work.set_exception(IntentionalException())
+
+    with pytest.raises(IntentionalException):
+        scheduler.wait()
+
+
+def test_scheduler_wait_for_room():
+
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1)
+    scheduler.add(mock_file(['one']))
+    scheduler.add(mock_file(['two']))
+    assert scheduler.queued_files == 2
+
+    waited = []
+    thread = threading.Thread(
+        target=lambda: waited.append(scheduler.wait_for_room(2))
+    )
+    thread.start()
+    time.sleep(0.05)
+    assert waited == []
+
+    # Completing the first chunk moves past the first file
+    next(iter(scheduler._futures)).set_result(None)
+    thread.join(1)
+    assert waited == [True]
+    assert scheduler.wait_for_room(2)
+
+    scheduler.cancel()
+    assert not scheduler.wait_for_room(0)
+
+
+def test_scheduler_prefer():
+
+    files = [mock_file(['one']), mock_file(['two']), mock_file(['three'])]
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1,
+                          prefer=lambda file: file is files[2])
+    for file in files:
+        scheduler.add(file)
+
+    assert executor.submit.call_count == 1
+    next(iter(scheduler._futures)).set_result(None)
+
+    submitted = [call[0][1:] for call in executor.submit.call_args_list]
+    assert submitted == [(files[0], 'one'), (files[2], 'three')]
+
+
+def submitted_order(scheduler, executor):
+    """Resolve submitted chunks one at a time, returning them in order."""
+    while scheduler._futures:
+        next(iter(scheduler._futures)).set_result(None)
+    return [call[0][1:] for call in executor.submit.call_args_list]
+
+
+def test_scheduler_policy():
+
+    files = [mock_file(['one', 'two']), mock_file(['three'])]
+    policy = Mock(key=lambda queued: -queued.sequence)
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, policy=policy)
+    for file in files:
+        scheduler.add(file)
+
+    # The first chunk is submitted before the second file is queued
+    assert submitted_order(scheduler, executor) == [
+        (files[0], 'one'), (files[1], 'three'), (files[0], 'two')
+    ]
+
+
+def test_scheduler_round_robin():
+
+    files = [mock_file(['a1', 'a2', 'a3']), mock_file(['b1', 'b2'])]
+    policy = Mock(key=lambda queued: (queued.last_turn, queued.sequence))
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, policy=policy)
+    for file in files:
+        scheduler.add(file)
+
+    assert [chunk for _, chunk in submitted_order(scheduler, executor)] == [
+        'a1', 'b1', 'a2', 'b2', 'a3'
+    ]
+
+
+def test_scheduler_policy_key_changes():
+
+    files = [mock_file(['a1', 'a2']), mock_file(['b1', 'b2']),
+             mock_file(['c1', 'c2'])]
+    for file in files:
+        file.priority = 0
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, policy=PriorityPolicy())
+    for file in files:
+        scheduler.add(file)
+
+    # Lowered priorities are seen on the next chunk, and raised ones once
+    # as many chunks as there are queued files have been taken
+    files[0].priority = -1
+    files[2].priority = 1
+    assert [chunk for _, chunk in submitted_order(scheduler, executor)] == [
+        'a1', 'b1', 'b2', 'c1', 'c2', 'a2'
+    ]
+    assert not scheduler._queue
+    assert not scheduler._by_file
+
+
+def test_scheduler_policy_many_files():
+
+    files = [mock_file(['one', 'two']) for _ in range(200)]
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 4,
+                          policy=SmallestRemainingFirst())
+    for file in files:
+        file.chunks_completed = 0
+        file.chunk_size = 1
+        scheduler.add(file)
+
+    submitted = submitted_order(scheduler, executor)
+    assert len(submitted) == 400
+    assert set(submitted) == set(
+        (file, chunk) for file in files for chunk in ['one', 'two']
+    )
+    assert not scheduler._queue
+    assert len(scheduler._heap) <= 2 * len(files)
+
+
+def test_scheduler_max_per_file():
+
+    files = [mock_file(['a1', 'a2', 'a3']), mock_file(['b1'])]
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 3, max_per_file=2)
+    for file in files:
+        scheduler.add(file)
+
+    submitted = [call[0][1:] for call in executor.submit.call_args_list]
+    assert submitted == [(files[0], 'a1'), (files[0], 'a2'), (files[1], 'b1')]
+
+    next(iter(scheduler._futures)).set_result(None)
+    assert executor.submit.call_args[0][1:] == (files[0], 'a3')
+
+
+def test_scheduler_first_and_last():
+
+    files = [mock_file(['a1', 'a2', 'a3']), mock_file(['b1', 'b2', 'b3'])]
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, first_and_last=True)
+    for file in files:
+        scheduler.add(file)
+
+    assert [chunk for _, chunk in submitted_order(scheduler, executor)] == [
+        'a1', 'a3', 'b1', 'b3', 'a2', 'b2'
+    ]
+    assert not scheduler._edges
+
+
+def test_scheduler_first_and_last_completed():
+
+    file = mock_file(['one', 'two', 'three'])
+    file.is_chunk_completed = lambda chunk: chunk == 'one'
+    executor = Mock(submit=Mock(side_effect=lambda *args: Future()))
+    scheduler = Scheduler(executor, Mock(), 1, first_and_last=True)
+    scheduler.add(file)
+
+    assert [chunk for _, chunk in submitted_order(scheduler, executor)] == [
+        'three', 'two'
+    ]
+    assert not scheduler._edges
+
+
+def test_scheduler_stats():
+
+    file = mock_file(['one', 'two'])
+    resolve = Mock()
+    stats = Mock()
+
+    executor = ThreadPoolExecutor(1)
+    scheduler = Scheduler(executor, resolve, 2, stats=stats)
+    scheduler.add(file)
+    scheduler.wait()
+    executor.shutdown()
+
+    assert [call[0] for call in resolve.call_args_list] == [
+        (file, 'one'), (file, 'two')
+    ]
+    assert [call[0][0] for call in stats.observe.call_args_list] == [
+        'queue', 'queue'
+    ]
@@ -0,0 +1,72 @@
+from mock import Mock
+import pytest
+
+from resumable.scheduler import QueuedFile
+from resumable.scheduling import (
+    FifoPolicy, SmallestRemainingFirst, RoundRobin, PriorityPolicy,
+    make_policy
+)
+
+
+def queued_file(sequence, num_chunks=4, chunks_completed=0, priority=0):
+    file = Mock(
+        chunks=list(range(num_chunks)), chunk_size=100,
+        chunks_completed=chunks_completed, priority=priority,
+        is_chunk_completed=Mock(return_value=False)
+    )
+    return QueuedFile(file, sequence)
+
+
+def ordered(policy, queued):
+    return [item.sequence for item in sorted(queued, key=policy.key)]
+
+
+def test_fifo():
+    assert FifoPolicy().key is None
+
+
+def test_smallest_remaining_first():
+    queued = [
+        queued_file(0, num_chunks=10),
+        queued_file(1, num_chunks=10, chunks_completed=9),
+        queued_file(2, num_chunks=2),
+        queued_file(3, num_chunks=2)
+    ]
+    assert queued[1].remaining_bytes == 100
+    assert ordered(SmallestRemainingFirst(), queued) == [1, 2, 3, 0]
+
+    queued[2].in_flight = 2
+    assert queued[2].remaining_bytes == 0
+    assert ordered(SmallestRemainingFirst(), queued) == [2, 1, 3, 0]
+
+
+def test_round_robin():
+    queued = [queued_file(0), queued_file(1), queued_file(2)]
+    queued[0].last_turn = 1
+    queued[1].last_turn = 0
+    assert ordered(RoundRobin(), queued) == [2, 1, 0]
+
+
+def test_priority():
+    queued = [
+        queued_file(0, priority=0),
+        queued_file(1, priority=5),
+        queued_file(2, priority=-1),
+        queued_file(3, priority=5)
+    ]
+    assert ordered(PriorityPolicy(), queued) == [1, 3, 0, 2]
+
+
+@pytest.mark.parametrize('name, policy_class', [
+    ('fifo', FifoPolicy),
+    ('smallest_remaining', SmallestRemainingFirst),
+    ('round_robin', RoundRobin),
+    ('priority', PriorityPolicy)
+])
+def test_make_policy(name, policy_class):
+    assert isinstance(make_policy(name), policy_class)
+
+
+def test_make_policy_unknown():
+    with pytest.raises(ValueError):
+        make_policy('random')
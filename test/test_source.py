@@ -0,0 +1,69 @@
+import io
+import array
+
+import pytest
+
+from resumable.source import (
+    BufferSource, FileObjectSource, CallableSource, make_source
+)
+
+
+CONTENT = b'sample content afsdfas'
+
+
+def test_buffer_source():
+    source = BufferSource(CONTENT)
+    assert source.size == len(CONTENT)
+
+    data = source.read(7, 5)
+    assert isinstance(data, memoryview)
+    assert data == CONTENT[7:12]
+    assert source.read(20, 10) == CONTENT[20:]
+
+
+def test_buffer_source_zero_copy():
+    buffer = bytearray(CONTENT)
+    data = BufferSource(buffer).read(0, 6)
+    buffer[0:6] = b'SAMPLE'
+    assert data == b'SAMPLE'
+
+
+def test_buffer_source_typed():
+    values = array.array('i', [1, 2, 3])
+    source = BufferSource(values)
+    assert source.size == 3 * values.itemsize
+    assert source.read(0, source.size) == values.tobytes()
+
+
+def test_file_object_source():
+    source = FileObjectSource(io.BytesIO(CONTENT))
+    assert source.size == len(CONTENT)
+    assert source.read(7, 5) == CONTENT[7:12]
+    assert source.read(20, 10) == CONTENT[20:]
+
+    assert FileObjectSource(io.BytesIO(CONTENT), size=10).size == 10
+
+
+def test_callable_source():
+    source = CallableSource(
+        lambda start, num_bytes: CONTENT[start:start + num_bytes],
+        len(CONTENT)
+    )
+    assert source.size == len(CONTENT)
+    assert source.read(7, 5) == CONTENT[7:12]
+
+
+def test_make_source():
+    assert isinstance(make_source(CONTENT), BufferSource)
+    assert isinstance(make_source(memoryview(CONTENT)), BufferSource)
+    assert isinstance(make_source(io.BytesIO(CONTENT)), FileObjectSource)
+
+    def read(start, num_bytes):
+        return CONTENT[start:start + num_bytes]
+
+    source = make_source(read, len(CONTENT))
+    assert isinstance(source, CallableSource)
+    assert make_source(source) is source
+
+    with pytest.raises(ValueError):
+        make_source(read)
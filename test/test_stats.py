@@ -0,0 +1,109 @@
+from mock import Mock
+import pytest
+
+from resumable.stats import Histogram, UploadStats
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = Mock(return_value=0.0)
+    mocker.patch('resumable.stats.monotonic', clock)
+    return clock
+
+
+def mock_file(size=1000, fraction_completed=0.0):
+    return Mock(size=size, fraction_completed=fraction_completed,
+                is_completed=fraction_completed == 1.0)
+
+
+def test_histogram():
+    histogram = Histogram([1, 2, 5])
+    for value in [0.5, 1, 1.5, 3, 10]:
+        histogram.observe(value)
+
+    assert histogram.count == 5
+    assert histogram.sum == 16
+    assert histogram.cumulative() == [
+        (1, 2), (2, 3), (5, 4), (float('inf'), 5)
+    ]
+
+
+def test_counters():
+    stats = UploadStats()
+    file = mock_file()
+    stats.record_sent(file, 100)
+    stats.record_sent(file, 50)
+    stats.record_skipped(file, 100)
+    stats.record_retry(0.5)
+    stats.observe('send', 0.2)
+
+    assert (stats.chunks_sent, stats.bytes_sent) == (2, 150)
+    assert (stats.chunks_skipped, stats.bytes_skipped) == (1, 100)
+    assert stats.retries == 1
+    assert stats.phases['backoff'].sum == 0.5
+    assert stats.phases['send'].count == 1
+
+
+def test_throughput_and_eta(clock):
+    files = [mock_file(1000, 0.5), mock_file(2000, 0.0), mock_file(10, 1.0)]
+    stats = UploadStats(files, interval=1.0, smoothing=0.5)
+    assert stats.throughput is None
+    assert stats.eta() is None
+    assert stats.file_eta(files[0]) is None
+    assert stats.file_eta(files[2]) == 0.0
+
+    clock.return_value = 1.0
+    stats.record_sent(files[0], 100)
+    assert stats.throughput == 100
+    assert stats.eta() == 25.0
+
+    # Files without a measured throughput are estimated at the session's
+    assert stats.file_throughput(files[0]) is None
+    assert stats.file_eta(files[0]) == 5.0
+
+    clock.return_value = 2.0
+    stats.record_sent(files[0], 50)
+    assert stats.throughput == 75
+    assert stats.file_throughput(files[0]) == 50
+    assert stats.file_eta(files[0]) == 10.0
+    assert stats.file_eta(files[1]) == pytest.approx(2000 / 75)
+
+
+def test_eta_completed():
+    stats = UploadStats([mock_file(10, 1.0)])
+    assert stats.eta() == 0.0
+
+
+def test_as_dict():
+    stats = UploadStats()
+    stats.record_sent(mock_file(), 100)
+    stats.observe('test', 0.003)
+
+    exported = stats.as_dict()
+    assert exported['chunks_sent'] == 1
+    assert exported['bytes_sent'] == 100
+    assert exported['retries'] == 0
+    assert exported['phases']['test']['count'] == 1
+    assert exported['phases']['test']['buckets'][2] == (0.005, 1)
+    assert exported['eta'] == 0.0
+    assert set(exported['phases']) == set(
+        ['queue', 'read', 'test', 'send', 'backoff']
+    )
+
+
+def test_prometheus():
+    stats = UploadStats()
+    stats.record_sent(mock_file(), 100)
+    stats.observe('send', 0.3)
+
+    lines = stats.prometheus(prefix='uploads').splitlines()
+    assert '# TYPE uploads_bytes_sent_total counter' in lines
+    assert 'uploads_bytes_sent_total 100' in lines
+    assert '# TYPE uploads_phase_seconds histogram' in lines
+    assert 'uploads_phase_seconds_bucket{phase="send",le="0.25"} 0' in lines
+    assert 'uploads_phase_seconds_bucket{phase="send",le="0.5"} 1' in lines
+    assert 'uploads_phase_seconds_bucket{phase="send",le="+Inf"} 1' in lines
+    assert 'uploads_phase_seconds_sum{phase="send"} 0.3' in lines
+    assert 'uploads_phase_seconds_count{phase="send"} 1' in lines
+    assert 'uploads_throughput_bytes_per_second NaN' in lines
+    assert 'uploads_eta_seconds 0.0' in lines
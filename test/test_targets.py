@@ -0,0 +1,109 @@
+from mock import Mock
+import pytest
+
+from resumable.targets import Target, TargetPool
+
+
+URLS = ['https://{0}.example.com/upload'.format(name)
+        for name in ['one', 'two', 'three']]
+
+
+def mock_target(url, max_failures=None):
+    return Target(url, Mock(), Mock(limit=2, throughput=None), max_failures)
+
+
+def mock_file(identifier, resumed=False):
+    return Mock(unique_identifier=identifier, resumed=resumed)
+
+
+def test_assign_consistent():
+    pool = TargetPool([mock_target(url) for url in URLS])
+    other = TargetPool([mock_target(url) for url in URLS])
+
+    identifiers = ['file-{0}'.format(index) for index in range(300)]
+    assigned = [pool.assign(identifier).url for identifier in identifiers]
+    assert assigned == [
+        other.assign(identifier).url for identifier in identifiers
+    ]
+    # Files are spread over all targets
+    for url in URLS:
+        assert 50 < assigned.count(url) < 150
+
+
+def test_assign_after_eject():
+    pool = TargetPool([mock_target(url) for url in URLS])
+    identifiers = ['file-{0}'.format(index) for index in range(300)]
+    before = dict((i, pool.assign(i)) for i in identifiers)
+
+    pool.eject(pool[0])
+
+    for identifier in identifiers:
+        target = pool.assign(identifier)
+        assert target is not pool[0]
+        # Only files of the ejected target move
+        if before[identifier] is not pool[0]:
+            assert target is before[identifier]
+
+
+def test_eject_keeps_last_target():
+    pool = TargetPool([mock_target(url) for url in URLS[:2]])
+    pool.eject(pool[0])
+    pool.eject(pool[1])
+    assert pool[0].ejected
+    assert not pool[1].ejected
+    assert pool.assign('anything') is pool[1]
+
+
+def test_ejected_on_failures():
+    pool = TargetPool([mock_target(url, max_failures=3) for url in URLS])
+    target = pool[0]
+    target.record_failure()
+    target.record_failure()
+    target.record_success()
+    target.record_failure()
+    target.record_failure()
+    assert not target.ejected
+    target.record_failure()
+    assert target.ejected
+
+
+def test_reassign_unstarted_files():
+    pool = TargetPool([mock_target(url) for url in URLS])
+    files = [mock_file('file-{0}'.format(index)) for index in range(30)]
+    files += [mock_file('resumed-{0}'.format(i), True) for i in range(30)]
+
+    targets = [pool.target_for(file) for file in files]
+    started = files[0]
+    pool.start(started)
+    ejected = pool.target_for(started)
+    pool.eject(ejected)
+
+    for file, target in zip(files, targets):
+        if file is started or file.resumed or target is not ejected:
+            assert pool.target_for(file) is target
+        else:
+            assert pool.target_for(file) is not ejected
+
+
+def test_release():
+    pool = TargetPool([mock_target(url) for url in URLS])
+    file = mock_file('file')
+    pool.start(file)
+    assert file in pool._assignments
+
+    pool.release(file)
+    assert file not in pool._assignments
+    pool.release(file)
+
+
+def test_throughput():
+    pool = TargetPool([mock_target(url) for url in URLS])
+    assert pool.throughput is None
+    pool[0].concurrency.throughput = 100
+    pool[2].concurrency.throughput = 50
+    assert pool.throughput == 150
+
+
+def test_no_targets():
+    with pytest.raises(ValueError):
+        TargetPool([])
@@ -0,0 +1,83 @@
+import threading
+
+from mock import Mock, PropertyMock
+import pytest
+
+from resumable.transport import SessionPool, drain
+
+
+def session_in_thread(pool):
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(pool.get()))
+    thread.start()
+    thread.join()
+    return sessions[0]
+
+
+def test_shared_pool():
+    pool = SessionPool(20)
+    assert pool.get() is pool.session
+    assert session_in_thread(pool) is pool.session
+    adapter = pool.session.get_adapter('https://example.com')
+    assert adapter._pool_maxsize == 20
+    assert adapter._pool_block
+
+
+def test_per_thread_pool():
+    pool = SessionPool(20, 'per_thread')
+    pool.session.headers['X-Foo'] = 'bar'
+    pool.session.auth = ('user', 'password')
+
+    session = pool.get()
+    assert session is not pool.session
+    assert pool.get() is session
+
+    other = session_in_thread(pool)
+    assert other is not session
+    for each in [session, other]:
+        assert each.headers['X-Foo'] == 'bar'
+        assert each.auth == ('user', 'password')
+        assert each.get_adapter('http://example.com')._pool_maxsize == 1
+
+
+def test_per_thread_close(mocker):
+    pool = SessionPool(20, 'per_thread')
+    sessions = [session_in_thread(pool) for _ in range(3)]
+    sessions.append(pool.get())
+    closes = [mocker.spy(session, 'close') for session in sessions]
+    template_close = mocker.spy(pool.session, 'close')
+
+    pool.close()
+
+    # Including the sessions of threads that have exited
+    for close in closes:
+        close.assert_called_once_with()
+    template_close.assert_called_once_with()
+
+
+def test_unknown_pooling():
+    with pytest.raises(ValueError):
+        SessionPool(1, 'sometimes')
+
+
+def test_stats():
+    pool = SessionPool(2)
+    adapter = pool.session.get_adapter('https://example.com')
+    for host, connections, num_requests in [('a', 1, 5), ('b', 2, 3)]:
+        connection_pool = adapter.poolmanager.connection_from_host(host)
+        connection_pool.num_connections = connections
+        connection_pool.num_requests = num_requests
+
+    expected = {'connections': 3, 'requests': 8, 'reused': 5}
+    assert pool.stats() == expected
+
+    pool.close()
+    assert pool.stats() == expected
+
+
+def test_drain():
+    response = Mock()
+    content = PropertyMock()
+    type(response).content = content
+    drain(response)
+    content.assert_called_once_with()
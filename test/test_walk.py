@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from resumable import walk
+from resumable.walk import walk_files
+
+
+@pytest.fixture
+def tree(tmpdir):
+    root = tmpdir.mkdir('logs')
+    root.join('a.csv').write('a' * 3)
+    root.join('b.txt').write('b' * 5)
+    sub = root.mkdir('2019').mkdir('01')
+    sub.join('c.csv').write('c' * 7)
+    return root
+
+
+def walked(root, **kwargs):
+    return sorted(
+        (file.relative_path, file.size, file.path)
+        for file in walk_files(root, **kwargs)
+    )
+
+
+def expected(root, *names):
+    sizes = {'a.csv': 3, 'b.txt': 5, '2019/01/c.csv': 7}
+    return sorted(
+        ('logs/' + name, sizes[name], str(root.join(*name.split('/'))))
+        for name in names
+    )
+
+
+@pytest.fixture(params=[True, False])
+def with_scandir(request, mocker):
+    if not request.param:
+        mocker.patch('resumable.walk.scandir', None)
+    return request.param
+
+
+def test_walk_files(tree, with_scandir):
+    assert walked(tree) == expected(tree, 'a.csv', 'b.txt', '2019/01/c.csv')
+
+
+def test_walk_files_pattern(tree, with_scandir):
+    assert walked(tree, pattern='*.csv') == \
+        expected(tree, 'a.csv', '2019/01/c.csv')
+
+
+def test_walk_files_not_recursive(tree, with_scandir):
+    assert walked(tree, recursive=False) == expected(tree, 'a.csv', 'b.txt')
+
+
+@pytest.mark.skipif(not hasattr(os, 'symlink'), reason='no symlinks')
+def test_walk_files_symlinked_directory(tree, with_scandir):
+    os.symlink(str(tree), str(tree.join('loop')))
+    assert walked(tree) == expected(tree, 'a.csv', 'b.txt', '2019/01/c.csv')
+
+
+def test_walk_files_lazy(tree, mocker):
+    entries = mocker.spy(walk, '_entries')
+    files = walk_files(tree)
+    next(files)
+    assert entries.call_count == 1